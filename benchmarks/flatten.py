@@ -0,0 +1,102 @@
+"""Measure flattenDict on synthetic libcloud style payloads.
+
+Compares the iterative flattenDict and the iter_flat_items generator with
+the recursive flattenDict it replaced, which copied every nested dict into a
+throw away dict, re-flattened lists of dicts once per key and dropped list
+indices (so it also returns fewer keys).
+
+Usage::
+
+    python -m benchmarks.flatten [--runs 5] [--payloads 2000]
+"""
+import argparse
+import time
+
+from didata_cli.utils import flattenDict, iter_flat_items
+
+
+def recursive_flatten(d, result=None):
+    # flattenDict as it was before it walked the nesting iteratively
+    if result is None:
+        result = {}
+    for key in d:
+        value = d[key]
+        if isinstance(value, dict):
+            value1 = {}
+            for keyIn in value:
+                value1[".".join([key, keyIn])] = value[keyIn]
+            recursive_flatten(value1, result)
+        elif isinstance(value, (tuple, list)):
+            for indexB, element in enumerate(value):
+                if isinstance(element, dict):
+                    value1 = {}
+                    for keyIn in element:
+                        value1[".".join([key, keyIn])] = value[indexB][keyIn]
+                    for keyA in value1:
+                        recursive_flatten(value1, result)
+        else:
+            result[key] = value
+    return result
+
+
+def server_payload(index):
+    # Shaped like a server's extra: a few scalars, nested dicts and a list of disks
+    return {
+        'name': 'server-{0}'.format(index),
+        'datacenterId': 'NA9',
+        'cpu': {'count': 2, 'coresPerSocket': 1, 'performance': 'STANDARD'},
+        'status': {'action': None, 'requestTime': None, 'userName': None, 'failureReason': None},
+        'networkInfo': {'primaryNic': {'id': 'nic-{0}'.format(index), 'privateIpv4': '10.0.0.1',
+                                       'ipv6': '2607:f480::1', 'vlanId': 'vlan-1'}},
+        'disks': [{'id': 'disk-{0}'.format(disk), 'scsiId': disk, 'sizeGb': 10, 'speed': 'STANDARD',
+                   'state': 'NORMAL'} for disk in range(6)],
+    }
+
+
+def deep_payload(depth):
+    payload = leaf = {}
+    for level in range(depth):
+        leaf['level'] = level
+        leaf['child'] = {'items': [{'value': level}, {'value': -level}]}
+        leaf = leaf['child']
+    return payload
+
+
+SCENARIOS = [
+    ('recursive flattenDict (old)', lambda payloads: [recursive_flatten(payload) for payload in payloads]),
+    ('flattenDict', lambda payloads: [flattenDict(payload) for payload in payloads]),
+    ('iter_flat_items', lambda payloads: [sum(1 for _ in iter_flat_items(payload)) for payload in payloads]),
+]
+
+
+def time_scenario(func, payloads, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.time()
+        func(payloads)
+        timings.append(time.time() - start)
+    timings.sort()
+    return timings[len(timings) // 2], min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--payloads', type=int, default=2000)
+    parser.add_argument('--depth', type=int, default=50, help="Nesting depth of the deep payloads")
+    args = parser.parse_args(argv)
+
+    workloads = [
+        ('{0} servers'.format(args.payloads), [server_payload(index) for index in range(args.payloads)]),
+        ('{0} deep, depth {1}'.format(args.payloads // 10, args.depth),
+         [deep_payload(args.depth) for _ in range(args.payloads // 10)]),
+    ]
+    print('{0:<24} {1:<30} {2:>10} {3:>10}'.format('payloads', 'scenario', 'median ms', 'min ms'))
+    for workload, payloads in workloads:
+        for name, func in SCENARIOS:
+            median, fastest = time_scenario(func, payloads, args.runs)
+            print('{0:<24} {1:<30} {2:>10.1f} {3:>10.1f}'.format(workload, name, median * 1000, fastest * 1000))
+
+
+if __name__ == '__main__':
+    main()
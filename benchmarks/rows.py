@@ -0,0 +1,90 @@
+"""Measure the memory a large result set takes in DiDataCLIFilterableResponse.
+
+Builds a synthetic server list (shaped like _node_to_dict items, with a
+varying number of disks) and compares the memory of holding it as a list of
+OrderedDicts, which is how responses used to keep their items, with a
+response keeping CompactRows.  Also times rendering both to csv.
+
+Usage::
+
+    python -m benchmarks.rows [--rows 50000]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from didata_cli.filterable_response import DiDataCLIFilterableResponse
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+
+def node_dicts(count):
+    for index in range(count):
+        item = OrderedDict()
+        item['Name'] = 'server-{0}'.format(index)
+        item['ID'] = '{0:08d}-43a1-4b56-b751-4107b5671713'.format(index)
+        item['Private IPv4 0'] = '10.0.{0}.{1}'.format(index // 256 % 256, index % 256)
+        item['State'] = 'running' if index % 7 else 'stopped'
+        item['OS_displayName'] = 'REDHAT6/64'
+        item['CPU Count'] = 2
+        item['Cores per Socket'] = 1
+        item['CPU Performance'] = 'STANDARD'
+        item['datacenterId'] = 'NA9'
+        item['deployedTime'] = '2015-12-11T21:19:59.000Z'
+        item['description'] = ''
+        for disk in range(1 + index % 3):
+            item['Disk ' + str(disk) + ' ID'] = 'disk-{0}-{1}'.format(index, disk)
+            item['Disk ' + str(disk) + ' Size'] = 10
+            item['Disk ' + str(disk) + ' Speed'] = 'STANDARD'
+            item['Disk ' + str(disk) + ' State'] = 'NORMAL'
+        item['ipv6'] = '2607:f480:111:1414::{0:x}'.format(index)
+        item['memoryMb'] = 4096
+        item['networkDomainId'] = 'b53b2ad4-ca8b-4abd-9140-72d6b137a6b4'
+        item['sourceImageId'] = 'f78da8fa-986b-4c98-8f87-dc3c2f9e5987'
+        yield item
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    result = build()
+    seconds = time.time() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, seconds
+
+
+def as_dicts(count):
+    return list(node_dicts(count))
+
+
+def as_response(count):
+    response = DiDataCLIFilterableResponse()
+    for item in node_dicts(count):
+        response.add(item)
+    return response
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    dicts, dicts_size, dicts_seconds = measure(lambda: as_dicts(args.rows))
+    response, response_size, response_seconds = measure(lambda: as_response(args.rows))
+    print('{0:<26} {1:>10} {2:>10}'.format('{0} rows'.format(args.rows), 'MB', 'build s'))
+    print('{0:<26} {1:>10.1f} {2:>10.2f}'.format('list of OrderedDicts', dicts_size / 1e6, dicts_seconds))
+    print('{0:<26} {1:>10.1f} {2:>10.2f}'.format('CompactRows', response_size / 1e6, response_seconds))
+    print('{0:<26} {1:>10.0%}'.format('saved', 1 - float(response_size) / dicts_size))
+
+    start = time.time()
+    response.to_string('csv')
+    print('{0:<26} {1:>21.2f}'.format('render csv s', time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
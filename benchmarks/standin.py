@@ -0,0 +1,616 @@
+"""Serve a synthetic account over a local stand-in of the CaaS 2.x (MCP) API.
+
+Answers the requests libcloud's DimensionData drivers make for the endpoints
+didata uses: servers (list, get and power actions), network domains, vlans,
+firewall rules, public IP blocks, tags, tag keys and backup details.  The
+account is generated from its size, every attribute is derived from the
+position of the resource, so the same options always serve the same
+account and no memory is spent holding it.  Every response can be delayed to
+model the latency of the real API, and pages are cut the way the API cuts
+them, so whole CLI runs can be benchmarked without network access.
+
+Usage::
+
+    python -m benchmarks.standin [--port 8080] [--servers 10000] [--latency 0.05]
+    didata --api-url http://127.0.0.1:8080 --user u --password p --region dd-na server list
+"""
+import argparse
+import re
+import threading
+import time
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+
+TYPES_URN = 'urn:didata.com:api:cloud:types'
+DIRECTORY_NS = 'http://oec.api.opsource.net/schemas/directory'
+BACKUP_NS = 'http://oec.api.opsource.net/schemas/backup'
+ORG_ID = '8a8f6abc-2745-4d8a-9cbc-8dabe5a7d0e4'
+# id, display name, country
+DATACENTERS = (('NA9', 'US - East 3 - MCP 2.0', 'US'), ('NA12', 'US - West - MCP 2.0', 'US'))
+IMAGE_ID = 'f78da8fa-986b-4c98-8f87-dc3c2f9e5987'
+TAG_KEYS = (('role', ('web', 'app', 'db')), ('env', ('prod', 'test')))
+# Largest page the API hands out, and the size of a page when none is asked for
+MAX_PAGE_SIZE = 250
+DEFAULT_PAGE_SIZE = 250
+
+# The number each kind of resource puts in the first group of its IDs
+ID_KINDS = {'server': 1, 'network_domain': 2, 'vlan': 3, 'firewall_rule': 4, 'public_ip_block': 5, 'tag_key': 6,
+            'backup': 7, 'backup_client': 8}
+ID_PATTERN = re.compile(r'^([0-9a-f]{8})-5eed-4000-8000-([0-9a-f]{12})$')
+
+POWER_ACTIONS = {
+    'startServer': ('START_SERVER', True),
+    'shutdownServer': ('SHUTDOWN_SERVER', False),
+    'powerOffServer': ('POWER_OFF_SERVER', False),
+    'rebootServer': ('REBOOT_SERVER', None),
+    'resetServer': ('RESET_SERVER', None),
+}
+
+
+def make_id(kind, index):
+    return '{0:08x}-5eed-4000-8000-{1:012x}'.format(ID_KINDS[kind], index)
+
+
+def parse_id(kind, value, count):
+    """Return the index of the resource of this kind an ID names, None if there is none"""
+    match = ID_PATTERN.match(value or '')
+    if match is None or int(match.group(1), 16) != ID_KINDS[kind]:
+        return None
+    index = int(match.group(2), 16)
+    return index if index < count else None
+
+
+class StandInError(Exception):
+    def __init__(self, status, code, message):
+        super(StandInError, self).__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def not_found(kind, value):
+    return StandInError(400, 'RESOURCE_NOT_FOUND', '{0} {1} not found.'.format(kind, value))
+
+
+class SyntheticAccount(object):
+    """An MCP account of any size, each resource built from its index when asked for.
+
+    Servers are spread over the network domains and their vlans, every
+    tenth server is stopped and every backup_every server has backup.  Each
+    server has a role and an env tag.  Power actions are the only changes
+    kept.
+    """
+
+    def __init__(self, servers=100, network_domains=None, vlans_per_domain=2, firewall_rules_per_domain=20,
+                 public_ip_blocks_per_domain=1, backup_every=3):
+        self.servers = servers
+        self.network_domains = network_domains or max(1, servers // 100)
+        self.vlans_per_domain = vlans_per_domain
+        self.vlans = self.network_domains * vlans_per_domain
+        self.firewall_rules_per_domain = firewall_rules_per_domain
+        self.firewall_rules = self.network_domains * firewall_rules_per_domain
+        self.public_ip_blocks_per_domain = public_ip_blocks_per_domain
+        self.public_ip_blocks = self.network_domains * public_ip_blocks_per_domain
+        self.backup_every = backup_every
+        self.tags = servers * len(TAG_KEYS)
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def set_started(self, index, started):
+        with self._lock:
+            self._started[index] = started
+
+    def server(self, index):
+        domain = index % self.network_domains
+        vlan = domain * self.vlans_per_domain + (index // self.network_domains) % self.vlans_per_domain
+        return {
+            'id': make_id('server', index),
+            'name': 'server-{0:06d}'.format(index),
+            'description': 'Synthetic server {0}'.format(index),
+            'datacenterId': self.network_domain(domain)['datacenterId'],
+            'cpuCount': 2 if index % 4 else 4,
+            'memoryGb': 4 if index % 4 else 8,
+            'disks': [(make_id('server', index)[:-4] + '{0:04x}'.format(disk), disk, 10 * (disk + 1))
+                      for disk in range(1 + index % 3)],
+            'networkDomainId': make_id('network_domain', domain),
+            'vlanId': make_id('vlan', vlan),
+            'privateIpv4': '10.{0}.{1}.{2}'.format(index >> 16 & 255, index >> 8 & 255, index & 255),
+            'ipv6': '2607:f480:111:1414::{0:x}'.format(index),
+            'sourceImageId': IMAGE_ID,
+            'started': self._started.get(index, index % 10 != 0),
+            'deployed': True,
+            'state': 'NORMAL',
+            'backup': make_id('backup', index) if index % self.backup_every == 0 else None,
+        }
+
+    def network_domain(self, index):
+        return {
+            'id': make_id('network_domain', index),
+            'name': 'domain-{0:04d}'.format(index),
+            'description': 'Synthetic network domain {0}'.format(index),
+            'datacenterId': DATACENTERS[index % len(DATACENTERS)][0],
+            'type': 'ADVANCED' if index % 2 else 'ESSENTIALS',
+            'state': 'NORMAL',
+        }
+
+    def vlan(self, index):
+        domain = index // self.vlans_per_domain
+        return {
+            'id': make_id('vlan', index),
+            'name': 'vlan-{0:05d}'.format(index),
+            'description': 'Synthetic vlan {0}'.format(index),
+            'datacenterId': self.network_domain(domain)['datacenterId'],
+            'networkDomainId': make_id('network_domain', domain),
+            'networkDomainName': self.network_domain(domain)['name'],
+            'privateIpv4': '10.{0}.{1}.0'.format(index >> 8 & 255, index & 255),
+            'ipv6': '2607:f480:1111:{0:x}:0:0:0:0'.format(index),
+            'state': 'NORMAL',
+        }
+
+    def firewall_rule(self, index):
+        domain, position = divmod(index, self.firewall_rules_per_domain)
+        return {
+            'id': make_id('firewall_rule', index),
+            'name': 'rule_{0:03d}'.format(position),
+            'datacenterId': self.network_domain(domain)['datacenterId'],
+            'networkDomainId': make_id('network_domain', domain),
+            'action': 'DROP' if position % 5 == 4 else 'ACCEPT_DECISIVELY',
+            'ipVersion': 'IPV4',
+            'protocol': 'TCP',
+            'destinationIp': '10.{0}.0.0'.format(position % 256),
+            'destinationPort': 1024 + position,
+            'enabled': position % 7 != 6,
+            'state': 'NORMAL',
+        }
+
+    def public_ip_block(self, index):
+        domain = index // self.public_ip_blocks_per_domain
+        return {
+            'id': make_id('public_ip_block', index),
+            'datacenterId': self.network_domain(domain)['datacenterId'],
+            'networkDomainId': make_id('network_domain', domain),
+            'baseIp': '168.128.{0}.{1}'.format(index >> 7 & 255, (index & 127) * 2),
+            'size': 2,
+            'state': 'NORMAL',
+        }
+
+    def tag_key(self, index):
+        return {'id': make_id('tag_key', index), 'name': TAG_KEYS[index][0]}
+
+    def tag(self, index):
+        server_index, key_index = divmod(index, len(TAG_KEYS))
+        server = self.server(server_index)
+        name, values = TAG_KEYS[key_index]
+        return {
+            'assetType': 'SERVER',
+            'assetId': server['id'],
+            'assetName': server['name'],
+            'datacenterId': server['datacenterId'],
+            'tagKeyId': make_id('tag_key', key_index),
+            'tagKeyName': name,
+            'value': values[server_index % len(values)],
+        }
+
+
+def _text(name, value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        value = 'true' if value else 'false'
+    return '<{0}>{1}</{0}>'.format(name, escape(str(value)))
+
+
+def _attributes(**attributes):
+    return ''.join(' {0}={1}'.format(key, quoteattr(str(value))) for key, value in sorted(attributes.items()))
+
+
+def server_xml(server, tag='server', namespace=''):
+    disks = ''.join('<disk{0}/>'.format(_attributes(id=disk_id, scsiId=scsi_id, sizeGb=size, speed='STANDARD',
+                                                     state='NORMAL'))
+                    for disk_id, scsi_id, size in server['disks'])
+    backup = ''
+    if server['backup']:
+        backup = '<backup{0}/>'.format(_attributes(assetId=server['backup'], servicePlan='Enterprise',
+                                                   state='NORMAL'))
+    return ''.join([
+        '<{0}{1}{2}>'.format(tag, namespace, _attributes(id=server['id'], datacenterId=server['datacenterId'])),
+        _text('name', server['name']), _text('description', server['description']),
+        '<cpu{0}/>'.format(_attributes(count=server['cpuCount'], speed='STANDARD', coresPerSocket=1)),
+        _text('memoryGb', server['memoryGb']), disks,
+        '<networkInfo{0}><primaryNic{1}/></networkInfo>'.format(
+            _attributes(networkDomainId=server['networkDomainId']),
+            _attributes(id=server['id'][:-4] + 'ffff', privateIpv4=server['privateIpv4'], ipv6=server['ipv6'],
+                        vlanId=server['vlanId'], vlanName='vlan', state='NORMAL')),
+        backup, _text('sourceImageId', server['sourceImageId']),
+        _text('createTime', '2016-01-01T00:00:00.000Z'), _text('deployed', server['deployed']),
+        _text('started', server['started']), _text('state', server['state']),
+        '<guest osCustomization="true"><vmTools apiVersion="9354" runningStatus="RUNNING" '
+        'versionStatus="CURRENT"/><operatingSystem displayName="REDHAT6/64" family="UNIX" id="REDHAT664"/>'
+        '</guest>',
+        '</{0}>'.format(tag),
+    ])
+
+
+def network_domain_xml(domain, tag='networkDomain', namespace=''):
+    return ''.join([
+        '<{0}{1}{2}>'.format(tag, namespace, _attributes(id=domain['id'], datacenterId=domain['datacenterId'])),
+        _text('name', domain['name']), _text('description', domain['description']), _text('type', domain['type']),
+        _text('snatIpv4Address', '168.128.0.1'), _text('createTime', '2016-01-01T00:00:00.000Z'),
+        _text('state', domain['state']), '</{0}>'.format(tag),
+    ])
+
+
+def vlan_xml(vlan, tag='vlan', namespace=''):
+    return ''.join([
+        '<{0}{1}{2}>'.format(tag, namespace, _attributes(id=vlan['id'], datacenterId=vlan['datacenterId'])),
+        '<networkDomain{0}/>'.format(_attributes(id=vlan['networkDomainId'], name=vlan['networkDomainName'])),
+        _text('name', vlan['name']), _text('description', vlan['description']),
+        '<privateIpv4Range{0}/>'.format(_attributes(address=vlan['privateIpv4'], prefixSize=24)),
+        _text('ipv4GatewayAddress', vlan['privateIpv4'][:-1] + '1'),
+        '<ipv6Range{0}/>'.format(_attributes(address=vlan['ipv6'], prefixSize=64)),
+        _text('ipv6GatewayAddress', vlan['ipv6'][:-1] + '1'),
+        _text('createTime', '2016-01-01T00:00:00.000Z'), _text('state', vlan['state']), '</{0}>'.format(tag),
+    ])
+
+
+def firewall_rule_xml(rule, tag='firewallRule', namespace=''):
+    return ''.join([
+        '<{0}{1}{2}>'.format(tag, namespace, _attributes(id=rule['id'], datacenterId=rule['datacenterId'],
+                                                         ruleType='CLIENT_RULE')),
+        _text('networkDomainId', rule['networkDomainId']), _text('name', rule['name']),
+        _text('action', rule['action']), _text('ipVersion', rule['ipVersion']), _text('protocol', rule['protocol']),
+        '<source><ip address="ANY"/></source>',
+        '<destination><ip{0}/><port{1}/></destination>'.format(
+            _attributes(address=rule['destinationIp'], prefixSize=16), _attributes(begin=rule['destinationPort'])),
+        _text('enabled', rule['enabled']), _text('state', rule['state']), '</{0}>'.format(tag),
+    ])
+
+
+def public_ip_block_xml(block, tag='publicIpBlock', namespace=''):
+    return ''.join([
+        '<{0}{1}{2}>'.format(tag, namespace, _attributes(id=block['id'], datacenterId=block['datacenterId'])),
+        _text('networkDomainId', block['networkDomainId']), _text('baseIp', block['baseIp']),
+        _text('size', block['size']), _text('createTime', '2016-01-01T00:00:00.000Z'),
+        _text('state', block['state']), '</{0}>'.format(tag),
+    ])
+
+
+def tag_key_xml(tag_key, tag='tagKey', namespace=''):
+    return ''.join([
+        '<{0}{1}{2}>'.format(tag, namespace, _attributes(id=tag_key['id'])), _text('name', tag_key['name']),
+        _text('description', 'Synthetic tag key'), _text('valueRequired', True), _text('displayOnReport', True),
+        '</{0}>'.format(tag),
+    ])
+
+
+def tag_xml(tag_item, tag='tag', namespace=''):
+    return ''.join(['<{0}{1}>'.format(tag, namespace)] +
+                   [_text(key, tag_item[key]) for key in ('assetType', 'assetId', 'assetName', 'datacenterId',
+                                                          'tagKeyId', 'tagKeyName', 'value')] +
+                   [_text('displayOnReport', True), _text('valueRequired', True), '</{0}>'.format(tag)])
+
+
+def datacenter_xml(datacenter, tag='datacenter', namespace=''):
+    datacenter_id, name, country = datacenter
+    return '<{0}{1}{2}>{3}{4}</{0}>'.format(tag, namespace, _attributes(id=datacenter_id, type='MCP 2.0'),
+                                            _text('displayName', name), _text('country', country))
+
+
+def response_xml(operation, code, message):
+    return '<response xmlns="{0}" requestId="na/standin">{1}{2}{3}</response>'.format(
+        TYPES_URN, _text('operation', operation), _text('responseCode', code), _text('message', message))
+
+
+def account_xml():
+    return ('<ns3:Account xmlns:ns3="{0}"><ns3:userName>standin</ns3:userName>'
+            '<ns3:fullName>Stand In</ns3:fullName><ns3:firstName>Stand</ns3:firstName>'
+            '<ns3:lastName>In</ns3:lastName><ns3:emailAddress>standin@example.com</ns3:emailAddress>'
+            '<ns3:orgId>{1}</ns3:orgId></ns3:Account>').format(DIRECTORY_NS, ORG_ID)
+
+
+def backup_details_xml(server):
+    return ('<ns9:BackupDetails xmlns:ns9="{0}"{1}>'
+            '<ns9:backupClient{2}><ns9:description>Linux File Agent</ns9:description>'
+            '<ns9:schedulePolicyName>12AM - 6AM</ns9:schedulePolicyName>'
+            '<ns9:storagePolicyName>14 Day Storage Policy</ns9:storagePolicyName>'
+            '<ns9:downloadUrl>https://backups-na.example.com/{3}</ns9:downloadUrl>'
+            '</ns9:backupClient></ns9:BackupDetails>').format(
+        BACKUP_NS, _attributes(assetId=server['backup'], servicePlan='Enterprise', state='NORMAL'),
+        _attributes(id=server['backup'].replace('-5eed-', '-c1e0-'), type='FA.Linux', isFileSystem='true',
+                    status='Active'),
+        server['id'])
+
+
+# The query parameters each list can be filtered by and the attribute they match
+SERVER_FILTERS = {'datacenterId': 'datacenterId', 'ipv6': 'ipv6', 'privateIpv4': 'privateIpv4', 'state': 'state',
+                  'started': 'started', 'deployed': 'deployed', 'name': 'name', 'id': 'id',
+                  'networkDomainId': 'networkDomainId', 'vlanId': 'vlanId', 'sourceImageId': 'sourceImageId'}
+NETWORK_DOMAIN_FILTERS = {'datacenterId': 'datacenterId', 'name': 'name', 'type': 'type', 'state': 'state',
+                          'id': 'id'}
+VLAN_FILTERS = {'datacenterId': 'datacenterId', 'networkDomainId': 'networkDomainId', 'name': 'name',
+                'privateIpv4Address': 'privateIpv4', 'ipv6Address': 'ipv6', 'state': 'state', 'id': 'id'}
+FIREWALL_RULE_FILTERS = {'networkDomainId': 'networkDomainId', 'name': 'name', 'state': 'state', 'id': 'id'}
+PUBLIC_IP_BLOCK_FILTERS = {'networkDomainId': 'networkDomainId', 'datacenterId': 'datacenterId', 'id': 'id'}
+TAG_FILTERS = {'assetType': 'assetType', 'assetId': 'assetId', 'datacenterId': 'datacenterId',
+               'tagKeyId': 'tagKeyId', 'tagKeyName': 'tagKeyName', 'value': 'value'}
+TAG_KEY_FILTERS = {'id': 'id', 'name': 'name'}
+
+
+def _matches(item, filters):
+    for attribute, wanted in filters:
+        value = item[attribute]
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        if str(value) != wanted:
+            return False
+    return True
+
+
+class StandInAPI(object):
+    """Answers MCP API requests (path, query and body) from a SyntheticAccount"""
+
+    def __init__(self, account, max_page_size=MAX_PAGE_SIZE, default_page_size=DEFAULT_PAGE_SIZE):
+        self.account = account
+        self.max_page_size = max_page_size
+        self.default_page_size = min(default_page_size, max_page_size)
+        self._routes = [
+            (re.compile(r'^/oec/0\.9/myaccount$'), 'GET', self._get_account),
+            (re.compile(r'^/oec/0\.9/[^/]+/server/([^/]+)/backup$'), 'GET', self._get_backup_details),
+            (re.compile(r'^/caas/2\.\d/[^/]+/infrastructure/datacenter$'), 'GET', self._list_datacenters),
+            (re.compile(r'^/caas/2\.\d/[^/]+/server/server$'), 'GET', self._list_servers),
+            (re.compile(r'^/caas/2\.\d/[^/]+/server/server/([^/]+)$'), 'GET', self._get_server),
+            (re.compile(r'^/caas/2\.\d/[^/]+/server/(\w+Server)$'), 'POST', self._power_action),
+            (re.compile(r'^/caas/2\.\d/[^/]+/network/networkDomain$'), 'GET', self._list_network_domains),
+            (re.compile(r'^/caas/2\.\d/[^/]+/network/networkDomain/([^/]+)$'), 'GET', self._get_network_domain),
+            (re.compile(r'^/caas/2\.\d/[^/]+/network/vlan$'), 'GET', self._list_vlans),
+            (re.compile(r'^/caas/2\.\d/[^/]+/network/vlan/([^/]+)$'), 'GET', self._get_vlan),
+            (re.compile(r'^/caas/2\.\d/[^/]+/network/firewallRule$'), 'GET', self._list_firewall_rules),
+            (re.compile(r'^/caas/2\.\d/[^/]+/network/firewallRule/([^/]+)$'), 'GET', self._get_firewall_rule),
+            (re.compile(r'^/caas/2\.\d/[^/]+/network/publicIpBlock$'), 'GET', self._list_public_ip_blocks),
+            (re.compile(r'^/caas/2\.\d/[^/]+/network/publicIpBlock/([^/]+)$'), 'GET', self._get_public_ip_block),
+            (re.compile(r'^/caas/2\.\d/[^/]+/tag/tag$'), 'GET', self._list_tags),
+            (re.compile(r'^/caas/2\.\d/[^/]+/tag/tagKey$'), 'GET', self._list_tag_keys),
+        ]
+
+    def handle(self, method, path, params, body):
+        """Return (status, XML document, number of items in it)"""
+        for pattern, route_method, handler in self._routes:
+            match = pattern.match(path)
+            if match is not None and route_method == method:
+                try:
+                    document, items = handler(params, body, *match.groups())
+                except StandInError as e:
+                    return e.status, response_xml(method, e.code, e.message), 0
+                return 200, '<?xml version="1.0" encoding="UTF-8"?>\n' + document, items
+        return 404, response_xml(method, 'RESOURCE_NOT_FOUND', 'No stand-in for {0} {1}'.format(method, path)), 0
+
+    def _page(self, tag, count, build, to_xml, params, filters):
+        wanted = [(filters[key], params[key]) for key in sorted(params) if key in filters]
+        if wanted:
+            indexes = [index for index in range(count) if _matches(build(index), wanted)]
+        else:
+            indexes = range(count)
+        page_size = min(int(params.get('pageSize', self.default_page_size)), self.max_page_size)
+        page_number = max(int(params.get('pageNumber', 1)), 1)
+        page = indexes[(page_number - 1) * page_size:page_number * page_size]
+        items = ''.join(to_xml(build(index)) for index in page)
+        document = '<{0} xmlns="{1}"{2}>{3}</{0}>'.format(
+            tag, TYPES_URN, _attributes(pageNumber=page_number, pageCount=len(page), totalCount=len(indexes),
+                                        pageSize=page_size), items)
+        return document, len(page)
+
+    def _single(self, kind, value, count, build, to_xml, tag):
+        index = parse_id(kind, value, count)
+        if index is None:
+            raise not_found(kind, value)
+        return to_xml(build(index), tag, ' xmlns="{0}"'.format(TYPES_URN)), 1
+
+    def _get_account(self, params, body):
+        return account_xml(), 1
+
+    def _get_backup_details(self, params, body, server_id):
+        index = parse_id('server', server_id, self.account.servers)
+        server = self.account.server(index) if index is not None else None
+        if server is None or server['backup'] is None:
+            raise not_found('backup', server_id)
+        return backup_details_xml(server), 1
+
+    def _list_datacenters(self, params, body):
+        datacenters = [datacenter for datacenter in DATACENTERS if params.get('id', datacenter[0]) == datacenter[0]]
+        return self._page('datacenters', len(datacenters), lambda index: datacenters[index],
+                          datacenter_xml, params, {})
+
+    def _list_servers(self, params, body):
+        return self._page('servers', self.account.servers, self.account.server, server_xml, params, SERVER_FILTERS)
+
+    def _get_server(self, params, body, server_id):
+        return self._single('server', server_id, self.account.servers, self.account.server, server_xml, 'server')
+
+    def _power_action(self, params, body, action):
+        if action not in POWER_ACTIONS:
+            raise StandInError(400, 'UNSUPPORTED_OPERATION', 'The stand-in does not {0}'.format(action))
+        operation, started = POWER_ACTIONS[action]
+        server_id = ElementTree.fromstring(body).get('id')
+        index = parse_id('server', server_id, self.account.servers)
+        if index is None:
+            raise not_found('server', server_id)
+        if started is not None:
+            self.account.set_started(index, started)
+        return response_xml(operation, 'IN_PROGRESS', 'Request to {0} has been accepted.'.format(action)), 1
+
+    def _list_network_domains(self, params, body):
+        return self._page('networkDomains', self.account.network_domains, self.account.network_domain,
+                          network_domain_xml, params, NETWORK_DOMAIN_FILTERS)
+
+    def _get_network_domain(self, params, body, domain_id):
+        return self._single('network_domain', domain_id, self.account.network_domains, self.account.network_domain,
+                            network_domain_xml, 'networkDomain')
+
+    def _list_vlans(self, params, body):
+        return self._page('vlans', self.account.vlans, self.account.vlan, vlan_xml, params, VLAN_FILTERS)
+
+    def _get_vlan(self, params, body, vlan_id):
+        return self._single('vlan', vlan_id, self.account.vlans, self.account.vlan, vlan_xml, 'vlan')
+
+    def _list_firewall_rules(self, params, body):
+        domain = parse_id('network_domain', params.get('networkDomainId'), self.account.network_domains)
+        if domain is None:
+            raise not_found('network_domain', params.get('networkDomainId'))
+        first = domain * self.account.firewall_rules_per_domain
+        return self._page('firewallRules', self.account.firewall_rules_per_domain,
+                          lambda index: self.account.firewall_rule(first + index), firewall_rule_xml, params,
+                          FIREWALL_RULE_FILTERS)
+
+    def _get_firewall_rule(self, params, body, rule_id):
+        return self._single('firewall_rule', rule_id, self.account.firewall_rules, self.account.firewall_rule,
+                            firewall_rule_xml, 'firewallRule')
+
+    def _list_public_ip_blocks(self, params, body):
+        return self._page('publicIpBlocks', self.account.public_ip_blocks, self.account.public_ip_block,
+                          public_ip_block_xml, params, PUBLIC_IP_BLOCK_FILTERS)
+
+    def _get_public_ip_block(self, params, body, block_id):
+        return self._single('public_ip_block', block_id, self.account.public_ip_blocks,
+                            self.account.public_ip_block, public_ip_block_xml, 'publicIpBlock')
+
+    def _list_tags(self, params, body):
+        server = parse_id('server', params.get('assetId'), self.account.servers)
+        if server is not None:
+            # A server's own tags, without scanning every tag of the account
+            first = server * len(TAG_KEYS)
+            return self._page('tags', len(TAG_KEYS), lambda index: self.account.tag(first + index), tag_xml,
+                              params, TAG_FILTERS)
+        return self._page('tags', self.account.tags, self.account.tag, tag_xml, params, TAG_FILTERS)
+
+    def _list_tag_keys(self, params, body):
+        return self._page('tagKeys', len(TAG_KEYS), self.account.tag_key, tag_key_xml, params, TAG_KEY_FILTERS)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._answer('GET')
+
+    def do_POST(self):
+        self._answer('POST')
+
+    def _answer(self, method):
+        standin = self.server.standin
+        url = urlparse(self.path)
+        params = dict((key, values[-1]) for key, values in parse_qs(url.query).items())
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if not self.headers.get('Authorization', '').startswith('Basic '):
+            status, document, items = 401, 'Authentication required', 0
+        else:
+            status, document, items = standin.api.handle(method, url.path, params, body)
+        delay = standin.latency + standin.latency_per_item * items
+        if delay:
+            time.sleep(delay)
+        standin.record(method, url.path, status)
+        payload = document.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.standin.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StandInServer(object):
+    """A local HTTP server answering like the MCP API for a SyntheticAccount.
+
+    latency seconds are added to every response, and latency_per_item
+    seconds for every item in it, so bigger pages take longer like they do
+    on the real API.  Use it as a context manager, or start() and stop(),
+    and point didata at url with --api-url.
+    """
+
+    def __init__(self, account, host='127.0.0.1', port=0, latency=0.0, latency_per_item=0.0,
+                 max_page_size=MAX_PAGE_SIZE, default_page_size=DEFAULT_PAGE_SIZE, verbose=False):
+        self.api = StandInAPI(account, max_page_size, default_page_size)
+        self.latency = latency
+        self.latency_per_item = latency_per_item
+        self.verbose = verbose
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.standin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{0}:{1}'.format(host, port)
+
+    def record(self, method, path, status):
+        with self._lock:
+            self.requests.append((method, path, status))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--servers', type=int, default=1000)
+    parser.add_argument('--network-domains', type=int, help="Defaults to one per 100 servers")
+    parser.add_argument('--vlans-per-domain', type=int, default=2)
+    parser.add_argument('--firewall-rules-per-domain', type=int, default=20)
+    parser.add_argument('--public-ip-blocks-per-domain', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument('--latency-per-item', type=float, default=0.0, help="Seconds added per item in a response")
+    parser.add_argument('--max-page-size', type=int, default=MAX_PAGE_SIZE)
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args(argv)
+
+    account = SyntheticAccount(servers=args.servers, network_domains=args.network_domains,
+                               vlans_per_domain=args.vlans_per_domain,
+                               firewall_rules_per_domain=args.firewall_rules_per_domain,
+                               public_ip_blocks_per_domain=args.public_ip_blocks_per_domain)
+    standin = StandInServer(account, args.host, args.port, args.latency, args.latency_per_item,
+                            args.max_page_size, verbose=args.verbose)
+    print('Serving {0} servers in {1} network domains on {2}'.format(account.servers, account.network_domains,
+                                                                    standin.url))
+    try:
+        standin.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
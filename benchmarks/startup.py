@@ -0,0 +1,56 @@
+"""Measure didata start up time.
+
+Compares ``didata --help`` and a single command import against the cost of
+eagerly importing every command module and both libcloud drivers, which is
+what the CLI used to do on every invocation.
+
+Usage::
+
+    python -m benchmarks.startup [--runs 20]
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+SCENARIOS = [
+    ('didata --help', "from didata_cli.cli import cli; cli(['--help'])"),
+    ('server command + node driver', (
+        "import didata_cli.cli\n"
+        "import didata_cli.commands.cmd_server\n"
+        "didata_cli.cli._node_driver_class()"
+    )),
+    ('eager imports (old behaviour)', (
+        "import didata_cli.cli\n"
+        "from libcloud.compute.drivers.dimensiondata import DimensionDataNodeDriver\n"
+        "from libcloud.backup.drivers.dimensiondata import DimensionDataBackupDriver\n"
+        "from didata_cli.commands import cmd_backup, cmd_image, cmd_location, cmd_network, cmd_server, cmd_tag"
+    )),
+]
+
+
+def time_scenario(code, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.time()
+        subprocess.call([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        timings.append(time.time() - start)
+    timings.sort()
+    return timings[len(timings) // 2], min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    # Warm up the manifest and the bytecode caches first
+    subprocess.call([sys.executable, '-c', SCENARIOS[0][1]], stdout=subprocess.PIPE)
+    print('{0:<32} {1:>10} {2:>10}'.format('scenario', 'median ms', 'min ms'))
+    for name, code in SCENARIOS:
+        median, fastest = time_scenario(code, args.runs)
+        print('{0:<32} {1:>10.1f} {2:>10.1f}'.format(name, median * 1000, fastest * 1000))
+
+
+if __name__ == '__main__':
+    main()
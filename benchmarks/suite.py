@@ -0,0 +1,296 @@
+"""Benchmark didata's hot paths on synthetic accounts and catch regressions.
+
+Times the conversion of libcloud objects to rows (_node_to_dict,
+_firewall_rule_to_dict, _vlan_to_dict, _tag_to_dict), filtering a response
+(do_filter), every output renderer, flattenDict and whole ``server list``
+runs through CliRunner against the local API stand-in, at 100, 1k, 10k and
+100k items.  The fixtures are built from benchmarks.standin's synthetic
+account, nodes, firewall rules and tags are parsed from its XML by the
+driver itself, so they are shaped exactly like real ones.
+
+--save stores the results as the baseline, --check compares a run with the
+baseline and exits with 1 when a benchmark got slower than --threshold.
+Timings only compare on the same machine, save the baseline where the checks
+run (e.g. from the main branch on the CI runner).
+
+Usage::
+
+    python -m benchmarks.suite [--max-scale 10000] [--filter render] [--save | --check] [--threshold 0.25]
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from xml.etree import ElementTree
+
+from click.testing import CliRunner
+from libcloud.common.dimensiondata import DimensionDataNetworkDomain, DimensionDataVlan, TYPES_URN
+
+from benchmarks.flatten import server_payload
+from benchmarks.standin import (DATACENTERS, StandInServer, SyntheticAccount, firewall_rule_xml, server_xml,
+                                tag_xml)
+from didata_cli.cli import _node_driver_class, cli
+from didata_cli.commands.cmd_network import _firewall_rule_to_dict, _vlan_to_dict
+from didata_cli.commands.cmd_server import _node_to_dict
+from didata_cli.commands.cmd_tag import _tag_to_dict
+from didata_cli.filterable_response import VALID_PRINT_TYPES, DiDataCLIFilterableResponse
+from didata_cli.utils import flattenDict
+
+SCALES = (100, 1000, 10000, 100000)
+# Renderers going through tabulate are too slow to time at 100k rows
+TABULATE_SCALES = (100, 1000, 10000)
+DEFAULT_MAX_SCALE = 10000
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.25
+# Slowdowns smaller than this many seconds are noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 0.002
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+FILTER = "Where:State=='running'|ReturnKeys:Name,ID,State,Private IPv4 0"
+NAMESPACE = ' xmlns="{0}"'.format(TYPES_URN)
+
+
+class Benchmark(object):
+    """A timed function, run() is timed on what setup(scale) returns, then teardown is given it"""
+
+    def __init__(self, name, run, setup, scales=SCALES, teardown=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.scales = scales
+        self.teardown = teardown
+
+
+_fixtures = {}
+
+
+def _fixture(kind, scale, build):
+    # Fixtures are shared by the benchmarks of a run, parsing 100k nodes takes a while
+    if (kind, scale) not in _fixtures:
+        _fixtures[(kind, scale)] = build(scale)
+    return _fixtures[(kind, scale)]
+
+
+def synthetic_nodes(count):
+    account = SyntheticAccount(servers=count)
+    driver = _node_driver_class()('user', 'password', region='dd-na')
+    return [driver._to_node(ElementTree.fromstring(server_xml(account.server(index), namespace=NAMESPACE)))
+            for index in range(count)]
+
+
+def synthetic_firewall_rules(count):
+    account = SyntheticAccount(servers=100, firewall_rules_per_domain=count)
+    driver = _node_driver_class()('user', 'password', region='dd-na')
+    locations = [_location(driver, datacenter_id) for datacenter_id, _, _ in DATACENTERS]
+    network_domain = _network_domain(account, 0, locations[0])
+    return [driver._to_firewall_rule(
+        ElementTree.fromstring(firewall_rule_xml(account.firewall_rule(index), namespace=NAMESPACE)),
+        locations, network_domain) for index in range(count)]
+
+
+def synthetic_vlans(count):
+    account = SyntheticAccount(servers=count * 50)
+    driver = _node_driver_class()('user', 'password', region='dd-na')
+    vlans = []
+    for index in range(count):
+        vlan = account.vlan(index)
+        location = _location(driver, vlan['datacenterId'])
+        vlans.append(DimensionDataVlan(
+            id=vlan['id'], name=vlan['name'], description=vlan['description'],
+            network_domain=_network_domain(account, index // account.vlans_per_domain, location),
+            private_ipv4_range_address=vlan['privateIpv4'], private_ipv4_range_size=24,
+            ipv6_range_address=vlan['ipv6'], ipv6_range_size=64, ipv4_gateway=vlan['privateIpv4'][:-1] + '1',
+            ipv6_gateway=vlan['ipv6'][:-1] + '1', location=location, status=vlan['state']))
+    return vlans
+
+
+def synthetic_tags(count):
+    account = SyntheticAccount(servers=count)
+    driver = _node_driver_class()('user', 'password', region='dd-na')
+    return [driver._to_tag(ElementTree.fromstring(tag_xml(account.tag(index), namespace=NAMESPACE)))
+            for index in range(count)]
+
+
+def _location(driver, datacenter_id):
+    from libcloud.compute.base import NodeLocation
+    return NodeLocation(id=datacenter_id, name=datacenter_id, country='US', driver=driver)
+
+
+def _network_domain(account, index, location):
+    domain = account.network_domain(index)
+    return DimensionDataNetworkDomain(id=domain['id'], name=domain['name'], description=domain['description'],
+                                      location=location, status=domain['state'], plan=domain['type'])
+
+
+def _node_rows(scale):
+    return [_node_to_dict(node) for node in _fixture('nodes', scale, synthetic_nodes)]
+
+
+def _response(scale):
+    response = DiDataCLIFilterableResponse()
+    for row in _fixture('node_rows', scale, _node_rows):
+        response.add(row)
+    return response
+
+
+def _filter(rows):
+    response = DiDataCLIFilterableResponse()
+    response._list = list(rows)
+    response.do_filter(FILTER)
+
+
+def _renderer(print_type):
+    return Benchmark('render[{0}]'.format(print_type), lambda response: response.to_string(print_type),
+                     lambda scale: _fixture('response', scale, _response),
+                     TABULATE_SCALES if print_type not in ('pretty', 'idsonly', 'json', 'ndjson', 'csv', 'tsv')
+                     else SCALES)
+
+
+def _start_standin(scale):
+    return StandInServer(SyntheticAccount(servers=scale)).start()
+
+
+def _server_list(standin):
+    result = CliRunner().invoke(cli, ['--api-url', standin.url, '--user', 'user', '--password', 'password',
+                                      '--region', 'dd-na', '--output-type', 'csv', 'server', 'list'])
+    if result.exit_code != 0:
+        raise RuntimeError('server list failed: {0}'.format(result.output or result.exception))
+
+
+BENCHMARKS = [
+    Benchmark('_node_to_dict', lambda nodes: [_node_to_dict(node) for node in nodes],
+              lambda scale: _fixture('nodes', scale, synthetic_nodes)),
+    Benchmark('_node_to_dict[ID,Name,State]',
+              lambda nodes: [_node_to_dict(node, set(['ID', 'Name', 'State'])) for node in nodes],
+              lambda scale: _fixture('nodes', scale, synthetic_nodes)),
+    Benchmark('_firewall_rule_to_dict', lambda rules: [_firewall_rule_to_dict(rule) for rule in rules],
+              lambda scale: _fixture('firewall_rules', scale, synthetic_firewall_rules)),
+    Benchmark('_vlan_to_dict', lambda vlans: [_vlan_to_dict(vlan) for vlan in vlans],
+              lambda scale: _fixture('vlans', scale, synthetic_vlans)),
+    Benchmark('_tag_to_dict', lambda tags: [_tag_to_dict(tag) for tag in tags],
+              lambda scale: _fixture('tags', scale, synthetic_tags)),
+    Benchmark('do_filter', _filter, lambda scale: list(_fixture('response', scale, _response)._list)),
+] + [_renderer(print_type) for print_type in VALID_PRINT_TYPES] + [
+    Benchmark('flattenDict', lambda payloads: [flattenDict(payload) for payload in payloads],
+              lambda scale: [server_payload(index) for index in range(scale)]),
+    Benchmark('cli server list', _server_list, _start_standin, teardown=lambda standin: standin.stop()),
+]
+
+
+def time_benchmark(benchmark, scale, repeat):
+    """Return the median and fastest seconds of repeat runs"""
+    state = benchmark.setup(scale)
+    try:
+        timings = []
+        for _ in range(repeat):
+            start = time.time()
+            benchmark.run(state)
+            timings.append(time.time() - start)
+    finally:
+        if benchmark.teardown is not None:
+            benchmark.teardown(state)
+    timings.sort()
+    return timings[len(timings) // 2], timings[0]
+
+
+def run_suite(benchmarks, max_scale, repeat, report=None, scales=None):
+    """Return a dict of 'name@scale' to its median and fastest seconds, scales replaces the benchmarks' own"""
+    results = {}
+    for benchmark in benchmarks:
+        for scale in scales or benchmark.scales:
+            if scale > max_scale:
+                continue
+            median, fastest = time_benchmark(benchmark, scale, repeat)
+            key = '{0}@{1}'.format(benchmark.name, scale)
+            results[key] = {'median': median, 'min': fastest}
+            if report is not None:
+                report(key, results[key])
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return the keys of the results slower than the baseline by more than threshold (0.25 for 25%)"""
+    regressions = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        median, base = results[key]['median'], baseline[key]['median']
+        if median > base * (1 + threshold) and median - base > MIN_REGRESSION_SECONDS:
+            regressions.append(key)
+    return regressions
+
+
+def machine():
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.machine()}
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def save_baseline(path, results):
+    # Benchmarks not run this time keep their saved timings
+    baseline = load_baseline(path) or {'results': {}}
+    baseline['machine'] = machine()
+    baseline['results'].update(results)
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-scale', type=int, default=DEFAULT_MAX_SCALE,
+                        help="Largest fixture to run, 100000 runs every scale")
+    parser.add_argument('--scales', help="Comma separated scales to run instead of {0}".format(SCALES))
+    parser.add_argument('--filter', help="Only run the benchmarks whose name contains this")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help="Store the results as the baseline")
+    parser.add_argument('--check', action='store_true', help="Exit with 1 when a benchmark regressed")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Slowdown over the baseline that fails --check, 0.25 for 25%%")
+    args = parser.parse_args(argv)
+
+    benchmarks = [benchmark for benchmark in BENCHMARKS if not args.filter or args.filter in benchmark.name]
+    scales = tuple(int(scale) for scale in args.scales.split(',')) if args.scales else None
+    baseline = load_baseline(args.baseline)
+    saved = baseline['results'] if baseline else {}
+    if baseline and baseline.get('machine') != machine():
+        print('Warning: the baseline was saved on {0}'.format(baseline.get('machine')), file=sys.stderr)
+
+    print('{0:<36} {1:>10} {2:>10} {3:>12} {4:>8}'.format('benchmark', 'median ms', 'min ms', 'baseline ms',
+                                                        'change'))
+
+    def report(key, result):
+        line = '{0:<36} {1:>10.2f} {2:>10.2f}'.format(key, result['median'] * 1000, result['min'] * 1000)
+        if key in saved:
+            base = saved[key]['median']
+            line += ' {0:>12.2f} {1:>+8.0%}'.format(base * 1000, result['median'] / base - 1 if base else 0)
+        print(line)
+        sys.stdout.flush()
+
+    results = run_suite(benchmarks, args.max_scale, args.repeat, report, scales)
+    if args.save:
+        save_baseline(args.baseline, results)
+        print('Saved {0} results to {1}'.format(len(results), args.baseline))
+    if args.check:
+        if baseline is None:
+            print('No baseline at {0}, run with --save first'.format(args.baseline), file=sys.stderr)
+            return 1
+        regressions = compare(results, saved, args.threshold)
+        for key in regressions:
+            print('REGRESSION {0}: {1:.2f} ms, baseline {2:.2f} ms'.format(
+                key, results[key]['median'] * 1000, saved[key]['median'] * 1000), file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import hashlib
+import io
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from didata_cli.cli import DIDATA_HOME
+
+CACHE_DIR = os.path.join(DIDATA_HOME, 'cache')
+CACHE_FILENAME = 'responses.sqlite'
+
+# Read only driver calls that can be served from the cache, and the
+# resource type their responses belong to.
+CACHED_METHODS = {
+    'list_locations': 'location',
+    'list_images': 'image',
+    'ex_list_customer_images': 'image',
+    'ex_list_networks': 'network',
+    'ex_list_network_domains': 'network_domain',
+    'ex_get_network_domain': 'network_domain',
+    'ex_list_vlans': 'vlan',
+    'ex_list_firewall_rules': 'firewall_rule',
+    'ex_list_public_ip_blocks': 'public_ip_block',
+    'ex_list_tag_keys': 'tag_key',
+    'ex_list_tags': 'tag',
+}
+
+# Seconds a cached response stays valid for, per resource type
+RESOURCE_TTLS = {
+    'location': 24 * 60 * 60,
+    'image': 60 * 60,
+    'network': 10 * 60,
+    'network_domain': 10 * 60,
+    'vlan': 5 * 60,
+    'firewall_rule': 2 * 60,
+    'public_ip_block': 5 * 60,
+    'tag_key': 10 * 60,
+    'tag': 2 * 60,
+}
+
+# Driver calls that change resources, and the resource types whose cached
+# responses they make stale.
+INVALIDATING_METHODS = {
+    'ex_create_network': ('network',),
+    'ex_delete_network': ('network',),
+    'ex_create_network_domain': ('network_domain',),
+    'ex_delete_network_domain': ('network_domain', 'vlan', 'firewall_rule', 'public_ip_block'),
+    'ex_create_vlan': ('vlan',),
+    'ex_delete_vlan': ('vlan', 'tag'),
+    'ex_create_firewall_rule': ('firewall_rule',),
+    'ex_delete_firewall_rule': ('firewall_rule',),
+    'ex_add_public_ip_block_to_network_domain': ('public_ip_block',),
+    'ex_delete_public_ip_block': ('public_ip_block',),
+    'ex_create_tag_key': ('tag_key',),
+    'ex_modify_tag_key': ('tag_key', 'tag'),
+    'ex_remove_tag_key': ('tag_key', 'tag'),
+    'ex_apply_tag_to_asset': ('tag',),
+    'ex_remove_tag_from_asset': ('tag',),
+    'destroy_node': ('tag',),
+}
+
+DRIVER_PERSISTENT_ID = 'driver'
+
+
+class _DriverPickler(pickle.Pickler):
+    # libcloud objects keep a reference to the driver that created them,
+    # which holds sockets and locks.  Store a placeholder instead and hand
+    # the current driver back on load.
+    def __init__(self, file, driver):
+        pickle.Pickler.__init__(self, file, 2)
+        self._driver = driver
+
+    def persistent_id(self, obj):
+        if obj is self._driver:
+            return DRIVER_PERSISTENT_ID
+        return None
+
+
+class _DriverUnpickler(pickle.Unpickler):
+    def __init__(self, file, driver):
+        pickle.Unpickler.__init__(self, file)
+        self._driver = driver
+
+    def persistent_load(self, persistent_id):
+        if persistent_id == DRIVER_PERSISTENT_ID:
+            return self._driver
+        raise pickle.UnpicklingError("Unknown persistent id {0}".format(persistent_id))
+
+
+def _cache_key_part(value):
+    # libcloud objects passed as arguments (network domains, locations...)
+    # are identified by their ID
+    if isinstance(value, (list, tuple)):
+        return [_cache_key_part(item) for item in value]
+    if hasattr(value, 'id') and not isinstance(value, type):
+        return '{0}:{1}'.format(value.__class__.__name__, value.id)
+    return value
+
+
+class ResponseCache(object):
+    """SQLite store of pickled driver responses, expiring per resource type"""
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(CACHE_DIR, CACHE_FILENAME)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('CREATE TABLE IF NOT EXISTS responses ('
+                               'key TEXT PRIMARY KEY, resource TEXT, expires REAL, value BLOB)')
+            connection.execute('CREATE INDEX IF NOT EXISTS responses_resource ON responses (resource)')
+            connection.commit()
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def key(namespace, method, args, kwargs):
+        parts = repr((namespace, method, _cache_key_part(args), sorted(
+            (name, _cache_key_part(value)) for name, value in kwargs.items())))
+        return hashlib.sha1(parts.encode('utf-8')).hexdigest()
+
+    def get(self, key, driver):
+        row = self._connection().execute('SELECT value FROM responses WHERE key = ? AND expires > ?',
+                                         (key, time.time())).fetchone()
+        if row is None:
+            self.misses += 1
+            return None, False
+        self.hits += 1
+        return _DriverUnpickler(io.BytesIO(bytes(row[0])), driver).load(), True
+
+    def set(self, key, resource, value, driver):
+        buf = io.BytesIO()
+        try:
+            _DriverPickler(buf, driver).dump(value)
+        except Exception:
+            # Not everything a driver returns can be pickled, don't cache it
+            return
+        now = time.time()
+        connection = self._connection()
+        connection.execute('DELETE FROM responses WHERE expires <= ?', (now,))
+        connection.execute('INSERT OR REPLACE INTO responses (key, resource, expires, value) VALUES (?, ?, ?, ?)',
+                           (key, resource, now + RESOURCE_TTLS[resource], sqlite3.Binary(buf.getvalue())))
+        connection.commit()
+
+    def invalidate(self, resources):
+        connection = self._connection()
+        connection.executemany('DELETE FROM responses WHERE resource = ?', [(resource,) for resource in resources])
+        connection.commit()
+
+
+class CachingDriver(object):
+    """Wraps a libcloud driver so read only list calls are served from a ResponseCache.
+
+    Calls that change a resource type drop every cached response of that
+    type.  With refresh the cache is never read from, only written to.
+    """
+
+    def __init__(self, driver, cache, namespace, refresh=False):
+        self._driver = driver
+        self._cache = cache
+        self._namespace = namespace
+        self._refresh = refresh
+
+    @property
+    def uncached_driver(self):
+        return self._driver
+
+    def __getattr__(self, name):
+        attribute = getattr(self._driver, name)
+        if name in CACHED_METHODS:
+            return self._cached_call(name, attribute)
+        if name in INVALIDATING_METHODS:
+            return self._invalidating_call(name, attribute)
+        return attribute
+
+    def _cached_call(self, name, method):
+        def cached(*args, **kwargs):
+            key = self._cache.key(self._namespace, name, args, kwargs)
+            if not self._refresh:
+                value, found = self._cache.get(key, self._driver)
+                if found:
+                    return value
+            value = method(*args, **kwargs)
+            self._cache.set(key, CACHED_METHODS[name], value, self._driver)
+            return value
+        return cached
+
+    def _invalidating_call(self, name, method):
+        def invalidating(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self._cache.invalidate(INVALIDATING_METHODS[name])
+        return invalidating
@@ -1,25 +1,200 @@
 import click
+import hashlib
+import json
 import os
 import sys
+import threading
 
-from libcloud.compute.drivers.dimensiondata import DimensionDataNodeDriver
-from libcloud.backup.drivers.dimensiondata import DimensionDataBackupDriver
+# The libcloud drivers are imported on first use (see _node_driver_class and
+# _backup_driver_class) so that --help and commands which never talk to the
+# API don't pay for importing the whole libcloud stack.
+DimensionDataNodeDriver = None
+DimensionDataBackupDriver = None
 
 CONTEXT_SETTINGS = {
     'auto_envvar_prefix': 'MCP'
 }
 DEFAULT_OUTPUT_TYPE = 'pretty'
+DEFAULT_POOL_SIZE = 10
+DIDATA_HOME = os.path.join(os.path.expanduser('~'), '.didata')
+MANIFEST_FILENAME = 'command_manifest-{0}.json'
+MANIFEST_VERSION = 2
+# --region value that selects every Dimension Data region
+ALL_REGIONS = 'all'
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+try:
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import urlparse
+
+
+def _node_driver_class():
+    global DimensionDataNodeDriver
+    if DimensionDataNodeDriver is None:
+        from libcloud.compute.drivers.dimensiondata import DimensionDataNodeDriver as driver_class
+        DimensionDataNodeDriver = driver_class
+    return DimensionDataNodeDriver
+
+
+def _backup_driver_class():
+    global DimensionDataBackupDriver
+    if DimensionDataBackupDriver is None:
+        from libcloud.backup.drivers.dimensiondata import DimensionDataBackupDriver as driver_class
+        DimensionDataBackupDriver = driver_class
+    return DimensionDataBackupDriver
 
 
 class DiDataCLIClient(object):
     def __init__(self):
-        self.node = None
-        self.backup = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._credentials = None
+        self._adapter = None
+        self._drivers = []
+        self._cache = None
+        self._server_resolver = None
+        self.tracer = None
+        self.api_url = None
+        self.pool_size = DEFAULT_POOL_SIZE
+        self.refresh_cache = False
         self.verbose = False
+        self.regions = []
+
+    def init_client(self, user, password, region, pool_size=DEFAULT_POOL_SIZE, cache=False, refresh_cache=False,
+                    tracer=None, api_url=None):
+        # Drivers are built on first access so a command only constructs
+        # (and connects) the drivers it actually uses.  libcloud connections
+        # are not thread safe, so each thread gets its own drivers, but all
+        # of them send their requests through one pooled HTTP session.
+        self.regions = parse_regions(region)
+        self._credentials = (user, password)
+        self._local = threading.local()
+        self._adapter = None
+        self._drivers = []
+        self._server_resolver = None
+        self.pool_size = pool_size
+        self.refresh_cache = refresh_cache
+        self.tracer = tracer
+        self.api_url = api_url
+        self._cache = None
+        if cache or refresh_cache:
+            from didata_cli.cache import ResponseCache
+            self._cache = ResponseCache()
+
+    @property
+    def node(self):
+        if self._credentials is None:
+            return None
+        return self.node_for_region(self._single_region())
+
+    @property
+    def backup(self):
+        if self._credentials is None:
+            return None
+        return self._driver_for_region('backup', _backup_driver_class, self._single_region())
+
+    @property
+    def server_resolver(self):
+        if self._server_resolver is None:
+            from didata_cli.resolver import ServerResolver
+            self._server_resolver = ServerResolver(lambda: self.node)
+        return self._server_resolver
+
+    def node_for_region(self, region):
+        return self._driver_for_region('node', _node_driver_class, region)
+
+    def _single_region(self):
+        if len(self.regions) != 1:
+            raise click.UsageError("This command works on one region at a time, "
+                                   "--region names {0} regions".format(len(self.regions)))
+        return self.regions[0]
+
+    def _driver_for_region(self, kind, driver_class, region):
+        drivers = getattr(self._local, kind, None)
+        if drivers is None:
+            drivers = {}
+            setattr(self._local, kind, drivers)
+        if region not in drivers:
+            drivers[region] = self._build_driver(driver_class(), region, kind)
+        return drivers[region]
+
+    def _build_driver(self, driver_class, region, kind):
+        user, password = self._credentials
+        driver = driver_class(user, password, region=region)
+        if self.api_url is not None:
+            _use_api_url(driver.connection, self.api_url)
+        with self._lock:
+            self._share_connection(driver, region)
+            self._drivers.append((region, driver))
+        if self.tracer is not None:
+            self.tracer.instrument_connection(driver.connection)
+        if self._cache is not None:
+            from didata_cli.cache import CachingDriver
+            cache_key = (user, region) if self.api_url is None else (user, region, self.api_url)
+            driver = CachingDriver(driver, self._cache, cache_key, refresh=self.refresh_cache)
+        if self.tracer is not None:
+            # Outside the cache, so calls answered by the cache are traced too
+            driver = self.tracer.wrap_driver(driver, kind, region)
+        return driver
+
+    def _share_connection(self, driver, region):
+        # libcloud >= 2.0 talks HTTP through a requests session per driver,
+        # mount the shared keep-alive pool on it so sockets (and TLS
+        # handshakes) are reused between node, backup and worker drivers.
+        # The session itself is kept, with the proxies, certificates and
+        # timeout libcloud set on it.
+        session = getattr(getattr(driver.connection, 'connection', None), 'session', None)
+        if session is not None:
+            from requests.adapters import HTTPAdapter
+            adapter = self._shared_adapter()
+            for prefix in ('https://', 'http://'):
+                # Leave adapters libcloud mounted itself alone (e.g. for cert_file signing)
+                if type(session.get_adapter(prefix)) is HTTPAdapter:
+                    session.mount(prefix, adapter)
+
+        # Every driver looks up the organization id with an extra request,
+        # reuse the one already known by another driver for the region.
+        for other_region, other in self._drivers:
+            if other_region != region:
+                continue
+            org_id = getattr(other.connection, '_orgId', None)
+            if isinstance(org_id, string_types):
+                driver.connection._orgId = org_id
+                break
+
+    def _shared_adapter(self):
+        if self._adapter is None:
+            from requests.adapters import HTTPAdapter
+            self._adapter = HTTPAdapter(pool_maxsize=self.pool_size)
+        return self._adapter
+
+
+def _use_api_url(connection, api_url):
+    # The region still picks the API version and driver defaults, only
+    # where requests are sent changes (e.g. benchmarks/standin.py)
+    parsed = urlparse(api_url)
+    connection.secure = 1 if parsed.scheme == 'https' else 0
+    connection.host = parsed.hostname
+    connection.port = parsed.port or (443 if connection.secure else 80)
+    connection.connect()
+
+
+def parse_regions(region):
+    """Turn a --region value, one region, a comma separated list or all, into a list of regions"""
+    if region == ALL_REGIONS:
+        from libcloud.common.dimensiondata import API_ENDPOINTS
+        return sorted(name for name in API_ENDPOINTS if name.startswith('dd-'))
+    regions = []
+    for name in region.split(','):
+        name = name.strip()
+        if name and name not in regions:
+            regions.append(name)
+    return regions
 
-    def init_client(self, user, password, region):
-        self.node = DimensionDataNodeDriver(user, password, region=region)
-        self.backup = DimensionDataBackupDriver(user, password, region=region)
 
 pass_client = click.make_pass_decorator(DiDataCLIClient, ensure=True)
 cmd_folder = os.path.abspath(os.path.join(
@@ -28,19 +203,115 @@ cmd_folder = os.path.abspath(os.path.join(
 ))
 
 
+def _manifest_path():
+    # Kept in ~/.didata rather than the (maybe read only) package folder, one
+    # per installed copy of didata so virtualenvs don't overwrite each other's
+    folder_id = hashlib.md5(cmd_folder.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(DIDATA_HOME, MANIFEST_FILENAME.format(folder_id))
+
+
+def _scan_command_names():
+    commands = [
+        filename[4:-3]
+        for filename in os.listdir(cmd_folder)
+        if filename.endswith('.py') and filename.startswith('cmd_')
+    ]
+    commands.sort()
+
+    return commands
+
+
+def _command_files():
+    """Return the mtime and size of every command module, editing one of them makes the manifest stale"""
+    files = {}
+    for name in _scan_command_names():
+        stat = os.stat(os.path.join(cmd_folder, 'cmd_' + name + '.py'))
+        files[name] = [stat.st_mtime, stat.st_size]
+    return files
+
+
+def load_command_manifest():
+    """Return the cached command manifest, or None if it is missing or stale"""
+    try:
+        with open(_manifest_path(), 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+    except (IOError, OSError, ValueError):
+        return None
+    if manifest.get('version') == MANIFEST_VERSION and manifest.get('files') == _command_files():
+        return manifest
+    return None
+
+
+def build_command_manifest(get_command):
+    """Import every command module once and record its name and short help"""
+    commands = {}
+    for name in _scan_command_names():
+        command = get_command(name)
+        if command is None:
+            continue
+        # click 7 only works the short help out of the docstring on request
+        if hasattr(command, 'get_short_help_str'):
+            commands[name] = command.get_short_help_str()
+        else:
+            commands[name] = command.short_help or ''
+    return {
+        'version': MANIFEST_VERSION,
+        'files': _command_files(),
+        'commands': commands
+    }
+
+
+def save_command_manifest(manifest):
+    """Write the manifest, returns its path or None when it can't be written (it is rebuilt next time)"""
+    path = _manifest_path()
+    try:
+        if not os.path.isdir(DIDATA_HOME):
+            os.makedirs(DIDATA_HOME)
+        with open(path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=4, sort_keys=True)
+        return path
+    except (IOError, OSError):
+        return None
+
+
 class DiDataCLI(click.MultiCommand):
 
+    def __init__(self, *args, **kwargs):
+        super(DiDataCLI, self).__init__(*args, **kwargs)
+        self._manifest = None
+        self._commands = {}
+
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = load_command_manifest()
+        if self._manifest is None:
+            self._manifest = build_command_manifest(self._load_command)
+            save_command_manifest(self._manifest)
+        return self._manifest
+
     def list_commands(self, ctx):
-        commands = [
-            filename[4:-3]
-            for filename in os.listdir(cmd_folder)
-            if filename.endswith('.py') and filename.startswith('cmd_')
-        ]
-        commands.sort()
+        return sorted(self.manifest()['commands'])
+
+    def invoke(self, ctx):
+        # The arguments are consumed before cli runs, keep the command words
+        # (e.g. "server list") for the metrics labels
+        ctx.meta['didata.command_args'] = list(ctx.protected_args + ctx.args)
+        return super(DiDataCLI, self).invoke(ctx)
 
-        return commands
+    def format_commands(self, ctx, formatter):
+        # Render the command list straight from the manifest so --help does
+        # not have to import every command module (and libcloud with it).
+        rows = sorted(self.manifest()['commands'].items())
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
 
     def get_command(self, ctx, name):
+        return self._load_command(name)
+
+    def _load_command(self, name):
+        if name in self._commands:
+            return self._commands[name]
         try:
             if sys.version_info[0] == 2:
                 name = name.encode('ascii', 'replace')
@@ -54,6 +325,7 @@ class DiDataCLI(click.MultiCommand):
         except ImportError:
             return  # AF: Shouldn't just swallow this error; a module syntax error would be reported as command not found.
 
+        self._commands[name] = module.cli
         return module.cli
 
 
@@ -61,10 +333,31 @@ class DiDataCLI(click.MultiCommand):
 @click.option('--verbose', is_flag=True)
 @click.option('--user', allow_from_autoenv=True)
 @click.option('--password', allow_from_autoenv=True)
-@click.option('--region', allow_from_autoenv=True)
+@click.option('--region', allow_from_autoenv=True,
+              help="The region, a comma separated list of regions or all, lists are fetched from every region")
 @click.option('--output-type', default=DEFAULT_OUTPUT_TYPE)
+@click.option('--api-url', allow_from_autoenv=True,
+              help="Send API requests to this URL instead of the region's API host, e.g. http://127.0.0.1:8080")
+@click.option('--pool-size', type=click.IntRange(1, None), default=DEFAULT_POOL_SIZE,
+              help="Number of keep-alive HTTP connections shared by all API calls")
+@click.option('--cache/--no-cache', default=False,
+              help="Serve read only lists (locations, images, networks, vlans, tags...) from the local cache")
+@click.option('--refresh', is_flag=True, default=False, help="Fetch fresh lists and update the local cache")
+@click.option('--trace', is_flag=True, default=False,
+              help="Print the time, round trips and bytes of every API call made to stderr when done")
+@click.option('--trace-file', type=click.Path(dir_okay=False, writable=True),
+              help="Write the API calls made as a Chrome trace event file (chrome://tracing or Perfetto)")
+@click.option('--metrics-file', type=click.Path(dir_okay=False, writable=True),
+              help="Add this run's API call, cache and output counters to a node_exporter textfile when done")
+@click.option('--profile', is_flag=True, default=False,
+              help="Run the command under cProfile and print the functions it spent the most time in to stderr")
+@click.option('--profile-file', type=click.Path(dir_okay=False, writable=True),
+              help="Run the command under cProfile and write the stats to a .pstats file")
+@click.option('--profile-memory', is_flag=True, default=False,
+              help="Trace memory allocations and print the lines that allocated the most to stderr")
 @pass_client
-def cli(client, verbose, user, password, region, output_type):
+def cli(client, verbose, user, password, region, output_type, api_url, pool_size, cache, refresh, trace, trace_file,
+        metrics_file, profile, profile_file, profile_memory):
     """An interface into the Dimension Data Cloud"""
 
     # TODO: Fall back to credentials from "~/.dimensiondata"
@@ -75,7 +368,7 @@ def cli(client, verbose, user, password, region, output_type):
             err=True
         )
 
-        exit(1)
+        sys.exit(1)
 
     if not password:
         click.echo(
@@ -83,7 +376,7 @@ def cli(client, verbose, user, password, region, output_type):
             err=True
         )
 
-        exit(1)
+        sys.exit(1)
 
     if not region:
         click.echo(
@@ -91,9 +384,98 @@ def cli(client, verbose, user, password, region, output_type):
             err=True
         )
 
-        exit(1)
+        sys.exit(1)
 
-    client.init_client(user, password, region)
+    ctx = click.get_current_context()
+    if profile or profile_file or profile_memory:
+        _start_profiler(ctx, profile, profile_file, profile_memory)
+    tracer = None
+    if trace or trace_file or metrics_file:
+        from didata_cli.trace import Tracer
+        tracer = Tracer()
+    if metrics_file:
+        # Before the trace summary, so rendering it isn't counted as output
+        from didata_cli.metrics import RunMetrics
+        from didata_cli.filterable_response import RENDER_HOOKS
+        metrics = RunMetrics(_command_name(ctx))
+        RENDER_HOOKS.append(metrics.observe_render)
+        ctx.call_on_close(lambda: _finish_metrics(client, metrics, metrics_file))
+    if trace or trace_file:
+        ctx.call_on_close(lambda: _finish_trace(tracer, trace, trace_file))
+    client.init_client(user, password, region, pool_size=pool_size, cache=cache, refresh_cache=refresh,
+                       tracer=tracer, api_url=api_url)
     client.output_type = output_type
+    client.verbose = verbose
     if verbose:
         click.echo('Verbose mode enabled')
+
+
+def _start_profiler(ctx, summary, path, memory):
+    from didata_cli.profiling import Profiler
+    from didata_cli.filterable_response import RENDER_HOOKS
+    try:
+        profiler = Profiler(cpu=summary or bool(path), memory=memory)
+    except RuntimeError as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+    if memory:
+        RENDER_HOOKS.append(profiler.observe_render)
+    # Registered first, so writing metrics and traces isn't profiled
+    ctx.call_on_close(lambda: _finish_profiler(profiler, summary, path))
+    profiler.start()
+
+
+def _finish_profiler(profiler, summary, path):
+    from didata_cli.filterable_response import RENDER_HOOKS
+    profiler.stop()
+    if profiler.memory:
+        RENDER_HOOKS.remove(profiler.observe_render)
+        click.echo(profiler.memory_report(), err=True)
+    if summary:
+        click.echo(profiler.cpu_report(), err=True)
+    if path:
+        profiler.write_stats(path)
+
+
+def _command_name(ctx):
+    # e.g. "server list", the group and the command invoked in it
+    args = ctx.meta.get('didata.command_args', [])
+    words = [ctx.invoked_subcommand or '']
+    command = ctx.command.get_command(ctx, words[0]) if words[0] else None
+    if isinstance(command, click.MultiCommand) and len(args) > 1 and not args[1].startswith('-'):
+        words.append(args[1])
+    return ' '.join(words)
+
+
+def _exit_code():
+    # Close callbacks run while the exception ending the command is handled
+    error = sys.exc_info()[1]
+    if error is None:
+        return 0
+    if isinstance(error, SystemExit):
+        if error.code is None or isinstance(error.code, int):
+            return error.code or 0
+        return 1
+    return getattr(error, 'exit_code', 1)
+
+
+def _finish_metrics(client, metrics, path):
+    from didata_cli.filterable_response import RENDER_HOOKS
+    RENDER_HOOKS.remove(metrics.observe_render)
+    try:
+        metrics.write(path, _exit_code(), client.tracer, client._cache)
+    except (IOError, OSError) as e:
+        click.echo('Could not write metrics to {0}: {1}'.format(path, e), err=True)
+
+
+def _finish_trace(tracer, summary, path):
+    if path:
+        tracer.write_chrome_trace(path)
+    if summary:
+        from didata_cli.filterable_response import DiDataCLIFilterableResponse
+        response = DiDataCLIFilterableResponse()
+        for row in tracer.summary():
+            response.add(row)
+        if not response.is_empty():
+            click.echo(response.to_string('simple'), err=True)
+        click.echo('{0} API calls, {1} HTTP round trips'.format(len(tracer.spans), len(tracer.requests)), err=True)
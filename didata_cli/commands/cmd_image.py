@@ -1,7 +1,12 @@
 import click
 from didata_cli.cli import pass_client
 from libcloud.common.dimensiondata import DimensionDataAPIException
-from didata_cli.utils import handle_dd_api_exception
+from didata_cli.filterable_response import DiDataCLIFilterableResponse
+from didata_cli.utils import handle_dd_api_exception, list_in_datacenters, split_ids
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
 
 
 @click.group()
@@ -11,44 +16,60 @@ def cli(client):
 
 
 @cli.command()
-@click.option('--datacenterId', type=click.UNPROCESSED, help="Filter by datacenter Id")
+@click.option('--datacenterId', type=click.UNPROCESSED,
+              help="Filter by datacenter Id, a comma separated list is fetched concurrently")
+@click.option('--query', type=click.UNPROCESSED, help="The query to pass to the filterable response")
 @pass_client
-def list_base_images(client, datacenterid):
+def list_base_images(client, datacenterid, query):
     try:
-        images = client.node.list_images(location=datacenterid)
-        for image in images:
-            click.secho("{}".format(image.extra['OS_displayName']), bold=True)
-            click.secho("ID: {0}".format(image.id))
-            click.secho("Description: {0}".format(image.extra['description']))
-            click.secho("CPU Count: {0} Cores per Socket: {1} Speed: {2}".format(
-                image.extra['cpu'].cpu_count,
-                image.extra['cpu'].cores_per_socket,
-                image.extra['cpu'].performance
-            ))
-            click.secho("Memory: {0}GB".format(image.extra['memoryGb']))
-            click.secho("Location: {0}".format(image.extra['location'].id))
-            click.secho("")
+        def list_image_dicts(driver, location):
+            return [_image_to_dict(image) for image in driver.list_images(location=location)]
+
+        response = DiDataCLIFilterableResponse()
+        for item in list_in_datacenters(client, split_ids(datacenterid), list_image_dicts):
+            response.add(item)
+        if not response.is_empty():
+            if query is not None:
+                response.do_filter(query)
+            click.secho(response.to_string(client.output_type))
+        else:
+            click.secho("No images found", fg='red', bold=True)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
 
 @cli.command()
-@click.option('--datacenterId', type=click.UNPROCESSED, help="Filter by datacenter Id")
+@click.option('--datacenterId', type=click.UNPROCESSED,
+              help="Filter by datacenter Id, a comma separated list is fetched concurrently")
+@click.option('--query', type=click.UNPROCESSED, help="The query to pass to the filterable response")
 @pass_client
-def list_customer_images(client, datacenterid):
+def list_customer_images(client, datacenterid, query):
     try:
-        images = client.node.ex_list_customer_images(location=datacenterid)
-        for image in images:
-            click.secho("{}".format(image.extra['OS_displayName']), bold=True)
-            click.secho("ID: {0}".format(image.id))
-            click.secho("Description: {0}".format(image.extra['description']))
-            click.secho("CPU Count: {0} Cores per Socket: {1} Speed: {2}".format(
-                image.extra['cpu'].cpu_count,
-                image.extra['cpu'].cores_per_socket,
-                image.extra['cpu'].performance
-            ))
-            click.secho("Memory: {0}GB".format(image.extra['memoryGb']))
-            click.secho("Location: {0}".format(image.extra['location'].id))
-            click.secho("")
+        def list_image_dicts(driver, location):
+            return [_image_to_dict(image) for image in driver.ex_list_customer_images(location=location)]
+
+        response = DiDataCLIFilterableResponse()
+        for item in list_in_datacenters(client, split_ids(datacenterid), list_image_dicts):
+            response.add(item)
+        if not response.is_empty():
+            if query is not None:
+                response.do_filter(query)
+            click.secho(response.to_string(client.output_type))
+        else:
+            click.secho("No images found", fg='red', bold=True)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
+
+
+def _image_to_dict(image):
+    image_dict = OrderedDict()
+    image_dict['Name'] = image.name
+    image_dict['ID'] = image.id
+    image_dict['OS'] = image.extra['OS_displayName']
+    image_dict['Description'] = image.extra['description']
+    image_dict['CPU Count'] = image.extra['cpu'].cpu_count
+    image_dict['Cores per Socket'] = image.extra['cpu'].cores_per_socket
+    image_dict['CPU Performance'] = image.extra['cpu'].performance
+    image_dict['Memory GB'] = image.extra['memoryGb']
+    image_dict['Location'] = image.extra['location'].id
+    return image_dict
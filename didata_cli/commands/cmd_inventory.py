@@ -0,0 +1,211 @@
+import click
+import sys
+import time
+from didata_cli.cli import pass_client
+from didata_cli.commands.cmd_network import _firewall_rule_to_dict, _ip_block_to_dict, _network_domain_to_dict, \
+    _vlan_to_dict
+from didata_cli.commands.cmd_server import _node_to_dict
+from didata_cli.commands.cmd_tag import _tag_key_to_dict, _tag_to_dict
+from didata_cli.filterable_response import DiDataCLIFilter, DiDataCLIFilterableResponse
+from didata_cli.inventory import ADDED, CHANGED, REMOVED, Inventory, InventoryRecord, RESOURCE_TYPES
+from didata_cli.utils import live_driver, run_concurrently
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+FIREWALL_RULE_PAGE_SIZE = 250
+
+
+@click.group()
+@pass_client
+def cli(client):
+    pass
+
+
+@cli.command()
+@click.option('--type', 'types', multiple=True, type=click.Choice(list(RESOURCE_TYPES)),
+              help="Resource type to sync, can be given more than once, defaults to all of them")
+@click.option('--file', 'path', type=click.Path(dir_okay=False), help="Inventory file, ~/.didata/inventory.sqlite")
+@click.option('--changes-only', is_flag=True, default=False,
+              help="Print the resources added, changed or removed since the last sync instead of a summary")
+@pass_client
+def sync(client, types, path, changes_only):
+    inventory = Inventory(path)
+    tasks = [(region, resource_type) for region in client.regions for resource_type in types or RESOURCE_TYPES]
+
+    def fetch(task):
+        region, resource_type = task
+        return FETCHERS[resource_type](live_driver(client.node_for_region(region)))
+
+    response = DiDataCLIFilterableResponse()
+    failures = 0
+    for (region, resource_type), records, error, seconds in run_concurrently(fetch, tasks, client.pool_size):
+        if error is not None:
+            failures += 1
+            click.secho("Could not sync {0} in {1}: {2}".format(resource_type, region, error), fg='red', bold=True)
+            continue
+        changes = inventory.sync(region, resource_type, records)
+        if changes_only:
+            for change in changes:
+                response.add(_change_to_dict(region, resource_type, change))
+        else:
+            response.add(_sync_result_to_dict(region, resource_type, len(records), changes, seconds))
+    if not response.is_empty():
+        click.secho(response.to_string(client.output_type))
+    elif changes_only:
+        click.secho("No changes since the last sync", fg='green', bold=True)
+    if failures > 0:
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument('resource_type', type=click.Choice(list(RESOURCE_TYPES)))
+@click.option('--id', 'resource_id', type=click.UNPROCESSED, help="Find by ID")
+@click.option('--name', type=click.UNPROCESSED, help="Find by name")
+@click.option('--ip', type=click.UNPROCESSED, help="Find by IPv4 or IPv6 address")
+@click.option('--datacenterId', type=click.UNPROCESSED, help="Find by datacenter Id")
+@click.option('--tag', type=click.UNPROCESSED, help="Find assets with a tag, KEY or KEY=VALUE")
+@click.option('--query', type=click.UNPROCESSED, help="The query to pass to the filterable response")
+@click.option('--file', 'path', type=click.Path(dir_okay=False), help="Inventory file, ~/.didata/inventory.sqlite")
+@pass_client
+def query(client, resource_type, resource_id, name, ip, datacenterid, tag, query, path):
+    inventory = Inventory(path)
+    if not inventory.exists():
+        click.secho("No inventory found, run didata inventory sync first", fg='red', bold=True)
+        sys.exit(1)
+    lookups = dict(id=resource_id, name=name, ip=ip, datacenter=datacenterid)
+    if tag is not None:
+        tag_key, _, tag_value = tag.partition('=')
+        lookups['tag_key'] = tag_key
+        lookups['tag_value'] = tag_value if '=' in tag else None
+    cli_filter = None
+    if query is not None:
+        # Equality tests on indexed columns are answered by the index
+        cli_filter = DiDataCLIFilter(query)
+        fields = _lookup_fields(resource_type)
+        # The ip lookup matches any of a resource's addresses, so tests on one
+        # IP column are still checked locally
+        pushed = cli_filter.push_down(OrderedDict((field, fields[field]) for field in fields
+                                                  if lookups[fields[field]] is None),
+                                      RESOURCE_TYPES[resource_type].ip_keys)
+        for field in pushed:
+            lookups[fields[field]] = pushed[field]
+    response = DiDataCLIFilterableResponse()
+    for region, record in inventory.query(resource_type, client.regions, **lookups):
+        if len(client.regions) > 1:
+            record = OrderedDict([('Region', region)] + [(key, record[key]) for key in record])
+        response.add(record)
+    if not response.is_empty():
+        if cli_filter is not None:
+            response.do_filter(cli_filter)
+        click.secho(response.to_string(client.output_type))
+    else:
+        click.secho("No {0} found".format(resource_type.replace('_', ' ')), fg='red', bold=True)
+
+
+@cli.command()
+@click.option('--file', 'path', type=click.Path(dir_okay=False), help="Inventory file, ~/.didata/inventory.sqlite")
+@pass_client
+def status(client, path):
+    inventory = Inventory(path)
+    if not inventory.exists():
+        click.secho("No inventory found, run didata inventory sync first", fg='red', bold=True)
+        sys.exit(1)
+    response = DiDataCLIFilterableResponse()
+    for resource_type, region, count, synced in inventory.status():
+        status_dict = OrderedDict()
+        status_dict['Region'] = region
+        status_dict['Type'] = resource_type
+        status_dict['Count'] = count
+        status_dict['Synced'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(synced))
+        response.add(status_dict)
+    click.secho(response.to_string(client.output_type))
+
+
+def _lookup_fields(resource_type):
+    spec = RESOURCE_TYPES[resource_type]
+    fields = OrderedDict([('ID', 'id')])
+    if spec.name_key is not None:
+        fields[spec.name_key] = 'name'
+    for ip_key in spec.ip_keys:
+        fields[ip_key] = 'ip'
+    return fields
+
+
+def _sync_result_to_dict(region, resource_type, count, changes, seconds):
+    result_dict = OrderedDict()
+    result_dict['Region'] = region
+    result_dict['Type'] = resource_type
+    result_dict['Count'] = count
+    for change_type in (ADDED, CHANGED, REMOVED):
+        result_dict[change_type.capitalize()] = len([change for change in changes if change.change == change_type])
+    result_dict['Seconds'] = round(seconds, 3)
+    return result_dict
+
+
+def _change_to_dict(region, resource_type, change):
+    change_dict = OrderedDict()
+    change_dict['Change'] = change.change
+    change_dict['Region'] = region
+    change_dict['Type'] = resource_type
+    change_dict['ID'] = change.id
+    change_dict['Record'] = change.record
+    return change_dict
+
+
+def _fetch_servers(driver):
+    return [InventoryRecord(node.id, node.extra.get('datacenterId'), _node_to_dict(node))
+            for node in driver.list_nodes()]
+
+
+def _fetch_vlans(driver):
+    return [InventoryRecord(vlan.id, vlan.location.id, _vlan_to_dict(vlan)) for vlan in driver.ex_list_vlans()]
+
+
+def _fetch_network_domains(driver):
+    return [InventoryRecord(network_domain.id, network_domain.location.id, _network_domain_to_dict(network_domain))
+            for network_domain in driver.ex_list_network_domains()]
+
+
+def _fetch_firewall_rules(driver):
+    records = []
+    for network_domain in driver.ex_list_network_domains():
+        page_number = 1
+        while True:
+            rules = driver.ex_list_firewall_rules(network_domain, page_size=FIREWALL_RULE_PAGE_SIZE,
+                                                  page_number=page_number)
+            records.extend(InventoryRecord(rule.id, rule.location.id, _firewall_rule_to_dict(rule)) for rule in rules)
+            if len(rules) < FIREWALL_RULE_PAGE_SIZE:
+                break
+            page_number += 1
+    return records
+
+
+def _fetch_public_ip_blocks(driver):
+    records = []
+    for network_domain in driver.ex_list_network_domains():
+        records.extend(InventoryRecord(ip_block.id, network_domain.location.id, _ip_block_to_dict(ip_block))
+                       for ip_block in driver.ex_list_public_ip_blocks(network_domain))
+    return records
+
+
+def _fetch_tags(driver):
+    # Tags have no ID of their own, an asset has at most one tag per key
+    return [InventoryRecord('{0}/{1}'.format(tag.asset_id, tag.key.id), tag.datacenter, _tag_to_dict(tag))
+            for tag in driver.ex_list_tags()]
+
+
+def _fetch_tag_keys(driver):
+    return [InventoryRecord(tag_key.id, None, _tag_key_to_dict(tag_key)) for tag_key in driver.ex_list_tag_keys()]
+
+
+FETCHERS = {
+    'servers': _fetch_servers,
+    'vlans': _fetch_vlans,
+    'network_domains': _fetch_network_domains,
+    'firewall_rules': _fetch_firewall_rules,
+    'public_ip_blocks': _fetch_public_ip_blocks,
+    'tags': _fetch_tags,
+    'tag_keys': _fetch_tag_keys,
+}
@@ -5,7 +5,8 @@ from libcloud.common.dimensiondata import DimensionDataVlan
 from libcloud.common.dimensiondata import DimensionDataFirewallRule
 from libcloud.common.dimensiondata import DimensionDataFirewallAddress
 from didata_cli.filterable_response import DiDataCLIFilterableResponse
-from didata_cli.utils import handle_dd_api_exception
+from didata_cli.utils import handle_dd_api_exception, list_in_datacenters, split_ids
+from didata_cli.wait import wait_for_vlans, wait_options
 try:
     from collections import OrderedDict
 except ImportError:
@@ -19,7 +20,8 @@ def cli(client):
 
 
 @cli.command()
-@click.option('--datacenterId', type=click.UNPROCESSED, help="Filter by datacenter Id")
+@click.option('--datacenterId', type=click.UNPROCESSED,
+              help="Filter by datacenter Id, a comma separated list is fetched concurrently")
 @click.option('--networkDomainId', type=click.UNPROCESSED, help="Filter by network domain")
 @click.option('--query', help="Query to pass to processing before outputting vlans")
 @pass_client
@@ -27,13 +29,17 @@ def list_vlans(client, datacenterid, networkdomainid, query):
     try:
         if networkdomainid is not None:
             networkdomainid = DimensionDataNetworkDomain(networkdomainid, None, None, None, None, None)
-        vlans = client.node.ex_list_vlans(
-            location=datacenterid,
-            network_domain=networkdomainid
-        )
+
+        def list_vlan_dicts(driver, location):
+            vlans = driver.ex_list_vlans(
+                location=location,
+                network_domain=networkdomainid
+            )
+            return [_vlan_to_dict(vlan) for vlan in vlans]
+
         response = DiDataCLIFilterableResponse()
-        for vlan in vlans:
-            response.add(_vlan_to_dict(vlan))
+        for item in list_in_datacenters(client, split_ids(datacenterid), list_vlan_dicts):
+            response.add(item)
         if not response.is_empty():
             if query is not None:
                 response.do_filter(query)
@@ -50,12 +56,15 @@ def list_vlans(client, datacenterid, networkdomainid, query):
 @click.option('--baseIpv4Address', required=True, type=click.UNPROCESSED, help="Base IPv4 Address")
 @click.option('--description', type=click.UNPROCESSED, help="Description of the VLAN")
 @click.option('--prefixSize', type=click.UNPROCESSED, help="Prefix Size", default='24')
+@wait_options
 @pass_client
-def create_vlan(client, networkdomainid, name, baseipv4address, description, prefixsize):
+def create_vlan(client, networkdomainid, name, baseipv4address, description, prefixsize, wait, timeout):
     try:
-        networkdomainid = DimensionDataNetworkDomain(networkdomainid, None, None, None, None, None)
-        vlan = client.node.ex_create_vlan(networkdomainid, name, baseipv4address, description, prefixsize)
+        networkdomain = DimensionDataNetworkDomain(networkdomainid, None, None, None, None, None)
+        vlan = client.node.ex_create_vlan(networkdomain, name, baseipv4address, description, prefixsize)
         click.secho("Successfully created VLAN {0}".format(vlan.id), bold=True, fg='green')
+        if wait:
+            wait_for_vlans(client, [vlan.id], timeout, network_domain=networkdomainid)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
@@ -76,15 +85,19 @@ def delete_vlan(client, vlanid):
 
 
 @cli.command()
-@click.option('--datacenterId', type=click.UNPROCESSED, help="Filter by datacenter Id")
+@click.option('--datacenterId', type=click.UNPROCESSED,
+              help="Filter by datacenter Id, a comma separated list is fetched concurrently")
 @click.option('--query', help="Query to pass to processing before outputting network domains")
 @pass_client
 def list_network_domains(client, datacenterid, query):
     try:
-        network_domains = client.node.ex_list_network_domains(location=datacenterid)
+        def list_network_domain_dicts(driver, location):
+            network_domains = driver.ex_list_network_domains(location=location)
+            return [_network_domain_to_dict(network_domain) for network_domain in network_domains]
+
         response = DiDataCLIFilterableResponse()
-        for network_domain in network_domains:
-            response.add(_network_domain_to_dict(network_domain))
+        for item in list_in_datacenters(client, split_ids(datacenterid), list_network_domain_dicts):
+            response.add(item)
         if not response.is_empty():
             if query is not None:
                 response.do_filter(query)
@@ -138,18 +151,24 @@ def create_network(client, datacenterid, name, serviceplan):
 
 
 @cli.command()
-@click.option('--datacenterId', type=click.UNPROCESSED, help="Filter by datacenter Id")
+@click.option('--datacenterId', type=click.UNPROCESSED,
+              help="Filter by datacenter Id, a comma separated list is fetched concurrently")
+@click.option('--query', help="Query to pass to processing before outputting networks")
 @pass_client
-def list_networks(client, datacenterid):
+def list_networks(client, datacenterid, query):
     try:
-        networks = client.node.ex_list_networks(location=datacenterid)
-        for network in networks:
-            click.secho("{0}".format(network.name), bold=True)
-            click.secho("ID: {0}".format(network.id))
-            click.secho("Description: {0}".format(network.description))
-            click.secho("PrivateNet: {0}".format(network.private_net))
-            click.secho("Location: {0}".format(network.location.id))
-            click.secho("")
+        def list_network_dicts(driver, location):
+            return [_network_to_dict(network) for network in driver.ex_list_networks(location=location)]
+
+        response = DiDataCLIFilterableResponse()
+        for item in list_in_datacenters(client, split_ids(datacenterid), list_network_dicts):
+            response.add(item)
+        if not response.is_empty():
+            if query is not None:
+                response.do_filter(query)
+            click.secho(response.to_string(client.output_type))
+        else:
+            click.secho("No networks found", fg='red', bold=True)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
@@ -304,6 +323,16 @@ def _vlan_to_dict(vlan):
     return vlan_dict
 
 
+def _network_to_dict(network):
+    network_dict = OrderedDict()
+    network_dict['Name'] = network.name
+    network_dict['ID'] = network.id
+    network_dict['Description'] = network.description
+    network_dict['PrivateNet'] = network.private_net
+    network_dict['Location'] = network.location.id
+    return network_dict
+
+
 def _network_domain_to_dict(network_domain):
     network_domain_dict = OrderedDict()
     network_domain_dict['Name'] = network_domain.name
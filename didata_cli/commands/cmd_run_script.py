@@ -0,0 +1,69 @@
+import click
+import shlex
+import sys
+from didata_cli.cli import pass_client
+from didata_cli.filterable_response import DiDataCLIFilterableResponse
+from didata_cli.utils import invoke_command_line, run_concurrently
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+# Commands which make no sense from inside a script
+UNSCRIPTABLE_COMMANDS = ('shell', 'run_script')
+
+
+@click.command()
+@click.argument('script', type=click.File('r'))
+@click.option('--workers', type=click.IntRange(1, None), default=1,
+              help="Number of lines to run at the same time, lines must be independent when > 1")
+@click.option('--summary/--no-summary', default=True, help="Print the exit status and time of every line")
+@pass_client
+@click.pass_context
+def cli(ctx, client, script, workers, summary):
+    """Run a file of didata commands in one process"""
+    lines = []
+    for line_number, line in enumerate(script, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        lines.append((line_number, line))
+
+    def run_line(numbered_line):
+        line_number, line = numbered_line
+        try:
+            args = shlex.split(line)
+        except ValueError as e:
+            click.secho("Line {0}: could not parse command: {1}".format(line_number, e), fg='red', bold=True)
+            return 2
+        if args[0] == 'didata':
+            args = args[1:]
+        if len(args) == 0 or args[0] in UNSCRIPTABLE_COMMANDS:
+            click.secho("Line {0}: not a runnable command".format(line_number), fg='red', bold=True)
+            return 2
+        return invoke_command_line(ctx, args)
+
+    results = run_concurrently(run_line, lines, workers)
+    response = DiDataCLIFilterableResponse()
+    failures = 0
+    for (line_number, line), exit_code, error, seconds in results:
+        if error is not None:
+            click.secho("Line {0}: {1}".format(line_number, error), fg='red', bold=True)
+            exit_code = 1
+        if exit_code != 0:
+            failures += 1
+        response.add(_result_to_dict(line_number, line, exit_code, seconds))
+    if summary and not response.is_empty():
+        click.secho(response.to_string(client.output_type))
+    if failures > 0:
+        click.secho("{0} of {1} lines failed".format(failures, len(results)), fg='red', bold=True)
+        sys.exit(1)
+
+
+def _result_to_dict(line_number, line, exit_code, seconds):
+    result_dict = OrderedDict()
+    result_dict['Line'] = line_number
+    result_dict['Exit Code'] = exit_code
+    result_dict['Seconds'] = round(seconds, 3)
+    result_dict['Command'] = line
+    return result_dict
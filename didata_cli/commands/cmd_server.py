@@ -1,14 +1,47 @@
 import click
+import json
+import sys
+import time
 from didata_cli.cli import pass_client
-from didata_cli.filterable_response import DiDataCLIFilterableResponse
+from didata_cli.filterable_response import DiDataCLIFilter, DiDataCLIFilterableResponse
+from didata_cli.query import where_fields
 from libcloud.common.dimensiondata import DimensionDataAPIException
-from didata_cli.utils import handle_dd_api_exception, get_single_server_id_from_filters
+from didata_cli.utils import handle_dd_api_exception, get_server_ids_from_filters, get_single_server_id_from_filters, \
+    list_in_regions, live_driver, run_concurrently, server_filter_list_options, server_filter_options
+from didata_cli.wait import wait_for_nodes, wait_options
+from didata_cli.watch import ADDED, CHANGED, ChangeIndex
 try:
     from collections import OrderedDict
 except ImportError:
     from ordereddict import OrderedDict
 
 
+# Server list keys the API can filter on, and the list_nodes filter that
+# matches them.  State is left out, the API state is not the NodeState shown.
+PUSHDOWN_FIELDS = OrderedDict([
+    ('Name', 'name'),
+    ('datacenterId', 'location'),
+    ('networkDomainId', 'network_domain'),
+    ('networkId', 'network'),
+    ('sourceImageId', 'image'),
+    ('ipv6', 'ipv6'),
+    ('Private IPv4 0', 'ipv4')
+])
+# The API's ipv4 and ipv6 filters match an address on any NIC, these columns
+# only hold the primary NIC's, so they are still checked locally as well
+PUSHDOWN_KEEP_FIELDS = frozenset(['Private IPv4 0', 'ipv6'])
+WATCH_INTERVAL = 60
+# Server list keys that don't come from node.extra
+NODE_BASE_KEYS = frozenset(['Name', 'ID', 'Private IPv4 0', 'State'])
+# Server list keys built from node.extra['cpu'] and each of node.extra['disks']
+NODE_CPU_KEYS = OrderedDict([
+    ('CPU Count', 'cpu_count'),
+    ('Cores per Socket', 'cores_per_socket'),
+    ('CPU Performance', 'performance')
+])
+NODE_DISK_KEYS = ((' ID', 'id'), (' Size', 'size_gb'), (' Speed', 'speed'), (' State', 'state'))
+
+
 @click.group()
 @pass_client
 def cli(client):
@@ -22,43 +55,96 @@ def cli(client):
 def info(client, serverid, query):
     node = client.node.ex_get_node_by_id(serverid)
     if node:
+        cli_filter = DiDataCLIFilter(query) if query is not None else None
         response = DiDataCLIFilterableResponse()
-        response.add(_node_to_dict(node))
-        if query is not None:
-            response.do_filter(query)
+        response.add(_node_to_dict(node, _node_keys(cli_filter)))
+        if cli_filter is not None:
+            response.do_filter(cli_filter)
         click.secho(response.to_string(client.output_type))
     else:
         click.secho("No node found for id {0}".format(serverid), fg='red', bold=True)
 
 
+def _list_filter_options(func):
+    for option in reversed([
+        click.option('--datacenterId', type=click.UNPROCESSED, help="Filter by datacenter Id"),
+        click.option('--networkDomainId', type=click.UNPROCESSED, help="Filter by network domain Id"),
+        click.option('--networkId', type=click.UNPROCESSED, help="Filter by network id"),
+        click.option('--vlanId', type=click.UNPROCESSED, help="Filter by vlan id"),
+        click.option('--sourceImageId', type=click.UNPROCESSED, help="Filter by source image id"),
+        click.option('--deployed', help="Filter by deployed state"),
+        click.option('--name', help="Filter by server name"),
+        click.option('--state', help="Filter by state"),
+        click.option('--started', help="Filter by started"),
+        click.option('--ipv6', help="Filter by ipv6"),
+        click.option('--privateIpv4', help="Filter by private ipv4"),
+    ]):
+        func = option(func)
+    return func
+
+
+def _list_filters(client, datacenterid, networkdomainid, networkid, vlanid, sourceimageid, deployed, name,
+                  state, started, ipv6, privateipv4, query):
+    """Return the list_nodes filters and the DiDataCLIFilter (or None) for the server list options"""
+    filters = dict(location=datacenterid, name=name, network=networkid, network_domain=networkdomainid,
+                   vlan=vlanid, image=sourceimageid, deployed=deployed, started=started, state=state,
+                   ipv6=ipv6, ipv4=privateipv4)
+    cli_filter = None
+    if query is not None:
+        cli_filter = DiDataCLIFilter(query)
+        filters.update(_push_down(client, cli_filter,
+                                  [field for field in PUSHDOWN_FIELDS if filters[PUSHDOWN_FIELDS[field]] is None]))
+    return filters, cli_filter
+
+
+def _push_down(client, cli_filter, fields):
+    """Take the tests on fields out of cli_filter and return them as list_nodes filters"""
+    pushed = cli_filter.push_down(fields, PUSHDOWN_KEEP_FIELDS)
+    filters = {}
+    for field in pushed:
+        filters[PUSHDOWN_FIELDS[field]] = pushed[field]
+        if client.verbose:
+            click.echo("Filtering {0} == '{1}' in the API".format(field, pushed[field]), err=True)
+    return filters
+
+
 @cli.command()
-@click.option('--datacenterId', type=click.UNPROCESSED, help="Filter by datacenter Id")
-@click.option('--networkDomainId', type=click.UNPROCESSED, help="Filter by network domain Id")
-@click.option('--networkId', type=click.UNPROCESSED, help="Filter by network id")
-@click.option('--vlanId', type=click.UNPROCESSED, help="Filter by vlan id")
-@click.option('--sourceImageId', type=click.UNPROCESSED, help="Filter by source image id")
-@click.option('--deployed', help="Filter by deployed state")
-@click.option('--name', help="Filter by server name")
-@click.option('--state', help="Filter by state")
-@click.option('--started', help="Filter by started")
-@click.option('--ipv6', help="Filter by ipv6")
-@click.option('--privateIpv4', help="Filter by private ipv4")
+@_list_filter_options
 @click.option('--idsonly', is_flag=True, default=False, help="Only dump server ids")
 @click.option('--query', type=click.UNPROCESSED, help="The query to pass to the filterable response")
+@click.option('--stream', is_flag=True, default=False,
+              help="Print servers page by page as they arrive (pretty, idsonly, ndjson, csv and tsv output only)")
 @pass_client
 def list(client, datacenterid, networkdomainid, networkid,
          vlanid, sourceimageid, deployed, name,
-         state, started, ipv6, privateipv4, idsonly, query):
-    node_list = client.node.list_nodes(ex_location=datacenterid, ex_name=name, ex_network=networkid,
-                                       ex_network_domain=networkdomainid, ex_vlan=vlanid,
-                                       ex_image=sourceimageid, ex_deployed=deployed, ex_started=started,
-                                       ex_state=state, ex_ipv6=ipv6, ex_ipv4=privateipv4)
+         state, started, ipv6, privateipv4, idsonly, query, stream):
+    filters, cli_filter = _list_filters(client, datacenterid, networkdomainid, networkid, vlanid, sourceimageid,
+                                        deployed, name, state, started, ipv6, privateipv4, query)
+    if stream:
+        print_type = 'idsonly' if idsonly else client.output_type
+        if not DiDataCLIFilterableResponse.is_streamable_print_type(print_type):
+            click.secho("Output type {0} can not be streamed".format(print_type), fg='red', bold=True)
+            sys.exit(1)
+        items = _paged_node_dicts(client, filters, _node_keys(cli_filter, idsonly))
+        line_count = 0
+        for line in DiDataCLIFilterableResponse().stream(items, print_type, cli_filter):
+            click.secho(line)
+            line_count += 1
+        if line_count == 0:
+            click.secho("No nodes found", fg='red', bold=True)
+        return
+    keys = _node_keys(cli_filter, idsonly)
+
+    def list_node_dicts(driver):
+        node_list = driver.list_nodes(**dict(('ex_' + key, filters[key]) for key in filters))
+        return [_node_to_dict(node, keys) for node in node_list]
+
     response = DiDataCLIFilterableResponse()
-    for node in node_list:
-        response.add(_node_to_dict(node))
+    for item in list_in_regions(client, list_node_dicts):
+        response.add(item)
     if not response.is_empty():
-        if query is not None:
-            response.do_filter(query)
+        if cli_filter is not None:
+            response.do_filter(cli_filter)
         if idsonly:
             click.secho(response.to_string('idsonly'))
         else:
@@ -67,37 +153,85 @@ def list(client, datacenterid, networkdomainid, networkid,
         click.secho("No nodes found", fg='red', bold=True)
 
 
+@cli.command()
+@_list_filter_options
+@click.option('--query', type=click.UNPROCESSED, help="The query to pass to the filterable response")
+@click.option('--interval', type=click.IntRange(1, None), default=WATCH_INTERVAL, help="Seconds between polls")
+@click.option('--count', type=click.IntRange(0, None), default=0,
+              help="Stop after this many polls, by default polls until interrupted")
+@click.option('--skip-existing', is_flag=True, default=False,
+              help="Don't print the servers found by the first poll")
+@pass_client
+def watch(client, datacenterid, networkdomainid, networkid,
+          vlanid, sourceimageid, deployed, name,
+          state, started, ipv6, privateipv4, query, interval, count, skip_existing):
+    filters, cli_filter = _list_filters(client, datacenterid, networkdomainid, networkid, vlanid, sourceimageid,
+                                        deployed, name, state, started, ipv6, privateipv4, query)
+
+    def list_node_dicts(region):
+        node_list = live_driver(client.node_for_region(region)).list_nodes(
+            **dict(('ex_' + key, filters[key]) for key in filters))
+        node_dicts = [_node_to_dict(node) for node in node_list]
+        if cli_filter is not None and cli_filter.predicate is not None:
+            node_dicts = [node_dict for node_dict in node_dicts if cli_filter.predicate(node_dict)]
+        return node_dicts
+
+    index = ChangeIndex()
+    polls = 0
+    try:
+        while True:
+            for region, node_dicts, error, _ in run_concurrently(list_node_dicts, client.regions, client.pool_size):
+                # The servers of a region that failed to list are kept for the next poll
+                if error is not None:
+                    click.echo("Could not list servers in {0}: {1}".format(region, error), err=True)
+                    continue
+                for event in index.update(node_dicts, region):
+                    if polls == 0 and skip_existing:
+                        continue
+                    click.echo(json.dumps(_watch_event_to_dict(event, cli_filter, len(client.regions) > 1)))
+            polls += 1
+            if polls == count:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
 @cli.command()
 @click.option('--serverId', help="The server ID to add a disk on")
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@server_filter_options
 @click.option('--size', required=True, type=click.INT, help="The size of the disk (in GB) to add")
 @click.option('--speed', default='STANDARD', type=click.Choice(['STANDARD', 'ECONOMY', 'HIGHPERFORMANCE']))
+@wait_options
 @pass_client
-def add_disk(client, serverid, serverfilteripv6, size, speed):
+def add_disk(client, serverid, serverfilters, size, speed, wait, timeout):
     node = None
     if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
+        serverid = get_single_server_id_from_filters(client, **serverfilters)
     node = client.node.ex_get_node_by_id(serverid)
     try:
         response = client.node.ex_add_storage_to_node(node, size, speed)
         if response is True:
             click.secho("Adding disk {0} {1}GB to {2}".format(speed, size, serverid), fg='green', bold=True)
+            if wait:
+                wait_for_nodes(client, [serverid], timeout)
         else:
             click.secho("Something went wrong attempting to add disk to {0}".format(serverid), fg='red', bold=True)
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
 
 @cli.command()
 @click.option('--serverId', help="The server ID to add a disk on")
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@server_filter_options
 @click.option('--diskId', required=True, type=click.INT, help="The size of the disk (in GB) to add")
+@wait_options
 @pass_client
-def remove_disk(client, serverid, serverfilteripv6, diskid):
+def remove_disk(client, serverid, serverfilters, diskid, wait, timeout):
     node = None
     if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
+        serverid = get_single_server_id_from_filters(client, **serverfilters)
     node = client.node.ex_get_node_by_id(serverid)
 
     # See if we can find the disk to remove
@@ -107,35 +241,38 @@ def remove_disk(client, serverid, serverfilteripv6, diskid):
         response = client.node.ex_remove_storage_from_node(node, disk_to_remove.id)
         if response is True:
             click.secho("Removed disk {0} from {1}".format(disk_to_remove.id, serverid), fg='green', bold=True)
+            if wait:
+                wait_for_nodes(client, [serverid], timeout)
         else:
             click.secho("Something went wrong attempting to remove disk {0} from {1}".format(disk_to_remove.id,
                                                                                              serverid),
                         fg='red', bold=True)
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
 
 @cli.command()
 @click.option('--serverId', help="The server ID to add a disk on")
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@server_filter_options
 @click.option('--diskId', required=True, type=click.INT, help="The size of the disk (in GB) to add")
 @click.option('--size', type=click.INT, help="The size of the disk (in GB) to add")
 @click.option('--speed', type=click.Choice(['STANDARD', 'ECONOMY', 'HIGHPERFORMANCE']))
+@wait_options
 @pass_client
-def modify_disk(client, serverid, serverfilteripv6, diskid, size, speed):
+def modify_disk(client, serverid, serverfilters, diskid, size, speed, wait, timeout):
     # Validate parameters, wish click had exculsion
     if size is not None and speed is not None:
         click.secho("Only one modify disk operation can happen at a time.  Please choose either --speed or --size",
                     fg='red', bold=True)
-        exit(1)
+        sys.exit(1)
     elif size is None and speed is None:
         click.secho("Must choose one of --speed or --size to change", fg='red', bold=True)
-        exit(1)
+        sys.exit(1)
 
     node = None
     if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
+        serverid = get_single_server_id_from_filters(client, **serverfilters)
     node = client.node.ex_get_node_by_id(serverid)
 
     # See if we can find the disk to modify
@@ -149,11 +286,13 @@ def modify_disk(client, serverid, serverfilteripv6, diskid, size, speed):
         if response is True:
             click.secho("Successfully modified disk {0} from {1}".format(disk_to_modify.scsi_id, serverid),
                         fg='green', bold=True)
+            if wait:
+                wait_for_nodes(client, [serverid], timeout)
         else:
             click.secho("Something went wrong attempting to modify disk {0} from {1}".format(disk_to_modify.id,
                                                                                              serverid),
                         fg='red', bold=True)
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
@@ -166,181 +305,275 @@ def modify_disk(client, serverid, serverfilteripv6, diskid, size, speed):
 @click.option('--administratorPassword', required=True, type=click.UNPROCESSED, help="The administrator password")
 @click.option('--networkDomainId', required=True, type=click.UNPROCESSED, help="The network domain Id to deploy on")
 @click.option('--vlanId', required=True, type=click.UNPROCESSED, help="The vlan Id to deploy on")
+@wait_options
 @pass_client
-def create(client, name, description, imageid, autostart, administratorpassword, networkdomainid, vlanid):
+def create(client, name, description, imageid, autostart, administratorpassword, networkdomainid, vlanid,
+           wait, timeout):
     try:
         response = client.node.create_node(name, imageid, administratorpassword,
                                            description, ex_network_domain=networkdomainid,
                                            ex_vlan=vlanid, ex_is_started=autostart)
+        client.server_resolver.invalidate()
         click.secho("Node starting up: {0}.  IPv6: {1}".format(response.id, response.extra['ipv6']),
                     fg='green', bold=True)
+        if wait:
+            wait_for_nodes(client, [response.id], timeout)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
 
 @cli.command()
 @click.option('--serverId', type=click.UNPROCESSED, help='The server ID to destroy')
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@server_filter_options
 @click.option('--ramInGB', required=True, help='Amount of RAM to change the server to', type=int)
+@wait_options
 @pass_client
-def update_ram(client, serverid, serverfilteripv6, ramingb):
+def update_ram(client, serverid, serverfilters, ramingb, wait, timeout):
     node = None
     if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
+        serverid = get_single_server_id_from_filters(client, **serverfilters)
     node = client.node.ex_get_node_by_id(serverid)
     try:
         client.node.ex_reconfigure_node(node, ramingb, None, None, None)
         click.secho("Server {0} ram is being changed to {1}GB".format(serverid, ramingb), fg='green', bold=True)
+        if wait:
+            wait_for_nodes(client, [serverid], timeout)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
 
 @cli.command()
 @click.option('--serverId', type=click.UNPROCESSED, help='The server ID to destroy')
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@server_filter_options
 @click.option('--cpuCount', required=True, help='# of CPUs to change to', type=int)
+@wait_options
 @pass_client
-def update_cpu_count(client, serverid, serverfilteripv6, cpucount):
+def update_cpu_count(client, serverid, serverfilters, cpucount, wait, timeout):
     node = None
     if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
+        serverid = get_single_server_id_from_filters(client, **serverfilters)
     node = client.node.ex_get_node_by_id(serverid)
     try:
         client.node.ex_reconfigure_node(node, None, cpucount, None, None)
         click.secho("Server {0} CPU Count changing to {1}".format(serverid, cpucount), fg='green', bold=True)
+        if wait:
+            wait_for_nodes(client, [serverid], timeout)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
 
+def _paged_node_dicts(client, filters, keys=None):
+    if len(client.regions) == 1:
+        for page in client.node.ex_list_nodes_paginated(**filters):
+            for node in page:
+                yield _node_to_dict(node, keys)
+        return
+    # Streamed regions are listed one after the other
+    for region in client.regions:
+        for page in client.node_for_region(region).ex_list_nodes_paginated(**filters):
+            for node in page:
+                node_dict = _node_to_dict(node, keys)
+                yield OrderedDict([('Region', region)] + [(key, node_dict[key]) for key in node_dict])
+
+
+def _power_options(verb):
+    def decorator(func):
+        func = click.option('--workers', type=click.IntRange(1, None),
+                            help="Number of servers to act on at the same time, defaults to --pool-size")(func)
+        func = click.option('--query', type=click.UNPROCESSED,
+                            help="Act on every server a server list query returns")(func)
+        func = click.option('--serverIdFile', type=click.File('r'),
+                            help="File with one server ID per line, - for stdin")(func)
+        func = server_filter_list_options(func)
+        func = click.option('--serverId', type=click.UNPROCESSED, multiple=True,
+                            help='The server ID to {0}, can be given more than once'.format(verb))(func)
+        return func
+    return decorator
+
+
 @cli.command()
-@click.option('--serverId', type=click.UNPROCESSED, help='The server ID to destroy')
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@_power_options('destroy')
+@click.option('--yes', is_flag=True, default=False, help="Don't ask before destroying more than one server")
 @pass_client
-def destroy(client, serverid, serverfilteripv6):
-    node = None
-    if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
-    node = client.node.ex_get_node_by_id(serverid)
-    try:
-        response = client.node.destroy_node(node)
-        if response is True:
-            click.secho("Server {0} is being destroyed".format(serverid), fg='green', bold=True)
-        else:
-            click.secho("Something went wrong with attempting to destroy {0}".format(serverid))
-            exit(1)
-    except DimensionDataAPIException as e:
-        handle_dd_api_exception(e)
+def destroy(client, serverid, serverfilters, serveridfile, query, workers, yes):
+    _power_action(client, serverid, serverfilters, serveridfile, query, workers, 'destroy_node',
+                  "Server {0} is being destroyed", "Something went wrong with attempting to destroy {0}",
+                  confirm=None if yes else "Destroy {0} servers?")
 
 
 @cli.command()
-@click.option('--serverId', type=click.UNPROCESSED, help='The server ID to reboot')
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@_power_options('reboot')
+@wait_options
 @pass_client
-def reboot(client, serverid, serverfilteripv6):
-    node = None
-    if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
-    node = client.node.ex_get_node_by_id(serverid)
-    try:
-        response = client.node.reboot_node(node)
-        if response is True:
-            click.secho("Server {0} is being rebooted".format(serverid), fg='green', bold=True)
-        else:
-            click.secho("Something went wrong with attempting to reboot {0}".format(serverid))
-            exit(1)
-    except DimensionDataAPIException as e:
-        handle_dd_api_exception(e)
+def reboot(client, serverid, serverfilters, serveridfile, query, workers, wait, timeout):
+    _power_action(client, serverid, serverfilters, serveridfile, query, workers, 'reboot_node',
+                  "Server {0} is being rebooted", "Something went wrong with attempting to reboot {0}",
+                  wait=wait, timeout=timeout)
 
 
 @cli.command()
-@click.option('--serverId', type=click.UNPROCESSED, help='The server ID to reboot')
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@_power_options('reboot')
+@wait_options
 @pass_client
-def reboot_hard(client, serverid, serverfilteripv6):
-    node = None
-    if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
-    node = client.node.ex_get_node_by_id(serverid)
-    try:
-        response = client.node.ex_reset(node)
-        if response is True:
-            click.secho("Server {0} is being rebooted".format(serverid), fg='green', bold=True)
-        else:
-            click.secho("Something went wrong with attempting to reboot {0}".format(serverid))
-            exit(1)
-    except DimensionDataAPIException as e:
-        handle_dd_api_exception(e)
+def reboot_hard(client, serverid, serverfilters, serveridfile, query, workers, wait, timeout):
+    _power_action(client, serverid, serverfilters, serveridfile, query, workers, 'ex_reset',
+                  "Server {0} is being rebooted", "Something went wrong with attempting to reboot {0}",
+                  wait=wait, timeout=timeout)
 
 
 @cli.command()
-@click.option('--serverId', type=click.UNPROCESSED, help='The server ID to start')
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@_power_options('start')
+@wait_options
 @pass_client
-def start(client, serverid, serverfilteripv6):
-    node = None
-    if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
-    node = client.node.ex_get_node_by_id(serverid)
-    try:
-        response = client.node.ex_start_node(node)
-        if response is True:
-            click.secho("Server {0} is starting".format(serverid), fg='green', bold=True)
-        else:
-            click.secho("Something went wrong when attempting to start {0}".format(serverid))
-            exit(1)
-    except DimensionDataAPIException as e:
-        handle_dd_api_exception(e)
+def start(client, serverid, serverfilters, serveridfile, query, workers, wait, timeout):
+    _power_action(client, serverid, serverfilters, serveridfile, query, workers, 'ex_start_node',
+                  "Server {0} is starting", "Something went wrong when attempting to start {0}",
+                  wait=wait, timeout=timeout)
 
 
 @cli.command()
-@click.option('--serverId', type=click.UNPROCESSED, help='The server ID to shutdown')
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@_power_options('shutdown')
+@wait_options
 @pass_client
-def shutdown(client, serverid, serverfilteripv6):
-    node = None
-    if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
-    node = client.node.ex_get_node_by_id(serverid)
-    try:
-        response = client.node.ex_shutdown_graceful(node)
-        if response is True:
-            click.secho("Server {0} is shutting down gracefully".format(serverid), fg='green', bold=True)
-        else:
-            click.secho("Something went wrong when attempting to shutdown {0}".format(serverid))
-            exit(1)
-    except DimensionDataAPIException as e:
-        handle_dd_api_exception(e)
+def shutdown(client, serverid, serverfilters, serveridfile, query, workers, wait, timeout):
+    _power_action(client, serverid, serverfilters, serveridfile, query, workers, 'ex_shutdown_graceful',
+                  "Server {0} is shutting down gracefully", "Something went wrong when attempting to shutdown {0}",
+                  wait=wait, timeout=timeout)
 
 
 @cli.command()
-@click.option('--serverId', type=click.UNPROCESSED, help='The server ID to shutdown')
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@_power_options('shutdown')
+@wait_options
 @pass_client
-def shutdown_hard(client, serverid, serverfilteripv6):
-    node = None
-    if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
-    node = client.node.ex_get_node_by_id(serverid)
-    try:
-        response = client.node.ex_power_off(node)
-        if response is True:
-            click.secho("Server {0} is shutting down hard".format(serverid), fg='green', bold=True)
+def shutdown_hard(client, serverid, serverfilters, serveridfile, query, workers, wait, timeout):
+    _power_action(client, serverid, serverfilters, serveridfile, query, workers, 'ex_power_off',
+                  "Server {0} is shutting down hard", "Something went wrong when attempting to shutdown {0}",
+                  wait=wait, timeout=timeout)
+
+
+def _power_action(client, serverids, serverfilters, serveridfile, query, workers, method_name,
+                  success_message, failure_message, confirm=None, wait=False, timeout=None):
+    targets = [(key, value) for key in serverfilters for value in serverfilters[key]]
+    if serveridfile is None and query is None and len(serverids) + len(targets) <= 1:
+        # One server, or one found by a filter
+        if not serverids:
+            serverids = [get_single_server_id_from_filters(client, **dict(targets))]
+        node = client.node.ex_get_node_by_id(serverids[0])
+        try:
+            response = getattr(client.node, method_name)(node)
+            if method_name == 'destroy_node':
+                client.server_resolver.invalidate()
+            if response is True:
+                click.secho(success_message.format(serverids[0]), fg='green', bold=True)
+                if wait:
+                    wait_for_nodes(client, serverids, timeout)
+            else:
+                click.secho(failure_message.format(serverids[0]))
+                sys.exit(1)
+        except DimensionDataAPIException as e:
+            handle_dd_api_exception(e)
+        return
+    serverids = _collect_server_ids(client, serverids, serveridfile, query, targets)
+    if not serverids:
+        click.secho("No servers found", fg='red', bold=True)
+        sys.exit(1)
+    if confirm is not None and len(serverids) > 1:
+        click.confirm(confirm.format(len(serverids)), abort=True)
+
+    def act(serverid):
+        return getattr(client.node, method_name)(client.node.ex_get_node_by_id(serverid))
+
+    results = run_concurrently(act, serverids, workers or client.pool_size)
+    if method_name == 'destroy_node':
+        client.server_resolver.invalidate()
+    response = DiDataCLIFilterableResponse()
+    failures = 0
+    for serverid, result, error, seconds in results:
+        if error is not None:
+            message = "{0}".format(error)
+        elif result is True:
+            message = success_message.format(serverid)
         else:
-            click.secho("Something went wrong when attempting to shutdown {0}".format(serverid))
-            exit(1)
+            message = failure_message.format(serverid)
+        if error is not None or result is not True:
+            failures += 1
+        response.add(_power_result_to_dict(serverid, error is None and result is True, message, seconds))
+    click.secho(response.to_string(client.output_type))
+    if failures > 0:
+        click.secho("{0} of {1} servers failed".format(failures, len(results)), fg='red', bold=True)
+        sys.exit(1)
+    if wait:
+        wait_for_nodes(client, serverids, timeout)
+
+
+def _collect_server_ids(client, serverids, serveridfile, query, targets):
+    collected = OrderedDict()
+    for serverid in serverids:
+        collected[serverid] = None
+    if targets:
+        # Every filter value names one server, all of them are found with one server list
+        for serverid in get_server_ids_from_filters(client, targets):
+            collected[serverid] = None
+    if serveridfile is not None:
+        for line in serveridfile:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                collected[line] = None
+    if query is not None:
+        for serverid in _query_server_ids(client, query):
+            collected[serverid] = None
+    return [serverid for serverid in collected]
+
+
+def _query_server_ids(client, query):
+    cli_filter = DiDataCLIFilter(query)
+    # Only the IDs are needed, whatever ReturnKeys says
+    cli_filter.return_keys = None
+    filters = dict(('ex_' + name, value) for name, value in _push_down(client, cli_filter, PUSHDOWN_FIELDS).items())
+    try:
+        node_list = client.node.list_nodes(**filters)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
+    keys = _node_keys(cli_filter, idsonly=True)
+    return [item['ID'] for item in cli_filter.apply(_node_to_dict(node, keys) for node in node_list)]
+
+
+def _watch_event_to_dict(event, cli_filter, with_region):
+    event_dict = OrderedDict()
+    event_dict['Time'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    event_dict['Event'] = event.event
+    if with_region:
+        event_dict['Region'] = event.scope
+    event_dict['ID'] = event.id
+    event_dict['Name'] = event.item.get('Name')
+    if event.event == CHANGED:
+        event_dict['Changes'] = OrderedDict(
+            (key, OrderedDict([('Old', old), ('New', new)])) for key, (old, new) in event.changes.items())
+    elif event.event == ADDED and cli_filter is not None:
+        event_dict['Server'] = cli_filter.project(event.item)
+    else:
+        event_dict['Server'] = event.item
+    return event_dict
+
+
+def _power_result_to_dict(serverid, succeeded, message, seconds):
+    result_dict = OrderedDict()
+    result_dict['ID'] = serverid
+    result_dict['Result'] = 'OK' if succeeded else 'Failed'
+    result_dict['Seconds'] = round(seconds, 3)
+    result_dict['Message'] = message
+    return result_dict
 
 
 @cli.command()
 @click.option('--serverId', type=click.UNPROCESSED, help='The server ID to shutdown')
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@server_filter_options
 @click.option('--servicePlan', default='ESSENTIALS', type=click.Choice(['ESSENTIALS', 'ADVANCED']))
 @pass_client
-def enable_monitoring(client, serverid, serverfilteripv6, serviceplan):
+def enable_monitoring(client, serverid, serverfilters, serviceplan):
     node = None
     if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
+        serverid = get_single_server_id_from_filters(client, **serverfilters)
     node = client.node.ex_get_node_by_id(serverid)
     try:
         response = client.node.ex_enable_monitoring(node, serviceplan)
@@ -348,20 +581,20 @@ def enable_monitoring(client, serverid, serverfilteripv6, serviceplan):
             click.secho("Server {0} enabled for monitoring".format(serverid), fg='green', bold=True)
         else:
             click.secho("Something went wrong when attempting to enable monitoring on {0}".format(serverid))
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
 
 @cli.command()
 @click.option('--serverId', type=click.UNPROCESSED, help='The server ID to shutdown')
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@server_filter_options
 @click.option('--servicePlan', default='ESSENTIALS', type=click.Choice(['ESSENTIALS', 'ADVANCED']))
 @pass_client
-def update_monitoring(client, serverid, serverfilteripv6, serviceplan):
+def update_monitoring(client, serverid, serverfilters, serviceplan):
     node = None
     if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
+        serverid = get_single_server_id_from_filters(client, **serverfilters)
     node = client.node.ex_get_node_by_id(serverid)
     try:
         response = client.node.ex_update_monitoring_plan(node, serviceplan)
@@ -369,19 +602,19 @@ def update_monitoring(client, serverid, serverfilteripv6, serviceplan):
             click.secho("Server {0} monitoring updated".format(serverid), fg='green', bold=True)
         else:
             click.secho("Something went wrong when attempting to update monitoring on {0}".format(serverid))
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
 
 @cli.command()
 @click.option('--serverId', type=click.UNPROCESSED, help='The server ID to shutdown')
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@server_filter_options
 @pass_client
-def disable_monitoring(client, serverid, serverfilteripv6):
+def disable_monitoring(client, serverid, serverfilters):
     node = None
     if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
+        serverid = get_single_server_id_from_filters(client, **serverfilters)
     node = client.node.ex_get_node_by_id(serverid)
     try:
         response = client.node.ex_disable_monitoring(node)
@@ -389,50 +622,52 @@ def disable_monitoring(client, serverid, serverfilteripv6):
             click.secho("Server {0} monitoring disabled".format(serverid), fg='green', bold=True)
         else:
             click.secho("Something went wrong when attempting to disable monitoring on {0}".format(serverid))
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
 
 @cli.command()
 @click.option('--serverId', help="The server ID to tag")
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@server_filter_options
 @click.option('--tagKeyName', type=click.UNPROCESSED, help="The key name", required=True)
 @click.option('--tagKeyValue', help="The value of the key if needed")
 @pass_client
-def apply_tag(client, serverid, serverfilteripv6, tagkeyname, tagkeyvalue):
+def apply_tag(client, serverid, serverfilters, tagkeyname, tagkeyvalue):
     node = None
     if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
+        serverid = get_single_server_id_from_filters(client, **serverfilters)
     node = client.node.ex_get_node_by_id(serverid)
     try:
         response = client.node.ex_apply_tag_to_asset(node, tagkeyname, tagkeyvalue)
+        client.server_resolver.invalidate()
         if response is True:
             click.secho("Tag applied to {0}".format(serverid), fg='green', bold=True)
         else:
             click.secho("Error when applying tag", fg='red', bold=True)
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
 
 @cli.command()
 @click.option('--serverId', help="The server ID to remove a tag from")
-@click.option('--serverFilterIpv6', help='The filter for ipv6')
+@server_filter_options
 @click.option('--tagKeyName', type=click.UNPROCESSED, help="The key name to remove", required=True)
 @pass_client
-def remove_tag(client, serverid, serverfilteripv6, tagkeyname):
+def remove_tag(client, serverid, serverfilters, tagkeyname):
     node = None
     if not serverid:
-        serverid = get_single_server_id_from_filters(client, ex_ipv6=serverfilteripv6)
+        serverid = get_single_server_id_from_filters(client, **serverfilters)
     node = client.node.ex_get_node_by_id(serverid)
     try:
         response = client.node.ex_remove_tag_from_asset(node, tagkeyname)
+        client.server_resolver.invalidate()
         if response is True:
             click.secho("Tag removed from {0}".format(serverid), fg='green', bold=True)
         else:
             click.secho("Error when removing tag", fg='red', bold=True)
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
@@ -445,30 +680,45 @@ def _find_disk_id_from_node(node, diskid):
             break
     if found_disk is None:
         click.secho("No disk with id {0} in server {1}".format(diskid, node.id), fg='red', bold=True)
-        exit(1)
+        sys.exit(1)
     return found_disk
 
 
-def _node_to_dict(node):
+def _node_to_dict(node, keys=None):
+    """Turn a node into its server list item, only with the keys in the set keys when it is given"""
     node_dict = OrderedDict()
-    node_dict['Name'] = node.name
-    node_dict['ID'] = node.id
+    if keys is None or 'Name' in keys:
+        node_dict['Name'] = node.name
+    if keys is None or 'ID' in keys:
+        node_dict['ID'] = node.id
     ip_count = 0
     for ip in node.private_ips:
-        node_dict['Private IPv4 ' + str(ip_count)] = ip
-    node_dict['State'] = node.state
-    for key in sorted(node.extra):
+        if keys is None or 'Private IPv4 ' + str(ip_count) in keys:
+            node_dict['Private IPv4 ' + str(ip_count)] = ip
+    if keys is None or 'State' in keys:
+        node_dict['State'] = node.state
+    if keys is None:
+        extra_keys = sorted(node.extra)
+    else:
+        # Only look at the extra keys that are wanted, or expand into wanted keys
+        wanted = keys.difference(NODE_BASE_KEYS)
+        if not wanted:
+            return node_dict
+        extra_keys = sorted(key for key in node.extra if key in wanted or
+                            (key == 'cpu' and not wanted.isdisjoint(NODE_CPU_KEYS)) or
+                            (key == 'disks' and any(name.startswith('Disk ') for name in wanted)))
+    for key in extra_keys:
         if key == 'cpu':
-            node_dict['CPU Count'] = node.extra[key].cpu_count
-            node_dict['Cores per Socket'] = node.extra[key].cores_per_socket
-            node_dict['CPU Performance'] = node.extra[key].performance
+            for name, attribute in NODE_CPU_KEYS.items():
+                if keys is None or name in keys:
+                    node_dict[name] = getattr(node.extra[key], attribute)
             continue
         if key == 'disks':
             for disk in node.extra[key]:
-                node_dict['Disk ' + str(disk.scsi_id) + ' ID'] = disk.id
-                node_dict['Disk ' + str(disk.scsi_id) + ' Size'] = disk.size_gb
-                node_dict['Disk ' + str(disk.scsi_id) + ' Speed'] = disk.speed
-                node_dict['Disk ' + str(disk.scsi_id) + ' State'] = disk.state
+                prefix = 'Disk ' + str(disk.scsi_id)
+                for suffix, attribute in NODE_DISK_KEYS:
+                    if keys is None or prefix + suffix in keys:
+                        node_dict[prefix + suffix] = getattr(disk, attribute)
             continue
         # skip this key, it is similar to node.status
         if key == 'status':
@@ -477,3 +727,15 @@ def _node_to_dict(node):
             continue
         node_dict[key] = node.extra[key]
     return node_dict
+
+
+def _node_keys(cli_filter, idsonly=False):
+    """Return the set of server list keys a command has to build, None for all of them"""
+    if idsonly:
+        keys = set(['ID'])
+        if cli_filter is not None and cli_filter.where is not None:
+            keys |= where_fields(cli_filter.where)
+        return keys
+    if cli_filter is None:
+        return None
+    return cli_filter.needed_keys()
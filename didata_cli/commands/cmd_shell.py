@@ -0,0 +1,54 @@
+import click
+import shlex
+from didata_cli.utils import invoke_command_line
+try:
+    import readline  # noqa: F401 gives the prompt line editing and history
+except ImportError:
+    pass
+try:
+    read_line = raw_input
+except NameError:
+    read_line = input
+
+EXIT_COMMANDS = ('exit', 'quit')
+
+
+@click.command()
+@click.pass_context
+def cli(ctx):
+    """Interactive shell reusing one client"""
+    click.secho("didata shell. Type 'help' for commands, 'exit' or Ctrl-D to quit.", bold=True)
+    exit_code = 0
+    while True:
+        try:
+            line = read_line('didata> ')
+        except (EOFError, KeyboardInterrupt):
+            click.echo('')
+            break
+        try:
+            args = shlex.split(line)
+        except ValueError as e:
+            click.secho("Could not parse command: {0}".format(e), fg='red', bold=True)
+            exit_code = 2
+            continue
+        if len(args) == 0:
+            continue
+        if args[0] in EXIT_COMMANDS:
+            break
+        if args[0] == 'help':
+            args = args[1:] + ['--help']
+            if len(args) == 1:
+                click.echo(ctx.find_root().get_help())
+                continue
+        if args[0] == 'shell':
+            click.secho("Already in the didata shell", fg='red', bold=True)
+            continue
+        try:
+            exit_code = invoke_command_line(ctx, args)
+        except Exception as e:
+            # e.g. a DimensionDataAPIException a command doesn't handle, one
+            # failing command must not end the session
+            click.secho("{0}".format(e), fg='red', bold=True)
+            exit_code = 1
+    # Like sh, the shell exits with the exit code of the last command
+    ctx.exit(exit_code)
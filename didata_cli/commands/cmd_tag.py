@@ -1,7 +1,8 @@
 import click
+import sys
 from didata_cli.cli import pass_client
 from libcloud.common.dimensiondata import DimensionDataAPIException
-from didata_cli.utils import handle_dd_api_exception
+from didata_cli.utils import handle_dd_api_exception, list_in_regions
 from didata_cli.filterable_response import DiDataCLIFilterableResponse
 try:
     from collections import OrderedDict
@@ -28,7 +29,7 @@ def create_key(client, name, description, valuerequired, displayonreport):
             click.secho("Tag key {0} created".format(name), fg='green', bold=True)
         else:
             click.secho("Error when creating tag key".format(name, fg='red', bold=True))
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
@@ -47,11 +48,12 @@ def modify_key(client, tagkeyid, name, description, valuerequired, displayonrepo
                                                  description=description,
                                                  value_required=valuerequired,
                                                  display_on_report=displayonreport)
+        client.server_resolver.invalidate()
         if response is True:
             click.secho("Tag key {0} modified".format(tagkeyid), fg='green', bold=True)
         else:
             click.secho("Error when modifying tag key".format(name, fg='red', bold=True))
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
@@ -62,11 +64,12 @@ def modify_key(client, tagkeyid, name, description, valuerequired, displayonrepo
 def remove_key(client, tagkeyid):
     try:
         response = client.node.ex_remove_tag_key(tagkeyid)
+        client.server_resolver.invalidate()
         if response is True:
             click.secho("Tag key {0} removed".format(tagkeyid), fg='green', bold=True)
         else:
             click.secho("Error when removing tag key", fg='red', bold=True)
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
@@ -106,11 +109,12 @@ def apply(client, id, assettype, tagkeyname, tagkeyvalue):
     try:
         asset = _get_asset(client, id, assettype)
         response = client.node.ex_apply_tag_to_asset(asset, tagkeyname, tagkeyvalue)
+        client.server_resolver.invalidate()
         if response is True:
             click.secho("Tag applied to {0}".format(id), fg='green', bold=True)
         else:
             click.secho("Error when applying tag", fg='red', bold=True)
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
@@ -126,11 +130,12 @@ def remove(client, id, assettype, tagkeyname):
     try:
         asset = _get_asset(client, id, assettype)
         response = client.node.ex_remove_tag_from_asset(asset, tagkeyname)
+        client.server_resolver.invalidate()
         if response is True:
             click.secho("Tag removed from {0}".format(id), fg='green', bold=True)
         else:
             click.secho("Error when removing tag", fg='red', bold=True)
-            exit(1)
+            sys.exit(1)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
 
@@ -149,14 +154,17 @@ def remove(client, id, assettype, tagkeyname):
 @pass_client
 def list(client, assetid, assettype, datacenter, tagkeyid,
          tagkeyname, tagkeyvalue, valuerequired, displayonreport, query):
-    tag_list = client.node.ex_list_tags(asset_id=assetid, asset_type=assettype,
-                                        location=datacenter, tag_key_name=tagkeyname,
-                                        tag_key_id=tagkeyid, value=tagkeyvalue,
-                                        value_required=valuerequired,
-                                        display_on_report=displayonreport)
+    def list_tag_dicts(driver):
+        tag_list = driver.ex_list_tags(asset_id=assetid, asset_type=assettype,
+                                       location=datacenter, tag_key_name=tagkeyname,
+                                       tag_key_id=tagkeyid, value=tagkeyvalue,
+                                       value_required=valuerequired,
+                                       display_on_report=displayonreport)
+        return [_tag_to_dict(tag) for tag in tag_list]
+
     response = DiDataCLIFilterableResponse()
-    for tag in tag_list:
-        response.add(_tag_to_dict(tag))
+    for item in list_in_regions(client, list_tag_dicts):
+        response.add(item)
     if not response.is_empty():
         if query is not None:
             response.do_filter(query)
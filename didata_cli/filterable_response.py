@@ -1,12 +1,27 @@
+import csv
 import json
+from itertools import islice
 from tabulate import tabulate
+from didata_cli.query import DiDataCLIQueryError, compile_where, parse_where, push_down, where_fields
 try:
     from collections import OrderedDict
 except ImportError:
     from ordereddict import OrderedDict
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
 
-VALID_PRINT_TYPES = ('pretty', 'idsonly', 'json', 'plain', 'simple', 'grid', 'fancy_grid', 'pipe',
-                     'orgtbl', 'rst', 'mediawiki', 'html', 'latex', 'latex_booktabs')
+VALID_PRINT_TYPES = ('pretty', 'idsonly', 'json', 'ndjson', 'csv', 'tsv', 'plain', 'simple', 'grid', 'fancy_grid',
+                     'pipe', 'orgtbl', 'rst', 'mediawiki', 'html', 'latex', 'latex_booktabs')
+# Print types that can be written one item at a time
+STREAMABLE_PRINT_TYPES = ('pretty', 'idsonly', 'ndjson', 'csv', 'tsv')
+# Functions called with (rows, output_bytes) whenever a response is rendered
+RENDER_HOOKS = []
 
 
 class DiDataCLIFilter(object):
@@ -14,28 +29,179 @@ class DiDataCLIFilter(object):
         self._raw_filter = filter_string
         self.return_count = None
         self.return_keys = None
+        self.where = None
+        self.predicate = None
         self.parse_filter()
 
+    @staticmethod
+    def _split_filter(filter_string):
+        # Split on | but not on one inside a quoted Where value
+        parts = []
+        current = []
+        quote = None
+        for char in filter_string:
+            if quote is not None:
+                if char == quote:
+                    quote = None
+            elif char in ('"', "'"):
+                quote = char
+            elif char == '|':
+                parts.append(''.join(current))
+                current = []
+                continue
+            current.append(char)
+        parts.append(''.join(current))
+        return parts
+
     def parse_filter(self):
-        items = self._raw_filter.split('|')
+        items = self._split_filter(self._raw_filter)
         for item in items:
-            (key, value) = item.split(':')
+            if ':' not in item:
+                raise DiDataCLIQueryError("'{0}' is not in Key:Value form".format(item))
+            (key, value) = item.split(':', 1)
+            key = key.strip()
             if key == 'ReturnCount':
-                self.return_count = int(value)
+                try:
+                    self.return_count = int(value)
+                except ValueError:
+                    raise DiDataCLIQueryError("ReturnCount must be a number, not '{0}'".format(value))
             elif key == 'ReturnKeys':
                 self.return_keys = value.split(',')
             elif key == 'Where':
-                pass
+                self.where = parse_where(value)
+                self.predicate = compile_where(self.where)
+
+    def push_down(self, fields, keep=()):
+        """Take the Where equality tests on fields out of this filter and return them.
+
+        Returns an OrderedDict of field name to value for the caller to hand to
+        the API, what is left of the Where clause is still applied locally.
+        Tests on the fields in keep are returned and still applied locally too.
+        ReturnCount is never pushed down, it has to count the filtered items.
+        """
+        if self.where is None:
+            return OrderedDict()
+        pushed, self.where = push_down(self.where, fields, keep)
+        self.predicate = compile_where(self.where) if self.where is not None else None
+        return pushed
+
+    def needed_keys(self):
+        """Return the set of item keys the filter reads or returns, None when it returns every key"""
+        if not self.return_keys:
+            return None
+        keys = set(self.return_keys)
+        if self.where is not None:
+            keys |= where_fields(self.where)
+        return keys
+
+    def project(self, item):
+        if not self.return_keys:
+            return item
+        return OrderedDict((key, item[key]) for key in item if key in self.return_keys)
+
+    def apply(self, items):
+        """Lazily filter an iterable of items, stopping once ReturnCount items have been returned"""
+        if self.predicate is not None:
+            items = (item for item in items if self.predicate(item))
+        if self.return_count is not None:
+            items = islice(items, self.return_count)
+        for item in items:
+            yield self.project(item)
+
+
+class RowSchema(object):
+    """The keys of a CompactRow, in order, and the position of each of them"""
+    __slots__ = ('keys', 'index')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = dict((key, position) for position, key in enumerate(keys))
+
+
+class CompactRow(Mapping):
+    """A read only item that keeps its values in a tuple and shares its RowSchema.
+
+    Thousands of servers mostly have the same keys, so a response keeps one
+    RowSchema per distinct list of keys instead of one OrderedDict (and one
+    copy of every key string) per item.
+    """
+    __slots__ = ('_schema', '_values')
+
+    def __init__(self, schema, values):
+        self._schema = schema
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._schema.index[key]]
+
+    def __contains__(self, key):
+        return key in self._schema.index
+
+    def __iter__(self):
+        return iter(self._schema.keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return 'CompactRow({0!r})'.format(list(self.items()))
+
+    def to_dict(self):
+        return OrderedDict(zip(self._schema.keys, self._values))
+
+
+class _Counter(object):
+    # Counts the items a line renderer takes from an iterable
+    def __init__(self, items):
+        self._items = iter(items)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self._items)
+        self.count += 1
+        return item
+    next = __next__
+
+
+def _observed_lines(lines, counter):
+    output_bytes = 0
+    try:
+        for line in lines:
+            output_bytes += len(line.encode('utf-8')) + 1
+            yield line
+    finally:
+        for hook in RENDER_HOOKS:
+            hook(counter.count, output_bytes)
+
+
+def _row_to_dict(row):
+    # json.dumps default, CompactRows are turned into OrderedDicts one at a time
+    if isinstance(row, CompactRow):
+        return row.to_dict()
+    raise TypeError("{0!r} is not JSON serializable".format(row))
 
 
 class DiDataCLIFilterableResponse(object):
     def __init__(self):
         self._list = []
+        self._schemas = {}
 
     def add(self, item):
         if not isinstance(item, OrderedDict):
             raise TypeError("Item to add for CLIPrint must be an OrderedDict")
-        self._list.append(item)
+        self._list.append(self._compact(item))
+
+    def _compact(self, item):
+        if isinstance(item, CompactRow):
+            return item
+        keys = tuple(item)
+        schema = self._schemas.get(keys)
+        if schema is None:
+            schema = self._schemas[keys] = RowSchema(keys)
+        return CompactRow(schema, tuple(item.values()))
 
     @staticmethod
     def is_valid_print_type(print_type):
@@ -49,52 +215,126 @@ class DiDataCLIFilterableResponse(object):
         return True
 
     def do_filter(self, filter_string):
-        cli_filter = DiDataCLIFilter(filter_string)
-        if cli_filter.return_count is not None:
-            self._list = self._list[0:cli_filter.return_count]
-        if cli_filter.return_keys is not None:
-            if len(cli_filter.return_keys) == 0:
-                pass
-            else:
-                for item in self._list:
-                    # This is hacky for python 3.5
-                    keys_to_delete = []
-                    for key in item:
-                        if key not in cli_filter.return_keys:
-                            keys_to_delete.append(key)
-                    for key in keys_to_delete:
-                        del item[key]
+        self._list = [self._compact(item) for item in self._to_filter(filter_string).apply(self._list)]
+
+    @staticmethod
+    def _to_filter(filter_string):
+        if isinstance(filter_string, DiDataCLIFilter):
+            return filter_string
+        return DiDataCLIFilter(filter_string)
+
+    @staticmethod
+    def is_streamable_print_type(print_type):
+        return print_type in STREAMABLE_PRINT_TYPES
+
+    def stream(self, items, print_type, filter_string=None, headers=True):
+        """Render an iterable of items line by line without holding them in memory.
+
+        Yields the output lines (without line endings) as soon as each item
+        is available.  Only the STREAMABLE_PRINT_TYPES can be streamed.
+        filter_string can also be an already parsed DiDataCLIFilter.
+        """
+        if not self.is_streamable_print_type(print_type):
+            raise ValueError("Print type {0} can not be streamed".format(print_type))
+        if filter_string is not None:
+            items = self._to_filter(filter_string).apply(items)
+        line_function = getattr(self, '_iter_' + print_type + '_lines')
+        if RENDER_HOOKS:
+            counter = _Counter(items)
+            return _observed_lines(line_function(counter, headers), counter)
+        return line_function(items, headers)
 
     def to_string(self, print_type, headers=True):
         if not self.is_valid_print_type(print_type):
             raise ValueError("Unknown print type {0}".format(print_type))
         print_function = getattr(self, '_to_' + print_type + '_string')
-        return print_function(headers)
+        output = print_function(headers)
+        for hook in RENDER_HOOKS:
+            hook(len(self._list), len(output.encode('utf-8')))
+        return output
 
     def _to_json_string(self, headers):
-        return json.dumps(self._list, indent=4, separators=(',', ': '))
+        return json.dumps(self._list, indent=4, separators=(',', ': '), default=_row_to_dict)
 
-    def _to_pretty_string(self, headers):
-        output = ""
+    def _to_ndjson_string(self, headers):
+        return "\n".join(self._iter_ndjson_lines(self._list, headers))
+
+    def _to_csv_string(self, headers):
+        return "\n".join(self._iter_delimited_lines(self._list, headers, ',', self._all_keys()))
+
+    def _to_tsv_string(self, headers):
+        return "\n".join(self._iter_delimited_lines(self._list, headers, '\t', self._all_keys()))
+
+    def _all_keys(self):
+        keys = OrderedDict()
         for item in self._list:
             for key in item:
-                output = output + "%s: %s\n" % (key, item[key])
-            output = output + "\n"
-        return output[:-2]
+                keys[key] = None
+        return list(keys)
 
-    def _to_idsonly_string(self, headers):
-        output = ''
-        for item in self._list:
+    @staticmethod
+    def _iter_pretty_lines(items, headers):
+        first = True
+        for item in items:
+            if not first:
+                yield ""
+            first = False
+            for key in item:
+                yield "%s: %s" % (key, item[key])
+
+    @staticmethod
+    def _iter_idsonly_lines(items, headers):
+        for item in items:
             if 'ID' not in item:
                 raise KeyError("ID not in item, there are no IDs to print")
-            output = output + item['ID'] + "\n"
-        return output[:-2]
+            yield item['ID']
+
+    @staticmethod
+    def _iter_ndjson_lines(items, headers):
+        for item in items:
+            yield json.dumps(item, default=_row_to_dict)
+
+    def _iter_csv_lines(self, items, headers):
+        return self._iter_delimited_lines(items, headers, ',')
+
+    def _iter_tsv_lines(self, items, headers):
+        return self._iter_delimited_lines(items, headers, '\t')
+
+    @staticmethod
+    def _iter_delimited_lines(items, headers, delimiter, keys=None):
+        # When streaming the columns come from the first item, keys that
+        # only appear in later items are left out.
+        buf = StringIO()
+        writer = csv.writer(buf, delimiter=delimiter, lineterminator='')
+
+        def format_row(row):
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow(row)
+            return buf.getvalue()
+
+        for item in items:
+            if keys is None:
+                keys = list(item)
+            if headers:
+                yield format_row(keys)
+                headers = False
+            yield format_row([item.get(key, '') for key in keys])
+
+    def _to_pretty_string(self, headers):
+        return "\n".join(self._iter_pretty_lines(self._list, headers))
+
+    def _to_idsonly_string(self, headers):
+        return "\n".join(self._iter_idsonly_lines(self._list, headers))
 
     def _to_tabulate(self, name, headers):
+        # tabulate before 0.8.3 only reads keys from dicts, a CompactRow would
+        # be taken as a row of its keys
+        rows = [item.to_dict() if isinstance(item, CompactRow) else item for item in self._list]
         if headers is True:
-            return tabulate(self._list, headers='keys', tablefmt=name)
+            return tabulate(rows, headers='keys', tablefmt=name)
         else:
-            return tabulate(self._list, tablefmt=name)
+            return tabulate(rows, tablefmt=name)
 
     def _to_plain_string(self, headers):
         return self._to_tabulate('plain', headers)
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+from didata_cli.cli import DIDATA_HOME
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+INVENTORY_FILENAME = 'inventory.sqlite'
+
+# The record keys copied into indexed columns for every resource type, the
+# name, and the IP addresses a resource can be looked up by.
+ResourceType = namedtuple('ResourceType', ['name_key', 'ip_keys'])
+RESOURCE_TYPES = OrderedDict([
+    ('servers', ResourceType('Name', ('Private IPv4 0', 'ipv6'))),
+    ('vlans', ResourceType('Name', ('IPv4 Range Address', 'IPv6 Range Address'))),
+    ('network_domains', ResourceType('Name', ())),
+    ('firewall_rules', ResourceType('Name', ('Source IP', 'Destination IP'))),
+    ('public_ip_blocks', ResourceType(None, ('Base IP',))),
+    ('tags', ResourceType('Key Name', ())),
+    ('tag_keys', ResourceType('Name', ())),
+])
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS resources ('
+    'type TEXT NOT NULL, region TEXT NOT NULL, id TEXT NOT NULL, name TEXT, datacenter TEXT, '
+    'record TEXT NOT NULL, fingerprint TEXT, PRIMARY KEY (type, region, id))',
+    'CREATE INDEX IF NOT EXISTS resources_id ON resources (id)',
+    'CREATE INDEX IF NOT EXISTS resources_name ON resources (type, name)',
+    'CREATE INDEX IF NOT EXISTS resources_datacenter ON resources (type, datacenter)',
+    'CREATE TABLE IF NOT EXISTS resource_ips ('
+    'type TEXT NOT NULL, region TEXT NOT NULL, id TEXT NOT NULL, ip TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS resource_ips_ip ON resource_ips (ip)',
+    'CREATE TABLE IF NOT EXISTS asset_tags ('
+    'region TEXT NOT NULL, asset_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT)',
+    'CREATE INDEX IF NOT EXISTS asset_tags_key ON asset_tags (key, value)',
+    'CREATE TABLE IF NOT EXISTS syncs ('
+    'type TEXT NOT NULL, region TEXT NOT NULL, synced REAL NOT NULL, PRIMARY KEY (type, region))',
+)
+
+# A resource to store: its ID, the datacenter it is in and its record, the
+# dict the list command for that resource type would print.
+InventoryRecord = namedtuple('InventoryRecord', ['id', 'datacenter', 'record'])
+
+ADDED = 'added'
+CHANGED = 'changed'
+REMOVED = 'removed'
+# What a sync did to one stored resource, for removed resources record is
+# the last stored record.
+InventoryChange = namedtuple('InventoryChange', ['change', 'id', 'record'])
+
+
+def default_inventory_path():
+    return os.path.join(DIDATA_HOME, INVENTORY_FILENAME)
+
+
+def fingerprint(record):
+    """Hash of a record that only changes when one of its values does"""
+    return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class Inventory(object):
+    """SQLite snapshot of an account's resources.
+
+    Every resource is stored as its JSON record, with the ID, name,
+    datacenter, IP addresses and (for tagged assets) tags copied into
+    indexed columns so lookups don't have to read every record.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_inventory_path()
+        self._db = None
+
+    def exists(self):
+        return os.path.isfile(self.path)
+
+    def _connection(self):
+        if self._db is None:
+            folder = os.path.dirname(self.path)
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+            self._db = sqlite3.connect(self.path, timeout=30)
+            for statement in SCHEMA:
+                self._db.execute(statement)
+            # Inventories written before fingerprints were stored
+            columns = [row[1] for row in self._db.execute('PRAGMA table_info(resources)')]
+            if 'fingerprint' not in columns:
+                self._db.execute('ALTER TABLE resources ADD COLUMN fingerprint TEXT')
+            self._db.commit()
+        return self._db
+
+    def sync(self, region, resource_type, records):
+        """Make the stored resource_type resources of region match records, a list of InventoryRecords.
+
+        Only the resources whose fingerprint differs from the stored one are
+        written, the InventoryChanges made are returned in records order,
+        followed by the removed resources.
+        """
+        spec = RESOURCE_TYPES[resource_type]
+        connection = self._connection()
+        stored = dict(connection.execute('SELECT id, fingerprint FROM resources WHERE type = ? AND region = ?',
+                                         (resource_type, region)))
+        changes = []
+        rows = {}
+        for record in records:
+            if record.id in rows:
+                continue
+            record_fingerprint = fingerprint(record.record)
+            rows[record.id] = (record.record.get(spec.name_key) if spec.name_key else None, record.datacenter,
+                               json.dumps(record.record, default=str), record_fingerprint,
+                               resource_type, region, record.id)
+            if record.id not in stored:
+                changes.append(InventoryChange(ADDED, record.id, record.record))
+            elif stored[record.id] != record_fingerprint:
+                changes.append(InventoryChange(CHANGED, record.id, record.record))
+        written = list(changes)
+        removed_ids = [resource_id for resource_id in stored if resource_id not in rows]
+        for resource_id, record in self._records(resource_type, region, removed_ids):
+            changes.append(InventoryChange(REMOVED, resource_id, record))
+        # A changed tag can have a renamed key, its old asset_tags row is found from the stored record
+        previous = dict(self._records(resource_type, region, [change.id for change in written
+                                                               if change.change == CHANGED])
+                        if resource_type == 'tags' else [])
+
+        with connection:
+            connection.executemany('DELETE FROM resources WHERE type = ? AND region = ? AND id = ?',
+                                   [(resource_type, region, resource_id) for resource_id in removed_ids])
+            connection.executemany('DELETE FROM resource_ips WHERE type = ? AND region = ? AND id = ?',
+                                   [(resource_type, region, resource_id) for resource_id in removed_ids] +
+                                   [(resource_type, region, change.id) for change in written
+                                    if change.change == CHANGED])
+            # Changed resources are updated in place to keep their place in query results
+            connection.executemany(
+                'INSERT INTO resources (name, datacenter, record, fingerprint, type, region, id) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [rows[change.id] for change in written
+                 if change.change == ADDED])
+            connection.executemany(
+                'UPDATE resources SET name = ?, datacenter = ?, record = ?, fingerprint = ? '
+                'WHERE type = ? AND region = ? AND id = ?',
+                [rows[change.id] for change in written
+                 if change.change == CHANGED])
+            connection.executemany(
+                'INSERT INTO resource_ips (type, region, id, ip) VALUES (?, ?, ?, ?)',
+                [(resource_type, region, change.id, change.record[key]) for change in written
+                 for key in spec.ip_keys if change.record.get(key)])
+            if resource_type == 'tags':
+                connection.executemany(
+                    'DELETE FROM asset_tags WHERE region = ? AND asset_id = ? AND key = ?',
+                    [(region, record['Asset ID'], record['Key Name'])
+                     for record in [change.record for change in changes if change.change == REMOVED] +
+                     list(previous.values())])
+                connection.executemany(
+                    'INSERT INTO asset_tags (region, asset_id, key, value) VALUES (?, ?, ?, ?)',
+                    [(region, change.record['Asset ID'], change.record['Key Name'], change.record['Value'])
+                     for change in changes if change.change != REMOVED])
+            connection.execute('INSERT OR REPLACE INTO syncs (type, region, synced) VALUES (?, ?, ?)',
+                               (resource_type, region, time.time()))
+        return changes
+
+    def _records(self, resource_type, region, ids):
+        # Looked up one at a time, a removed list can be longer than SQLite's
+        # limit on query parameters.
+        for resource_id in ids:
+            for (record,) in self._connection().execute(
+                    'SELECT record FROM resources WHERE type = ? AND region = ? AND id = ?',
+                    (resource_type, region, resource_id)):
+                yield resource_id, json.loads(record, object_pairs_hook=OrderedDict)
+
+    def query(self, resource_type, regions, id=None, name=None, ip=None, datacenter=None,
+              tag_key=None, tag_value=None):
+        """Yield (region, record) for the stored resources matching every lookup given, oldest first"""
+        sql = ['SELECT region, record FROM resources r WHERE type = ? AND region IN ({0})'.format(
+            ', '.join('?' * len(regions)))]
+        parameters = [resource_type] + list(regions)
+        for column, value in (('id', id), ('name', name), ('datacenter', datacenter)):
+            if value is not None:
+                sql.append('AND {0} = ?'.format(column))
+                parameters.append(value)
+        if ip is not None:
+            sql.append('AND EXISTS (SELECT 1 FROM resource_ips i WHERE i.ip = ? AND i.type = r.type '
+                       'AND i.region = r.region AND i.id = r.id)')
+            parameters.append(ip)
+        if tag_key is not None:
+            sql.append('AND EXISTS (SELECT 1 FROM asset_tags t WHERE t.key = ? AND t.region = r.region '
+                       'AND t.asset_id = r.id')
+            parameters.append(tag_key)
+            if tag_value is not None:
+                sql.append('AND t.value = ?')
+                parameters.append(tag_value)
+            sql.append(')')
+        sql.append('ORDER BY rowid')
+        for region, record in self._connection().execute(' '.join(sql), parameters):
+            yield region, json.loads(record, object_pairs_hook=OrderedDict)
+
+    def status(self):
+        """Return (type, region, count, synced) for every resource type and region synced so far"""
+        return self._connection().execute(
+            'SELECT s.type, s.region, COUNT(r.id), s.synced FROM syncs s LEFT JOIN resources r '
+            'ON r.type = s.type AND r.region = s.region GROUP BY s.type, s.region ORDER BY s.region, s.type'
+        ).fetchall()
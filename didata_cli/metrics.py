@@ -0,0 +1,173 @@
+import os
+import tempfile
+import time
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Seconds, from a cached list to a slow paged listing of a big account
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# name: (type, help)
+METRICS = OrderedDict([
+    ('didata_runs_total', ('counter', "didata runs by result")),
+    ('didata_run_duration_seconds', ('histogram', "Wall time of didata runs")),
+    ('didata_last_run_timestamp_seconds', ('gauge', "When didata last finished")),
+    ('didata_last_run_exit_code', ('gauge', "Exit code of the last didata run")),
+    ('didata_api_calls_total', ('counter', "Driver method calls")),
+    ('didata_api_errors_total', ('counter', "Driver method calls that raised an error")),
+    ('didata_api_call_duration_seconds', ('histogram', "Driver method call latency")),
+    ('didata_http_requests_total', ('counter', "HTTP requests sent to the API")),
+    ('didata_http_retries_total', ('counter', "HTTP requests retried by libcloud")),
+    ('didata_http_received_bytes_total', ('counter', "Bytes of API responses")),
+    ('didata_cache_hits_total', ('counter', "List calls answered by the response cache")),
+    ('didata_cache_misses_total', ('counter', "List calls the response cache had to fetch")),
+    ('didata_rows_rendered_total', ('counter', "Rows printed")),
+    ('didata_output_bytes_total', ('counter', "Bytes of rendered output")),
+])
+
+
+class RunMetrics(object):
+    """Metrics of one didata run, written to a node_exporter textfile when it is done.
+
+    Counters and histograms are added to the ones already in the file, so
+    a file written by a cron job keeps counting across runs, while the
+    last run gauges are replaced.
+    """
+
+    def __init__(self, command, clock=None):
+        self.command = command
+        self._clock = clock or time.time
+        self.started = self._clock()
+        self.rows_rendered = 0
+        self.output_bytes = 0
+
+    def observe_render(self, rows, output_bytes):
+        self.rows_rendered += rows
+        self.output_bytes += output_bytes
+
+    def samples(self, exit_code, tracer=None, cache=None):
+        """Return an OrderedDict of sample name (with labels) to value for this run"""
+        finished = self._clock()
+        command = (('command', self.command),)
+        samples = OrderedDict()
+        result = 'success' if exit_code == 0 else 'failure'
+        samples[_sample('didata_runs_total', command + (('result', result),))] = 1
+        _observe(samples, 'didata_run_duration_seconds', command, finished - self.started)
+        samples[_sample('didata_last_run_timestamp_seconds', command)] = round(finished, 3)
+        samples[_sample('didata_last_run_exit_code', command)] = exit_code
+        if tracer is not None:
+            for span in tracer.spans:
+                method = command + (('method', span.name),)
+                _add(samples, _sample('didata_api_calls_total', method), 1)
+                if span.error:
+                    _add(samples, _sample('didata_api_errors_total', method), 1)
+                _observe(samples, 'didata_api_call_duration_seconds', method, span.seconds)
+            samples[_sample('didata_http_requests_total', command)] = len(tracer.requests)
+            samples[_sample('didata_http_retries_total', command)] = tracer.retries
+            samples[_sample('didata_http_received_bytes_total', command)] = sum(
+                request[5] for request in tracer.requests)
+        if cache is not None:
+            samples[_sample('didata_cache_hits_total', command)] = cache.hits
+            samples[_sample('didata_cache_misses_total', command)] = cache.misses
+        samples[_sample('didata_rows_rendered_total', command)] = self.rows_rendered
+        samples[_sample('didata_output_bytes_total', command)] = self.output_bytes
+        return samples
+
+    def write(self, path, exit_code, tracer=None, cache=None):
+        write_textfile(path, self.samples(exit_code, tracer, cache))
+
+
+def write_textfile(path, samples):
+    """Merge samples into the textfile at path and replace it atomically, so node_exporter never reads half a file.
+
+    Runs writing the same file at the same time take turns, through a lock
+    on path + '.lock', so neither loses the other's counts.
+    """
+    lock_file = open(path + '.lock', 'a')
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        _merge_textfile(path, samples)
+    finally:
+        lock_file.close()
+
+
+def _merge_textfile(path, samples):
+    merged = read_textfile(path)
+    for name in samples:
+        if METRICS[_family(name)][0] == 'gauge' or name not in merged:
+            merged[name] = samples[name]
+        else:
+            merged[name] += samples[name]
+    lines = []
+    for family in METRICS:
+        names = [name for name in merged if _family(name) == family]
+        if not names:
+            continue
+        metric_type, help_text = METRICS[family]
+        lines.append('# HELP {0} {1}'.format(family, help_text))
+        lines.append('# TYPE {0} {1}'.format(family, metric_type))
+        lines.extend('{0} {1}'.format(name, _format_value(merged[name])) for name in names)
+    folder = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(prefix='.didata-metrics', dir=folder)
+    with os.fdopen(handle, 'w') as textfile:
+        textfile.write('\n'.join(lines) + '\n')
+    os.chmod(temp_path, 0o644)
+    os.rename(temp_path, path)
+
+
+def read_textfile(path):
+    """Return the didata samples in a textfile, an empty OrderedDict when there is none"""
+    samples = OrderedDict()
+    try:
+        with open(path) as textfile:
+            for line in textfile:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                name, _, value = line.rpartition(' ')
+                if _family(name) in METRICS:
+                    samples[name] = float(value)
+    except (IOError, OSError, ValueError):
+        return OrderedDict()
+    return samples
+
+
+def _sample(name, labels):
+    return '{0}{{{1}}}'.format(name, ','.join('{0}="{1}"'.format(key, _escape(value)) for key, value in labels))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _family(name):
+    name = name.split('{', 1)[0]
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+            return name[:-len(suffix)]
+    return name
+
+
+def _add(samples, name, value):
+    samples[name] = samples.get(name, 0) + value
+
+
+def _observe(samples, name, labels, value):
+    for bucket in LATENCY_BUCKETS:
+        _add(samples, _sample(name + '_bucket', labels + (('le', repr(bucket)),)), 1 if value <= bucket else 0)
+    _add(samples, _sample(name + '_bucket', labels + (('le', '+Inf'),)), 1)
+    _add(samples, _sample(name + '_sum', labels), value)
+    _add(samples, _sample(name + '_count', labels), 1)
+
+
+def _format_value(value):
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(round(value, 6))
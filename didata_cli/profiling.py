@@ -0,0 +1,93 @@
+import cProfile
+import linecache
+import pstats
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Functions, or allocating lines, shown in a report
+REPORT_LINES = 30
+# Frames kept per allocation, the lines reported are where the memory was allocated
+MEMORY_FRAMES = 1
+
+
+class Profiler(object):
+    """Profiles a command's CPU time with cProfile and/or its memory with tracemalloc.
+
+    cProfile only sees the thread it was started in, calls made by worker
+    threads (e.g. --region all) are reported as time waiting for them.
+    Memory is snapshotted when a response is rendered, while all of its rows
+    are still held, and when the command is done, the largest snapshot is
+    reported.
+    """
+
+    def __init__(self, cpu=False, memory=False):
+        if memory and tracemalloc is None:
+            raise RuntimeError("Memory profiling needs tracemalloc (Python 3.4 or later)")
+        self.cpu = cpu
+        self.memory = memory
+        self._profile = None
+        self._snapshot = None
+        self._snapshot_size = -1
+        self._snapshot_when = None
+        self._peak = 0
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start(MEMORY_FRAMES)
+        if self.cpu:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def observe_render(self, rows, output_bytes):
+        self._take_snapshot('rendering {0} rows'.format(rows))
+
+    def _take_snapshot(self, when):
+        if not self.memory or not tracemalloc.is_tracing():
+            return
+        size, self._peak = tracemalloc.get_traced_memory()
+        if size > self._snapshot_size:
+            self._snapshot = tracemalloc.take_snapshot()
+            self._snapshot_size = size
+            self._snapshot_when = when
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+        if self.memory and tracemalloc.is_tracing():
+            self._take_snapshot('the end of the command')
+            tracemalloc.stop()
+
+    def write_stats(self, path):
+        """Write the cProfile stats as a .pstats file, for python -m pstats, snakeviz..."""
+        self._profile.dump_stats(path)
+
+    def cpu_report(self, sort='cumulative', lines=REPORT_LINES):
+        output = StringIO()
+        stats = pstats.Stats(self._profile, stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(lines)
+        return output.getvalue().strip('\n')
+
+    def memory_report(self, lines=REPORT_LINES):
+        snapshot = self._snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+        statistics = snapshot.statistics('lineno')
+        report = ['Peak traced memory {0:.1f} KB, {1:.1f} KB in {2} blocks allocated at {3}'.format(
+            self._peak / 1024.0, sum(stat.size for stat in statistics) / 1024.0,
+            sum(stat.count for stat in statistics), self._snapshot_when)]
+        report.append('{0:>10} {1:>8}  {2}'.format('KB', 'blocks', 'line'))
+        for stat in statistics[:lines]:
+            frame = stat.traceback[0]
+            report.append('{0:>10.1f} {1:>8}  {2}:{3}  {4}'.format(
+                stat.size / 1024.0, stat.count, frame.filename, frame.lineno,
+                linecache.getline(frame.filename, frame.lineno).strip()))
+        return '\n'.join(report)
@@ -0,0 +1,327 @@
+import click
+import operator
+import re
+from collections import namedtuple
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+# Where clause expression language.
+#
+#   expression := or_term
+#   or_term    := and_term ('or' and_term)*
+#   and_term   := not_term ('and' not_term)*
+#   not_term   := 'not' not_term | '(' expression ')' | comparison
+#   comparison := operand [(== | = | != | < | <= | > | >=) operand
+#                          | (=~ | !~) string
+#                          | ['not'] 'in' '(' literal (',' literal)* ')']
+#   operand    := field | literal
+#
+# Fields are bare words (State, datacenterId) or, when they contain spaces,
+# wrapped in brackets ([CPU Count], [Disk 0 Size]).  Literals are numbers,
+# quoted strings and true, false or null.
+
+Field = namedtuple('Field', ['name'])
+Literal = namedtuple('Literal', ['value'])
+Compare = namedtuple('Compare', ['op', 'left', 'right'])
+Match = namedtuple('Match', ['field', 'pattern', 'negated'])
+In = namedtuple('In', ['operand', 'values', 'negated'])
+And = namedtuple('And', ['terms'])
+Or = namedtuple('Or', ['terms'])
+Not = namedtuple('Not', ['term'])
+
+KEYWORDS = {
+    'true': True,
+    'false': False,
+    'null': None
+}
+COMPARISON_OPERATORS = {
+    '==': operator.eq,
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge
+}
+TOKEN_RE = re.compile(r'''\s*(?:
+    (?P<number>-?\d+(?:\.\d+)?)(?![\w.:])
+    |(?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+    |(?P<field>\[[^\]]+\])
+    |(?P<op>==|!=|<=|>=|=~|!~|<|>|=|\(|\)|,)
+    |(?P<word>[A-Za-z_][\w.]*)
+    )''', re.VERBOSE)
+
+try:
+    number_types = (int, long, float)
+    string_types = basestring
+except NameError:
+    number_types = (int, float)
+    string_types = str
+
+
+class DiDataCLIQueryError(click.ClickException):
+    def __init__(self, message):
+        super(DiDataCLIQueryError, self).__init__("Invalid query: {0}".format(message))
+
+
+def tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN_RE.match(expression, position)
+        if match is None or match.end() == position:
+            raise DiDataCLIQueryError("unexpected '{0}' in Where".format(expression[position:].strip()))
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'number':
+            tokens.append(('literal', float(text) if '.' in text else int(text)))
+        elif kind == 'string':
+            tokens.append(('literal', re.sub(r'\\(.)', r'\1', text[1:-1])))
+        elif kind == 'field':
+            tokens.append(('field', text[1:-1].strip()))
+        elif kind == 'word' and text.lower() in KEYWORDS:
+            tokens.append(('literal', KEYWORDS[text.lower()]))
+        elif kind == 'word' and text.lower() in ('and', 'or', 'not', 'in'):
+            tokens.append(('op', text.lower()))
+        elif kind == 'word':
+            tokens.append(('field', text))
+        else:
+            tokens.append(('op', text))
+        position = match.end()
+    return tokens
+
+
+class _Parser(object):
+    def __init__(self, expression):
+        self._tokens = tokenize(expression)
+        self._position = 0
+
+    def parse(self):
+        if not self._tokens:
+            raise DiDataCLIQueryError("empty Where")
+        node = self._or_term()
+        if self._peek() is not None:
+            raise DiDataCLIQueryError("unexpected '{0}' in Where".format(self._peek()[1]))
+        return node
+
+    def _peek(self):
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise DiDataCLIQueryError("Where ends too early")
+        self._position += 1
+        return token
+
+    def _accept(self, op):
+        if self._peek() == ('op', op):
+            self._position += 1
+            return True
+        return False
+
+    def _expect(self, op):
+        if not self._accept(op):
+            raise DiDataCLIQueryError("expected '{0}' in Where".format(op))
+
+    def _or_term(self):
+        terms = [self._and_term()]
+        while self._accept('or'):
+            terms.append(self._and_term())
+        return terms[0] if len(terms) == 1 else Or(tuple(terms))
+
+    def _and_term(self):
+        terms = [self._not_term()]
+        while self._accept('and'):
+            terms.append(self._not_term())
+        return terms[0] if len(terms) == 1 else And(tuple(terms))
+
+    def _not_term(self):
+        if self._accept('not'):
+            return Not(self._not_term())
+        if self._accept('('):
+            node = self._or_term()
+            self._expect(')')
+            return node
+        return self._comparison()
+
+    def _operand(self):
+        kind, value = self._next()
+        if kind == 'field':
+            return Field(value)
+        if kind == 'literal':
+            return Literal(value)
+        raise DiDataCLIQueryError("expected a field or value, found '{0}'".format(value))
+
+    def _comparison(self):
+        left = self._operand()
+        token = self._peek()
+        if token is None or token[0] != 'op':
+            return left
+        op = token[1]
+        if op in COMPARISON_OPERATORS:
+            self._position += 1
+            return Compare(op, left, self._operand())
+        if op in ('=~', '!~'):
+            self._position += 1
+            pattern = self._operand()
+            if not isinstance(pattern, Literal) or not isinstance(pattern.value, string_types):
+                raise DiDataCLIQueryError("{0} must be followed by a quoted regular expression".format(op))
+            try:
+                regex = re.compile(pattern.value)
+            except re.error as e:
+                raise DiDataCLIQueryError("bad regular expression '{0}': {1}".format(pattern.value, e))
+            return Match(left, regex, op == '!~')
+        if op in ('in', 'not'):
+            negated = self._accept('not')
+            self._expect('in')
+            self._expect('(')
+            values = [self._literal()]
+            while self._accept(','):
+                values.append(self._literal())
+            self._expect(')')
+            return In(left, tuple(values), negated)
+        return left
+
+    def _literal(self):
+        operand = self._operand()
+        if not isinstance(operand, Literal):
+            raise DiDataCLIQueryError("in (...) only takes values, not fields")
+        return operand.value
+
+
+def parse_where(expression):
+    """Parse a Where expression into its syntax tree"""
+    return _Parser(expression).parse()
+
+
+def where_fields(node):
+    """Return the set of field names a Where syntax tree reads"""
+    if isinstance(node, Field):
+        return set([node.name])
+    if isinstance(node, Literal):
+        return set()
+    if isinstance(node, Compare):
+        return where_fields(node.left) | where_fields(node.right)
+    if isinstance(node, Match):
+        return where_fields(node.field)
+    if isinstance(node, In):
+        return where_fields(node.operand)
+    if isinstance(node, Not):
+        return where_fields(node.term)
+    fields = set()
+    for term in node.terms:
+        fields |= where_fields(term)
+    return fields
+
+
+def _field_equality(node):
+    if not isinstance(node, Compare) or node.op not in ('==', '='):
+        return None
+    for field, literal in ((node.left, node.right), (node.right, node.left)):
+        if isinstance(field, Field) and isinstance(literal, Literal) and isinstance(literal.value, string_types):
+            return field.name, literal.value
+    return None
+
+
+def push_down(node, fields, keep=()):
+    """Split a Where syntax tree into the equality tests an API can do and the rest.
+
+    Only top level ``and`` terms of the form ``field == 'value'`` for one of
+    fields are taken.  Returns ``(pushed, residual)``, pushed maps field names
+    to values and residual is the tree still to check locally, or None.
+    Terms on a field in keep are pushed and also left in residual, for API
+    filters that match more items than the field itself.  When fields maps
+    field names to API filters, only one term is pushed per filter.
+    """
+    terms = node.terms if isinstance(node, And) else (node,)
+    targets = fields if isinstance(fields, dict) else dict((field, field) for field in fields)
+    pushed = OrderedDict()
+    taken = set()
+    residual = []
+    for term in terms:
+        equality = _field_equality(term)
+        if equality is not None and equality[0] in targets and targets[equality[0]] not in taken:
+            pushed[equality[0]] = equality[1]
+            taken.add(targets[equality[0]])
+            if equality[0] in keep:
+                residual.append(term)
+        else:
+            residual.append(term)
+    if not residual:
+        return pushed, None
+    if len(residual) == 1:
+        return pushed, residual[0]
+    return pushed, And(tuple(residual))
+
+
+def _to_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, number_types):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compare(op, left, right):
+    if left is None or right is None:
+        if op in ('==', '='):
+            return left is right
+        if op == '!=':
+            return left is not right
+        return False
+    # Numbers win when either side is one, "4" == 4 and [Disk 0 Size] > 50
+    # both work.  Otherwise values of different types compare as text.
+    if isinstance(left, number_types) or isinstance(right, number_types):
+        left_number = _to_number(left)
+        right_number = _to_number(right)
+        if left_number is not None and right_number is not None:
+            return COMPARISON_OPERATORS[op](left_number, right_number)
+    if type(left) is not type(right):
+        left = str(left)
+        right = str(right)
+    return COMPARISON_OPERATORS[op](left, right)
+
+
+def compile_where(node):
+    """Compile a Where syntax tree into a function of one item returning a bool"""
+    if isinstance(node, Field):
+        name = node.name
+        return lambda item: item.get(name)
+    if isinstance(node, Literal):
+        value = node.value
+        return lambda item: value
+    if isinstance(node, Compare):
+        op = node.op
+        left = compile_where(node.left)
+        right = compile_where(node.right)
+        return lambda item: compare(op, left(item), right(item))
+    if isinstance(node, Match):
+        field = compile_where(node.field)
+        search = node.pattern.search
+        negated = node.negated
+
+        def match(item):
+            value = field(item)
+            return (value is not None and search(str(value)) is not None) != negated
+        return match
+    if isinstance(node, In):
+        operand = compile_where(node.operand)
+        values = node.values
+        negated = node.negated
+        return lambda item: any(compare('==', operand(item), value) for value in values) != negated
+    if isinstance(node, Not):
+        term = compile_where(node.term)
+        return lambda item: not term(item)
+    terms = [compile_where(term) for term in node.terms]
+    if isinstance(node, And):
+        return lambda item: all(term(item) for term in terms)
+    return lambda item: any(term(item) for term in terms)
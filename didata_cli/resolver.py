@@ -0,0 +1,101 @@
+import time
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+RESOLVER_TTL = 60
+# The filters a server can be found by, list_nodes keyword arguments apart
+# from tag, which is KEY or KEY=VALUE.
+SERVER_FILTERS = ('ex_ipv6', 'ex_ipv4', 'ex_name', 'tag')
+# The filters answered from a full listing.  A listed node only carries its
+# primary NIC's addresses while the API's IP filters match any NIC, so IP
+# lookups are always filtered by the API.
+INDEXED_FILTERS = ('ex_name', 'tag')
+
+
+class ServerResolver(object):
+    """Finds server IDs by IPv6, private IPv4, name or tag.
+
+    A lone lookup is a list_nodes (or ex_list_tags) call filtered by the
+    API.  Resolving many targets at once lists every server (and server tag)
+    a single time and answers each name or tag target from dict indexes
+    instead, IP targets are still filtered by the API.
+    Answers and indexes are kept for ttl seconds, so the same lookup again
+    in a session (e.g. in didata shell) doesn't call the API, until a command
+    changing servers or tags calls invalidate.  get_driver is called for
+    every lookup, so worker threads sharing a resolver use their own driver.
+    """
+
+    def __init__(self, get_driver, ttl=RESOLVER_TTL, clock=None):
+        self._get_driver = get_driver
+        self.ttl = ttl
+        self._clock = clock or time.time
+        self._answers = {}
+        self._indexes = {}
+
+    def invalidate(self):
+        self._answers = {}
+        self._indexes = {}
+
+    def find(self, **filters):
+        """Return the IDs of the servers matching every filter given, in list order"""
+        found = None
+        for key in SERVER_FILTERS:
+            if filters.get(key) is None:
+                continue
+            ids = self._lookup(key, filters[key])
+            found = ids if found is None else [server_id for server_id in found if server_id in ids]
+        return found or []
+
+    def find_many(self, targets):
+        """Return an OrderedDict of (filter, value) to the IDs of the servers it matches, for a list of targets"""
+        for key in set(key for key, _ in targets if key in INDEXED_FILTERS):
+            self._index(key)
+        return OrderedDict((target, self._lookup(*target)) for target in targets)
+
+    def _lookup(self, key, value):
+        index = self._fresh(self._indexes, key)
+        if index is not None:
+            return index.get(_split_tag(value) if key == 'tag' else value, [])
+        answer = self._fresh(self._answers, (key, value))
+        if answer is None:
+            if key == 'tag':
+                tag_key, tag_value = _split_tag(value)
+                tags = self._get_driver().ex_list_tags(asset_type='SERVER', tag_key_name=tag_key, value=tag_value)
+                answer = _unique(tag.asset_id for tag in tags)
+            else:
+                answer = _unique(node.id for node in self._get_driver().list_nodes(**{key: value}))
+            self._answers[(key, value)] = (self._clock(), answer)
+        return answer
+
+    def _index(self, key):
+        if self._fresh(self._indexes, key) is not None:
+            return
+        index = {}
+        if key == 'tag':
+            for tag in self._get_driver().ex_list_tags(asset_type='SERVER'):
+                for tag_key in ((tag.key.name, None), (tag.key.name, tag.value)):
+                    index.setdefault(tag_key, []).append(tag.asset_id)
+        else:
+            for node in self._get_driver().list_nodes():
+                index.setdefault(node.name, []).append(node.id)
+        self._indexes[key] = (self._clock(), index)
+
+    def _fresh(self, cache, key):
+        if key not in cache:
+            return None
+        stored_at, value = cache[key]
+        if self._clock() - stored_at > self.ttl:
+            del cache[key]
+            return None
+        return value
+
+
+def _split_tag(tag):
+    tag_key, _, tag_value = tag.partition('=')
+    return tag_key, tag_value if '=' in tag else None
+
+
+def _unique(ids):
+    return [server_id for server_id in OrderedDict((server_id, None) for server_id in ids)]
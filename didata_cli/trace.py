@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+import time
+import types
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+REDACTED = '<redacted>'
+# Keyword arguments whose name contains one of these are never recorded
+SECRET_WORDS = ('pass', 'secret', 'token', 'auth')
+MAX_ARG_LENGTH = 60
+
+
+class Span(object):
+    """One driver call: what was called, the HTTP round trips it made and when it ran.
+
+    segments is a list of (start, end) times, a call returning a generator
+    (e.g. ex_list_nodes_paginated) runs again every time a page is asked for.
+    """
+    __slots__ = ('name', 'region', 'args', 'thread', 'segments', 'round_trips', 'bytes_received', 'pages', 'error')
+
+    def __init__(self, name, region, args, thread):
+        self.name = name
+        self.region = region
+        self.args = args
+        self.thread = thread
+        self.segments = []
+        self.round_trips = 0
+        self.bytes_received = 0
+        self.pages = 0
+        self.error = None
+
+    @property
+    def seconds(self):
+        return sum(end - start for start, end in self.segments)
+
+
+class Tracer(object):
+    """Records every driver call made through a TracingDriver and the HTTP requests made while it runs"""
+
+    def __init__(self, clock=None):
+        self._clock = clock or time.time
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.started = self._clock()
+        self.spans = []
+        self.requests = []
+        self.retries = 0
+
+    def wrap_driver(self, driver, kind, region):
+        return TracingDriver(driver, self, kind, region)
+
+    def instrument_connection(self, connection):
+        """Count the round trips, bytes, pages and retries of every request a libcloud connection makes.
+
+        DimensionDataConnection's request methods call Connection.request
+        through super(), so the hook is on _retryable_request, which makes
+        each HTTP attempt and is looked up on the instance.
+        """
+        retryable_request = connection._retryable_request
+        tracer = self
+
+        def traced_attempt(*args, **kwargs):
+            start = tracer._clock()
+            response = None
+            tracer._local.attempts = getattr(tracer._local, 'attempts', 0) + 1
+            try:
+                response = retryable_request(*args, **kwargs)
+                return response
+            finally:
+                tracer._record_request(kwargs.get('url', args[0] if args else None), kwargs.get('method', 'GET'),
+                                       start, tracer._clock(), response)
+        connection._retryable_request = traced_attempt
+
+        # With retries enabled (LIBCLOUD_RETRY_FAILED_HTTP_REQUESTS) requests
+        # go through retryCls, which calls _retryable_request once per attempt
+        retry_class = getattr(connection, 'retryCls', None)
+        if retry_class is not None:
+            def counting_retry(*args, **kwargs):
+                retry = retry_class(*args, **kwargs)
+
+                def decorate(function):
+                    retried = retry(function)
+
+                    def counted(*args, **kwargs):
+                        tracer._local.attempts = 0
+                        try:
+                            return retried(*args, **kwargs)
+                        finally:
+                            with tracer._lock:
+                                tracer.retries += max(tracer._local.attempts - 1, 0)
+                    return counted
+                return decorate
+            connection.retryCls = counting_retry
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record_request(self, url, method, start, end, response):
+        action = url.split('?', 1)[0] if url else url
+        body = getattr(response, 'body', None) or ''
+        parsed = getattr(response, 'object', None)
+        paged = getattr(parsed, 'get', None) is not None and parsed.get('pageNumber') is not None
+        stack = self._stack()
+        span = stack[-1] if stack else None
+        if span is not None:
+            span.round_trips += 1
+            span.bytes_received += len(body)
+            span.pages += 1 if paged else 0
+        with self._lock:
+            self.requests.append((method, action, threading.current_thread().ident, start, end, len(body),
+                                  getattr(response, 'status', None)))
+
+    def call(self, name, region, method, args, kwargs):
+        span = Span(name, region, describe_args(args, kwargs), threading.current_thread().ident)
+        with self._lock:
+            self.spans.append(span)
+        result = self._run(span, method, args, kwargs)
+        if isinstance(result, types.GeneratorType):
+            return self._traced_generator(span, result)
+        return result
+
+    def _run(self, span, method, args, kwargs):
+        stack = self._stack()
+        stack.append(span)
+        start = self._clock()
+        try:
+            return method(*args, **kwargs)
+        except StopIteration:
+            raise
+        except Exception as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.segments.append((start, self._clock()))
+            stack.pop()
+
+    def _traced_generator(self, span, generator):
+        while True:
+            try:
+                item = self._run(span, next, (generator,), {})
+            except StopIteration:
+                return
+            yield item
+
+    def summary(self):
+        """Return an OrderedDict per driver method, slowest first"""
+        methods = OrderedDict()
+        for span in self.spans:
+            row = methods.get(span.name)
+            if row is None:
+                row = methods[span.name] = OrderedDict([
+                    ('Method', span.name), ('Calls', 0), ('Round Trips', 0), ('Pages', 0), ('KB Received', 0.0),
+                    ('Seconds', 0.0), ('Max Seconds', 0.0), ('Errors', 0)])
+            seconds = span.seconds
+            row['Calls'] += 1
+            row['Round Trips'] += span.round_trips
+            row['Pages'] += span.pages
+            row['KB Received'] += span.bytes_received / 1024.0
+            row['Seconds'] += seconds
+            row['Max Seconds'] = max(row['Max Seconds'], seconds)
+            row['Errors'] += 1 if span.error else 0
+        rows = sorted(methods.values(), key=lambda row: row['Seconds'], reverse=True)
+        for row in rows:
+            for key in ('KB Received', 'Seconds', 'Max Seconds'):
+                row[key] = round(row[key], 3)
+        return rows
+
+    def chrome_trace(self):
+        """Return the calls and requests as a Chrome trace event document (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        events = []
+
+        def microseconds(seconds):
+            return int((seconds - self.started) * 1000000)
+
+        for span in self.spans:
+            args = OrderedDict([('args', span.args), ('region', span.region), ('round_trips', span.round_trips),
+                                ('bytes_received', span.bytes_received), ('pages', span.pages)])
+            if span.error:
+                args['error'] = span.error
+            for start, end in span.segments:
+                events.append(OrderedDict([('name', span.name), ('cat', 'driver'), ('ph', 'X'),
+                                           ('ts', microseconds(start)),
+                                           ('dur', microseconds(end) - microseconds(start)),
+                                           ('pid', pid), ('tid', span.thread), ('args', args)]))
+        for method, action, thread, start, end, size, status in self.requests:
+            events.append(OrderedDict([('name', '{0} {1}'.format(method, action)), ('cat', 'http'), ('ph', 'X'),
+                                       ('ts', microseconds(start)), ('dur', microseconds(end) - microseconds(start)),
+                                       ('pid', pid), ('tid', thread),
+                                       ('args', OrderedDict([('bytes', size), ('status', status)]))]))
+        events.sort(key=lambda event: (event['ts'], -event['dur']))
+        return OrderedDict([('traceEvents', events), ('displayTimeUnit', 'ms')])
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w') as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+
+class TracingDriver(object):
+    """Wraps a driver so every method call is recorded by a Tracer"""
+
+    def __init__(self, driver, tracer, kind, region):
+        self._driver = driver
+        self._tracer = tracer
+        self._kind = kind
+        self._region = region
+
+    @property
+    def uncached_driver(self):
+        from didata_cli.utils import live_driver
+        return TracingDriver(live_driver(self._driver), self._tracer, self._kind, self._region)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._driver, name)
+        if name.startswith('_') or not callable(attribute):
+            return attribute
+        tracer = self._tracer
+        span_name = '{0}.{1}'.format(self._kind, name)
+        region = self._region
+
+        def traced(*args, **kwargs):
+            return tracer.call(span_name, region, attribute, args, kwargs)
+        return traced
+
+
+def describe_args(args, kwargs):
+    """Describe call arguments without secrets or whole objects, e.g. "<Node 8aef...>, ex_location='NA9'" """
+    described = [_describe(value) for value in args]
+    for key in sorted(kwargs):
+        if any(word in key.lower() for word in SECRET_WORDS):
+            described.append('{0}={1}'.format(key, REDACTED))
+        else:
+            described.append('{0}={1}'.format(key, _describe(kwargs[key])))
+    return ', '.join(described)
+
+
+def _describe(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return repr(value)
+    if isinstance(value, string_types):
+        if len(value) > MAX_ARG_LENGTH:
+            value = value[:MAX_ARG_LENGTH] + '...'
+        return repr(value)
+    type_name = type(value).__name__
+    if 'Auth' in type_name:
+        return REDACTED
+    value_id = getattr(value, 'id', None)
+    if isinstance(value_id, string_types):
+        return '<{0} {1}>'.format(type_name, value_id)
+    if isinstance(value, (list, tuple)):
+        return '<{0} of {1}>'.format(type_name, len(value))
+    return '<{0}>'.format(type_name)
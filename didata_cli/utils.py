@@ -1,50 +1,232 @@
 import click
+import functools
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from libcloud.common.dimensiondata import DimensionDataAPIException
+from didata_cli.resolver import SERVER_FILTERS
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+
+# --serverFilter... options, their parameter name and the filter they are
+SERVER_FILTER_OPTIONS = (
+    ('--serverFilterIpv6', 'serverfilteripv6', 'ex_ipv6', "The filter for ipv6"),
+    ('--serverFilterIpv4', 'serverfilteripv4', 'ex_ipv4', "The filter for private ipv4"),
+    ('--serverFilterName', 'serverfiltername', 'ex_name', "The filter for server name"),
+    ('--serverFilterTag', 'serverfiltertag', 'tag', "The filter for a server tag, KEY or KEY=VALUE"),
+)
+
+
+def server_filter_options(func):
+    """Add the --serverFilter... options, passed to the command as one serverfilters dict"""
+    return _server_filter_options(func, False)
+
+
+def server_filter_list_options(func):
+    """Like server_filter_options, but every option can be given more than once and is a tuple of values"""
+    return _server_filter_options(func, True)
+
+
+def _server_filter_options(func, multiple):
+    @functools.wraps(func)
+    def new_func(*args, **kwargs):
+        kwargs['serverfilters'] = OrderedDict((key, kwargs.pop(param)) for _, param, key, _ in SERVER_FILTER_OPTIONS)
+        return func(*args, **kwargs)
+
+    for option, param, _, help_text in reversed(SERVER_FILTER_OPTIONS):
+        if multiple:
+            help_text += ", can be given more than once"
+        new_func = click.option(option, param, multiple=multiple, type=click.UNPROCESSED, help=help_text)(new_func)
+    return new_func
 
 
 def get_single_server_id_from_filters(client, **kwargs):
+    if not any(kwargs.get(key) for key in SERVER_FILTERS):
+        click.secho("No serverId or filters for servers found")
+        sys.exit(1)
+    try:
+        server_ids = client.server_resolver.find(**kwargs)
+    except DimensionDataAPIException as e:
+        handle_dd_api_exception(e)
+    if len(server_ids) > 1:
+        click.secho("Too many nodes found in filter", fg='red', bold=True)
+        sys.exit(1)
+    if len(server_ids) == 0:
+        click.secho("No nodes found with fitler", fg='red', bold=True)
+        sys.exit(1)
+    return server_ids[0]
+
+
+def get_server_ids_from_filters(client, targets):
+    """Resolve a list of (filter, value) targets that must name one server each"""
     try:
-        # fix this line
-        if len(kwargs.keys()) == 0 or not kwargs['ex_ipv6']:
-            click.secho("No serverId or filters for servers found")
-            exit(1)
-        node_list = client.node.list_nodes(**kwargs)
-        if len(node_list) > 1:
-            click.secho("Too many nodes found in filter", fg='red', bold=True)
-            exit(1)
-        if len(node_list) == 0:
-            click.secho("No nodes found with fitler", fg='red', bold=True)
-            exit(1)
-        return node_list[0].id
+        found = client.server_resolver.find_many(targets)
     except DimensionDataAPIException as e:
         handle_dd_api_exception(e)
+    failures = 0
+    for (key, value), server_ids in found.items():
+        if len(server_ids) != 1:
+            failures += 1
+            click.secho("{0} servers found with {1} {2}".format(len(server_ids), key.replace('ex_', ''), value),
+                        fg='red', bold=True)
+    if failures > 0:
+        sys.exit(1)
+    return [server_ids[0] for server_ids in found.values()]
+
+
+def invoke_command_line(ctx, args):
+    """Run one didata command line (e.g. ['server', 'info', '--serverId', 'x']) inside the root context of ctx.
+
+    The command reuses the DiDataCLIClient already attached to the root
+    context.  Returns the exit code the command would have exited with.
+    """
+    root = ctx.find_root()
+    try:
+        name, command, sub_args = root.command.resolve_command(root, args)
+        sub_ctx = command.make_context(name, sub_args, parent=root)
+        command.invoke(sub_ctx)
+    except click.ClickException as e:
+        e.show()
+        return e.exit_code
+    except click.Abort:
+        click.secho("Aborted!", fg='red', bold=True)
+        return 1
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        return 1
+    return 0
+
+
+def run_concurrently(func, items, workers):
+    """Call func(item) for every item using at most `workers` threads.
+
+    Returns a list of (item, result, exception, seconds) tuples in the same
+    order as items.  An exception raised by func is returned, not raised.
+    """
+    def timed_call(item):
+        start = time.time()
+        try:
+            return item, func(item), None, time.time() - start
+        except Exception as e:
+            return item, None, e, time.time() - start
+
+    if workers <= 1:
+        return [timed_call(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(timed_call, items))
+
+
+def split_ids(value):
+    """Split a comma separated option value into a list of IDs, [None] when the option wasn't given"""
+    if value is None:
+        return [None]
+    ids = []
+    for id in value.split(','):
+        id = id.strip()
+        if id and id not in ids:
+            ids.append(id)
+    return ids or [None]
+
+
+def list_in_regions(client, list_items):
+    """Return the dicts list_items(driver) builds, for every region the client was given.
+
+    See list_in_datacenters.
+    """
+    return list_in_datacenters(client, [None], lambda driver, datacenterid: list_items(driver))
+
+
+def list_in_datacenters(client, datacenterids, list_items):
+    """Return the dicts list_items(driver, datacenterid) builds, for every region and datacenter.
+
+    The calls are made at the same time and the results are merged in
+    order, dropping dicts whose ID was already returned.  With more than
+    one region every dict gets a Region key in front.  A region or
+    datacenter that fails is reported and left out, the command only exits
+    if every one of them failed.
+    """
+    if len(client.regions) == 1 and len(datacenterids) == 1:
+        return list_items(client.node, datacenterids[0])
+
+    def list_location(location):
+        region, datacenterid = location
+        return list_items(client.node_for_region(region), datacenterid)
+
+    locations = [(region, datacenterid) for region in client.regions for datacenterid in datacenterids]
+    items = []
+    seen = set()
+    failures = 0
+    results = run_concurrently(list_location, locations, client.pool_size)
+    for (region, datacenterid), location_items, error, seconds in results:
+        if error is not None:
+            failures += 1
+            names = []
+            if len(client.regions) > 1:
+                names.append("Region {0}".format(region))
+            if datacenterid is not None:
+                names.append("Datacenter {0}".format(datacenterid))
+            click.secho("{0}: {1}".format(" ".join(names), error), fg='red', bold=True, err=True)
+            continue
+        for item in location_items:
+            if 'ID' in item:
+                if (region, item['ID']) in seen:
+                    continue
+                seen.add((region, item['ID']))
+            if len(client.regions) > 1:
+                item = OrderedDict([('Region', region)] + [(key, item[key]) for key in item])
+            items.append(item)
+    if failures == len(locations):
+        sys.exit(1)
+    return items
+
+
+def live_driver(driver):
+    """Return the driver behind the response cache, for calls that must see the API"""
+    from didata_cli.cache import CachingDriver
+    from didata_cli.trace import TracingDriver
+    if isinstance(driver, (CachingDriver, TracingDriver)):
+        return driver.uncached_driver
+    return driver
 
 
 def handle_dd_api_exception(e):
     click.secho("{0}".format(e), fg='red', bold=True)
-    exit(1)
+    sys.exit(1)
 
 
-def flattenDict(d, result=None):
+def flattenDict(d, result=None, separator='.'):
+    """Flatten nested dicts and lists into one dict of path to leaf value, see iter_flat_items"""
     if result is None:
         result = {}
-    for key in d:
-        value = d[key]
-        if isinstance(value, dict):
-            value1 = {}
-            for keyIn in value:
-                value1[".".join([key, keyIn])] = value[keyIn]
-            flattenDict(value1, result)
-        elif isinstance(value, (tuple, list)):
-            for indexB, element in enumerate(value):
-                if isinstance(element, dict):
-                    value1 = {}
-                    index = 0
-                    for keyIn in element:
-                        value1[".".join([key, keyIn])] = value[indexB][keyIn]
-                        index += 1
-                    for keyA in value1:
-                        flattenDict(value1, result)
-        else:
-            result[key] = value
+    for key, value in iter_flat_items(d, separator):
+        result[key] = value
     return result
+
+
+def iter_flat_items(d, separator='.'):
+    """Yield (path, value) for every leaf value of d in order, e.g. ('disks.0.size', 10).
+
+    Dict keys and list indices are joined with separator and empty dicts and
+    lists are left out.  Walks the nesting with its own stack instead of
+    recursing, so it copes with any depth and builds no intermediate dicts.
+    """
+    stack = [(None, iter(d.items()))]
+    while stack:
+        prefix, children = stack[-1]
+        for key, value in children:
+            path = str(key) if prefix is None else prefix + separator + str(key)
+            if isinstance(value, dict):
+                stack.append((path, iter(value.items())))
+                break
+            if isinstance(value, (list, tuple)):
+                stack.append((path, enumerate(value)))
+                break
+            yield path, value
+        else:
+            stack.pop()
@@ -0,0 +1,147 @@
+import click
+import random
+import sys
+import time
+from libcloud.common.dimensiondata import DimensionDataAPIException
+from didata_cli.utils import handle_dd_api_exception, live_driver
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+DEFAULT_TIMEOUT = 600
+INITIAL_DELAY = 2.0
+MAX_DELAY = 30.0
+BACKOFF_FACTOR = 1.5
+JITTER = 0.25
+
+
+def wait_options(func):
+    func = click.option('--timeout', type=click.IntRange(1, None), default=DEFAULT_TIMEOUT,
+                        help="Seconds to wait with --wait before giving up")(func)
+    func = click.option('--wait', is_flag=True, default=False,
+                        help="Wait until the change has finished before returning")(func)
+    return func
+
+
+class WaitTimeout(Exception):
+    def __init__(self, pending, timeout):
+        super(WaitTimeout, self).__init__("Timed out after {0} seconds waiting for {1}".format(
+            timeout, ", ".join(pending)))
+        self.pending = pending
+        self.timeout = timeout
+
+
+class Poller(object):
+    """Polls resources until is_done(resource) is true for all of them.
+
+    The wait between polls grows from initial_delay by factor up to
+    max_delay, each one randomly stretched or shrunk by jitter so many
+    waiting clients don't poll in step.  A single pending resource is
+    fetched with get_one(id), more than one are fetched together with one
+    get_many() call per poll and picked out of it by id.
+    """
+
+    def __init__(self, get_one, get_many, is_done, timeout=DEFAULT_TIMEOUT, initial_delay=INITIAL_DELAY,
+                 max_delay=MAX_DELAY, factor=BACKOFF_FACTOR, jitter=JITTER, sleep=None, clock=None):
+        self._get_one = get_one
+        self._get_many = get_many
+        self._is_done = is_done
+        self.timeout = timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self._sleep = sleep or time.sleep
+        self._clock = clock or time.time
+        self.polls = 0
+
+    def delays(self):
+        delay = self.initial_delay
+        while True:
+            yield delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+            delay = min(self.max_delay, delay * self.factor)
+
+    def wait(self, ids):
+        """Return an OrderedDict of id to finished resource, or raise WaitTimeout"""
+        deadline = self._clock() + self.timeout
+        pending = list(ids)
+        done = OrderedDict()
+        for delay in self.delays():
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                raise WaitTimeout(pending, self.timeout)
+            self._sleep(min(delay, remaining))
+            for resource_id, resource in self._poll(pending):
+                if resource is not None and self._is_done(resource):
+                    done[resource_id] = resource
+            pending = [resource_id for resource_id in pending if resource_id not in done]
+            if not pending:
+                return OrderedDict((resource_id, done[resource_id]) for resource_id in ids)
+
+    def _poll(self, pending):
+        self.polls += 1
+        if len(pending) == 1:
+            return [(pending[0], self._get_one(pending[0]))]
+        by_id = dict((resource.id, resource) for resource in self._get_many())
+        return [(resource_id, by_id.get(resource_id)) for resource_id in pending]
+
+
+def _node_is_done(node):
+    if node.extra['status'].action is not None:
+        return False
+    return all(disk.state == 'NORMAL' for disk in node.extra.get('disks') or [])
+
+
+def _node_failure(node):
+    return node.extra['status'].failure_reason
+
+
+def _vlan_is_done(vlan):
+    return not vlan.status.startswith('PENDING')
+
+
+def _vlan_failure(vlan):
+    if vlan.status != 'NORMAL':
+        return "VLAN is {0}".format(vlan.status)
+    return None
+
+
+def wait_for_nodes(client, node_ids, timeout=DEFAULT_TIMEOUT):
+    driver = live_driver(client.node)
+    poller = Poller(driver.ex_get_node_by_id, driver.list_nodes, _node_is_done, timeout)
+    return _wait(poller, node_ids, 'Server', 'servers', _node_failure)
+
+
+def wait_for_vlans(client, vlan_ids, timeout=DEFAULT_TIMEOUT, network_domain=None):
+    driver = live_driver(client.node)
+    poller = Poller(driver.ex_get_vlan, lambda: driver.ex_list_vlans(network_domain=network_domain),
+                    _vlan_is_done, timeout)
+    return _wait(poller, vlan_ids, 'VLAN', 'VLANs', _vlan_failure)
+
+
+def _wait(poller, ids, noun, plural, failure):
+    if len(ids) == 1:
+        click.secho("Waiting for {0} {1}".format(noun, ids[0]))
+    else:
+        click.secho("Waiting for {0} {1}".format(len(ids), plural))
+    try:
+        done = poller.wait(ids)
+    except WaitTimeout as e:
+        click.secho("{0}".format(e), fg='red', bold=True)
+        sys.exit(1)
+    except DimensionDataAPIException as e:
+        handle_dd_api_exception(e)
+    failures = 0
+    for resource_id in done:
+        reason = failure(done[resource_id])
+        if reason:
+            failures += 1
+            click.secho("{0} {1} failed: {2}".format(noun, resource_id, reason), fg='red', bold=True)
+    if failures > 0:
+        sys.exit(1)
+    if len(ids) == 1:
+        click.secho("{0} {1} is ready".format(noun, ids[0]), fg='green', bold=True)
+    else:
+        click.secho("{0} {1} are ready".format(len(ids), plural), fg='green', bold=True)
+    return done
@@ -0,0 +1,71 @@
+from collections import namedtuple
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+ADDED = 'added'
+CHANGED = 'changed'
+REMOVED = 'removed'
+
+# Server list keys whose changes are reported, plus every Disk N ... key
+SERVER_WATCHED_FIELDS = ('State', 'started', 'CPU Count', 'Cores per Socket', 'CPU Performance', 'memoryMb')
+SERVER_WATCHED_PREFIXES = ('Disk ',)
+
+# One difference between two polls.  item is the new list item for added
+# resources and the last seen watched values for removed ones, changes is
+# an OrderedDict of field to (old, new) for changed ones.
+WatchEvent = namedtuple('WatchEvent', ['event', 'id', 'scope', 'item', 'changes'])
+
+
+class ChangeIndex(object):
+    """The watched values of the last seen list items, keyed by ID.
+
+    Each poll is diffed against the index with one dict lookup per item, so
+    a poll costs O(n) and only the differences are returned.  Items are
+    kept per scope (e.g. region) so a scope that could not be listed is
+    not mistaken for all of its items being removed.
+    """
+
+    def __init__(self, fields=SERVER_WATCHED_FIELDS, prefixes=SERVER_WATCHED_PREFIXES):
+        self.fields = fields
+        self.prefixes = prefixes
+        self._index = {}
+
+    def __len__(self):
+        return len(self._index)
+
+    def watched_values(self, item):
+        return OrderedDict((key, item[key]) for key in item
+                           if key in self.fields or key.startswith(self.prefixes))
+
+    def update(self, items, scope=None):
+        """Diff items, everything currently listed in scope, against the index and return the WatchEvents"""
+        events = []
+        seen = set()
+        for item in items:
+            item_id = item['ID']
+            seen.add(item_id)
+            values = self.watched_values(item)
+            previous = self._index.get(item_id)
+            self._index[item_id] = (scope, item.get('Name'), values)
+            if previous is None:
+                events.append(WatchEvent(ADDED, item_id, scope, item, None))
+                continue
+            changes = OrderedDict()
+            old_values = previous[2]
+            for key in values:
+                if old_values.get(key) != values[key]:
+                    changes[key] = (old_values.get(key), values[key])
+            for key in old_values:
+                if key not in values:
+                    changes[key] = (old_values[key], None)
+            if changes:
+                events.append(WatchEvent(CHANGED, item_id, scope, item, changes))
+        removed = [item_id for item_id in self._index if self._index[item_id][0] == scope and item_id not in seen]
+        for item_id in removed:
+            _, name, values = self._index.pop(item_id)
+            item = OrderedDict([('Name', name), ('ID', item_id)])
+            item.update(values)
+            events.append(WatchEvent(REMOVED, item_id, scope, item, None))
+        return events
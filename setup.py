@@ -24,7 +24,7 @@ requires = ['click',
 # python 2.7 hackery
 if sys.version_info <= (3, 0):
     requires.extend(
-        ["future"]
+        ["future", "futures"]
     )
 
 setup(
@@ -35,7 +35,7 @@ setup(
     url="https://www.dimensiondata.com/",
     name="didata_cli",
     version="0.2.4",
-    packages=find_packages(exclude=["contrib", "docs", "tests*", "tasks", "venv"]),
+    packages=find_packages(exclude=["contrib", "docs", "tests*", "benchmarks*", "tasks", "venv"]),
     install_requires=requires,
     setup_requires=[],
     classifiers=[
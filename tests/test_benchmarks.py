@@ -0,0 +1,63 @@
+from benchmarks import suite
+from didata_cli.commands.cmd_network import _firewall_rule_to_dict, _vlan_to_dict
+from didata_cli.commands.cmd_server import _node_to_dict
+from didata_cli.commands.cmd_tag import _tag_to_dict
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class BenchmarkSuiteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.baseline = os.path.join(self.folder, 'baseline.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_fixtures(self):
+        node = _node_to_dict(suite.synthetic_nodes(3)[1])
+        self.assertEqual(node['Name'], 'server-000001')
+        self.assertTrue('Disk 0 ID' in node and 'CPU Count' in node)
+        rule = _firewall_rule_to_dict(suite.synthetic_firewall_rules(2)[0])
+        self.assertTrue(rule['Source IP'] and rule['Action'])
+        vlan = _vlan_to_dict(suite.synthetic_vlans(2)[1])
+        self.assertTrue(vlan['Network Domain ID'])
+        tag = _tag_to_dict(suite.synthetic_tags(2)[0])
+        self.assertEqual(tag['Key Name'], 'role')
+
+    def test_every_benchmark_runs(self):
+        results = suite.run_suite(suite.BENCHMARKS, 100, 1)
+        self.assertEqual(len(results), len(suite.BENCHMARKS))
+        self.assertTrue('render[csv]@100' in results and 'cli server list@100' in results)
+        self.assertTrue(all(result['median'] >= result['min'] for result in results.values()))
+
+    def test_compare(self):
+        baseline = {'a@100': {'median': 0.1}, 'b@100': {'median': 0.1}, 'c@100': {'median': 0.0001}}
+        results = {'a@100': {'median': 0.2}, 'b@100': {'median': 0.12}, 'c@100': {'median': 0.001},
+                   'd@100': {'median': 5}}
+        self.assertEqual(suite.compare(results, baseline, 0.25), ['a@100'])
+        self.assertEqual(suite.compare(results, baseline, 0.1), ['a@100', 'b@100'])
+
+    def test_save_and_check(self):
+        args = ['--filter', '_tag_to_dict', '--scales', '100', '--repeat', '1', '--baseline', self.baseline]
+        self.assertEqual(suite.main(args + ['--check']), 1)
+        self.assertEqual(suite.main(args + ['--save']), 0)
+        with open(self.baseline) as baseline_file:
+            saved = json.load(baseline_file)
+        self.assertEqual(list(saved['results']), ['_tag_to_dict@100'])
+        self.assertEqual(saved['machine'], suite.machine())
+        self.assertEqual(suite.main(args + ['--check', '--threshold', '100']), 0)
+
+        # Saving other scales keeps the saved ones
+        self.assertEqual(suite.main(args[:2] + ['--scales', '1000'] + args[4:] + ['--save']), 0)
+        with open(self.baseline) as baseline_file:
+            saved = json.load(baseline_file)
+        self.assertEqual(sorted(saved['results']), ['_tag_to_dict@100', '_tag_to_dict@1000'])
+
+        saved['results']['_tag_to_dict@100']['median'] = -1.0
+        with open(self.baseline, 'w') as baseline_file:
+            json.dump(saved, baseline_file)
+        self.assertEqual(suite.main(args + ['--check']), 1)
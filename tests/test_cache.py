@@ -0,0 +1,106 @@
+from didata_cli.cache import ResponseCache, CachingDriver
+from didata_cli.cli import cli
+from click.testing import CliRunner
+from tests.utils import load_dd_obj
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest.mock import patch
+except:
+    from mock import patch
+
+
+class FakeNodeDriver(object):
+    calls = None
+
+    def __init__(self, *args, **kwargs):
+        self.connection = None
+        FakeNodeDriver.calls = []
+
+    def ex_list_vlans(self, location=None, network_domain=None):
+        FakeNodeDriver.calls.append('ex_list_vlans')
+        vlans = load_dd_obj('vlan_list.json')
+        for vlan in vlans:
+            vlan.location.driver = self
+        return vlans
+
+    def ex_create_vlan(self, *args):
+        FakeNodeDriver.calls.append('ex_create_vlan')
+        return load_dd_obj('vlan.json')
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ResponseCache(os.path.join(self.cache_dir, 'responses.sqlite'))
+        self.driver = FakeNodeDriver()
+        self.caching_driver = CachingDriver(self.driver, self.cache, ('fakeuser', 'dd-na'))
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_list_is_served_from_cache(self):
+        first = self.caching_driver.ex_list_vlans(location='NA9')
+        second = self.caching_driver.ex_list_vlans(location='NA9')
+        self.assertEqual(FakeNodeDriver.calls, ['ex_list_vlans'])
+        self.assertEqual([vlan.id for vlan in first], [vlan.id for vlan in second])
+        self.assertTrue(second[0].location.driver is self.driver)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_arguments_are_part_of_the_key(self):
+        self.caching_driver.ex_list_vlans(location='NA9')
+        self.caching_driver.ex_list_vlans(location='NA12')
+        self.assertEqual(FakeNodeDriver.calls, ['ex_list_vlans', 'ex_list_vlans'])
+
+    def test_mutating_call_invalidates(self):
+        self.caching_driver.ex_list_vlans()
+        self.caching_driver.ex_create_vlan('fakedomain', 'fakename', '10.0.0.0')
+        self.caching_driver.ex_list_vlans()
+        self.assertEqual(FakeNodeDriver.calls, ['ex_list_vlans', 'ex_create_vlan', 'ex_list_vlans'])
+
+    def test_refresh_skips_reading(self):
+        self.caching_driver.ex_list_vlans()
+        refreshing_driver = CachingDriver(self.driver, self.cache, ('fakeuser', 'dd-na'), refresh=True)
+        refreshing_driver.ex_list_vlans()
+        self.caching_driver.ex_list_vlans()
+        self.assertEqual(FakeNodeDriver.calls, ['ex_list_vlans', 'ex_list_vlans'])
+
+    def test_expired_entries_are_not_served(self):
+        with patch.dict('didata_cli.cache.RESOURCE_TTLS', {'vlan': -1}):
+            self.caching_driver.ex_list_vlans()
+            self.caching_driver.ex_list_vlans()
+        self.assertEqual(FakeNodeDriver.calls, ['ex_list_vlans', 'ex_list_vlans'])
+
+    def test_unpicklable_responses_are_not_cached(self):
+        key = self.cache.key(('fakeuser', 'dd-na'), 'ex_list_vlans', (), {})
+        self.cache.set(key, 'vlan', lambda: None, self.driver)
+        self.assertEqual(self.cache.get(key, self.driver), (None, False))
+
+
+@patch('didata_cli.cli.DimensionDataNodeDriver', FakeNodeDriver)
+class DimensionDataCLICacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.runner = CliRunner()
+        self.cache_dir = tempfile.mkdtemp()
+        os.environ["MCP_USER"] = 'fakeuser'
+        os.environ["MCP_PASSWORD"] = 'fakepass'
+        os.environ["MCP_REGION"] = 'dd-na'
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_cache_flags(self):
+        with patch('didata_cli.cache.CACHE_DIR', self.cache_dir):
+            result = self.runner.invoke(cli, ['--cache', 'network', 'list_vlans'])
+            self.assertEqual(result.exit_code, 0)
+            self.assertEqual(FakeNodeDriver.calls, ['ex_list_vlans'])
+            result = self.runner.invoke(cli, ['--cache', 'network', 'list_vlans'])
+            self.assertEqual(result.exit_code, 0)
+            self.assertEqual(FakeNodeDriver.calls, [])
+            self.assertTrue('ID: ' in result.output)
+            result = self.runner.invoke(cli, ['--refresh', 'network', 'list_vlans'])
+            self.assertEqual(FakeNodeDriver.calls, ['ex_list_vlans'])
+            result = self.runner.invoke(cli, ['--no-cache', 'network', 'list_vlans'])
+            self.assertEqual(FakeNodeDriver.calls, ['ex_list_vlans'])
@@ -0,0 +1,157 @@
+from didata_cli import cli as cli_module
+from didata_cli.cli import cli, DiDataCLIClient, load_command_manifest, parse_regions
+from click.testing import CliRunner
+import click
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+try:
+    from unittest.mock import MagicMock, patch
+except:
+    from mock import MagicMock, patch
+
+
+class DiDataCLIStartupTestCase(unittest.TestCase):
+    def test_help_lists_commands_from_manifest(self):
+        result = CliRunner().invoke(cli, ['--help'], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        for command in ('backup', 'network', 'server', 'tag'):
+            self.assertTrue(command in result.output)
+        manifest = load_command_manifest()
+        self.assertTrue(manifest is not None)
+        self.assertTrue('server' in manifest['commands'])
+
+    def test_manifest_is_stale_when_a_command_file_changes(self):
+        CliRunner().invoke(cli, ['--help'], catch_exceptions=False)
+        files = cli_module._command_files()
+        self.assertTrue(load_command_manifest() is not None)
+        files['server'] = [files['server'][0], files['server'][1] + 1]
+        with patch.object(cli_module, '_command_files', return_value=files):
+            self.assertTrue(load_command_manifest() is None)
+
+    def test_manifest_is_kept_in_didata_home(self):
+        folder = tempfile.mkdtemp()
+        try:
+            with patch.object(cli_module, 'DIDATA_HOME', os.path.join(folder, '.didata')):
+                path = cli_module.save_command_manifest(cli_module.build_command_manifest(cli._load_command))
+                self.assertEqual(os.path.dirname(path), os.path.join(folder, '.didata'))
+                self.assertTrue('shell' in load_command_manifest()['commands'])
+        finally:
+            shutil.rmtree(folder)
+        package_folder = os.path.dirname(cli_module.cmd_folder)
+        self.assertFalse([name for name in os.listdir(package_folder) if name.startswith('command_manifest')])
+
+    def test_manifest_short_help_from_docstring(self):
+        # click 7 leaves short_help None and works it out of the docstring in get_short_help_str
+        command = MagicMock(short_help=None)
+        command.get_short_help_str.return_value = 'Start an interactive shell'
+        manifest = cli_module.build_command_manifest(lambda name: command)
+        self.assertEqual(manifest['commands']['shell'], 'Start an interactive shell')
+
+    def test_help_does_not_import_libcloud_drivers(self):
+        # Make sure the manifest is built, building it has to import every command
+        CliRunner().invoke(cli, ['--help'], catch_exceptions=False)
+        code = ("import sys\n"
+                "from didata_cli.cli import cli\n"
+                "try:\n"
+                "    cli(['--help'])\n"
+                "except SystemExit:\n"
+                "    pass\n"
+                "loaded = [m for m in sys.modules if m.startswith('libcloud')]\n"
+                "sys.stderr.write(','.join(loaded))\n")
+        process = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _, loaded = process.communicate()
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(loaded.decode('utf-8'), '')
+
+    @patch('didata_cli.cli.DimensionDataBackupDriver')
+    @patch('didata_cli.cli.DimensionDataNodeDriver')
+    def test_drivers_are_built_on_first_use(self, node_driver, backup_driver):
+        client = DiDataCLIClient()
+        client.init_client('fakeuser', 'fakepass', 'dd-na')
+        self.assertFalse(node_driver.called)
+        self.assertFalse(backup_driver.called)
+        self.assertTrue(client.node is client.node)
+        node_driver.assert_called_once_with('fakeuser', 'fakepass', region='dd-na')
+        self.assertFalse(backup_driver.called)
+
+    def test_driver_classes_are_imported_lazily(self):
+        with patch.object(cli_module, 'DimensionDataNodeDriver', None):
+            driver_class = cli_module._node_driver_class()
+            self.assertEqual(driver_class.__name__, 'DimensionDataNodeDriver')
+
+
+class DiDataCLIClientConnectionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = DiDataCLIClient()
+        self.client.init_client('fakeuser', 'fakepass', 'dd-na', pool_size=4)
+
+    def _adapter(self, driver):
+        return driver.connection.connection.session.get_adapter('https://api-na.dimensiondata.com')
+
+    def test_drivers_share_one_pool(self):
+        node_adapter = self._adapter(self.client.node)
+        self.assertTrue(node_adapter is self._adapter(self.client.backup))
+        self.assertEqual(node_adapter._pool_maxsize, 4)
+
+    def test_sharing_keeps_connection_settings(self):
+        driver = cli_module._node_driver_class()('fakeuser', 'fakepass', region='dd-na')
+        http_connection = driver.connection.connection
+        http_connection.set_http_proxy('http://proxy.example.com:3128')
+        http_connection.ca_cert = '/etc/didata/ca-bundle.pem'
+        http_connection.session.cert = '/etc/didata/client.pem'
+        self.client._share_connection(driver, 'dd-na')
+        self.assertEqual(http_connection.session.proxies['https'], 'http://proxy.example.com:3128')
+        self.assertEqual(http_connection.verification, '/etc/didata/ca-bundle.pem')
+        self.assertEqual(http_connection.session.cert, '/etc/didata/client.pem')
+        self.assertTrue(self._adapter(driver) is self._adapter(self.client.node))
+
+    @patch('didata_cli.cli.DimensionDataNodeDriver')
+    def test_server_resolver_uses_thread_driver(self, node_driver):
+        import threading
+        node_driver.side_effect = lambda *args, **kwargs: MagicMock()
+        resolver = self.client.server_resolver
+        drivers = []
+        worker = threading.Thread(target=lambda: drivers.append((resolver._get_driver(), self.client.node)))
+        worker.start()
+        worker.join()
+        self.assertTrue(drivers[0][0] is drivers[0][1])
+        self.assertFalse(drivers[0][0] is resolver._get_driver())
+        self.assertTrue(self.client.node is resolver._get_driver())
+
+    def test_worker_threads_share_pool(self):
+        import threading
+        adapters = []
+        worker = threading.Thread(target=lambda: adapters.append(self._adapter(self.client.node)))
+        worker.start()
+        worker.join()
+        self.assertTrue(adapters[0] is self._adapter(self.client.node))
+
+    def test_org_id_is_shared(self):
+        self.client.node.connection._orgId = 'fakeorgid'
+        self.assertEqual(self.client.backup.connection._orgId, 'fakeorgid')
+
+    def test_org_id_is_not_shared_between_regions(self):
+        self.client.init_client('fakeuser', 'fakepass', 'dd-na,dd-eu')
+        self.client.node_for_region('dd-na').connection._orgId = 'fakeorgid'
+        self.assertFalse(self.client.node_for_region('dd-eu').connection._orgId == 'fakeorgid')
+
+
+class DiDataCLIClientRegionTestCase(unittest.TestCase):
+    def test_parse_regions(self):
+        self.assertEqual(parse_regions('dd-na'), ['dd-na'])
+        self.assertEqual(parse_regions('dd-na, dd-eu,dd-na'), ['dd-na', 'dd-eu'])
+        regions = parse_regions('all')
+        self.assertTrue('dd-na' in regions and 'dd-eu' in regions)
+        self.assertTrue(all(region.startswith('dd-') for region in regions))
+
+    @patch('didata_cli.cli.DimensionDataNodeDriver')
+    def test_node_needs_one_region(self, node_driver):
+        client = DiDataCLIClient()
+        client.init_client('fakeuser', 'fakepass', 'dd-na,dd-eu')
+        self.assertRaises(click.UsageError, getattr, client, 'node')
+        self.assertTrue(client.node_for_region('dd-eu') is client.node_for_region('dd-eu'))
+        node_driver.assert_called_once_with('fakeuser', 'fakepass', region='dd-eu')
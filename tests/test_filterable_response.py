@@ -0,0 +1,275 @@
+from didata_cli.filterable_response import CompactRow, DiDataCLIFilter, DiDataCLIFilterableResponse, VALID_PRINT_TYPES
+from didata_cli.query import DiDataCLIQueryError
+import json
+import os
+import sys
+import time
+import unittest
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+try:
+    from unittest.mock import patch
+except:
+    from mock import patch
+
+
+def _make_items(count):
+    items = []
+    for index in range(count):
+        item = OrderedDict()
+        item['Name'] = 'server{0}'.format(index)
+        item['ID'] = 'id-{0}'.format(index)
+        item['State'] = 'running'
+        items.append(item)
+    return items
+
+
+class DiDataCLIFilterableResponseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.response = DiDataCLIFilterableResponse()
+        for item in _make_items(3):
+            self.response.add(item)
+
+    def test_stream_matches_to_string(self):
+        for print_type in ('pretty', 'idsonly', 'ndjson', 'csv', 'tsv'):
+            streamed = "\n".join(self.response.stream(iter(_make_items(3)), print_type))
+            self.assertEqual(streamed, self.response.to_string(print_type))
+
+    def test_stream_is_lazy(self):
+        def items():
+            for item in _make_items(2):
+                yield item
+            raise AssertionError("Read past ReturnCount")
+        lines = list(self.response.stream(items(), 'idsonly', 'ReturnCount:2'))
+        self.assertEqual(lines, ['id-0', 'id-1'])
+
+    def test_stream_return_keys(self):
+        lines = list(self.response.stream(iter(_make_items(2)), 'csv', 'ReturnKeys:ID,State'))
+        self.assertEqual(lines, ['ID,State', 'id-0,running', 'id-1,running'])
+
+    def test_stream_unstreamable_print_type(self):
+        self.assertRaises(ValueError, self.response.stream, iter([]), 'grid')
+
+    def test_tabulate_values(self):
+        lines = self.response.to_string('simple').splitlines()
+        self.assertEqual(lines[0].split(), ['Name', 'ID', 'State'])
+        self.assertEqual([line.split() for line in lines[2:]],
+                         [['server0', 'id-0', 'running'], ['server1', 'id-1', 'running'],
+                          ['server2', 'id-2', 'running']])
+        # Older tabulate versions only read the keys of dicts
+        with patch('didata_cli.filterable_response.tabulate', return_value='') as tabulate:
+            self.response.to_string('grid')
+        self.assertTrue(all(type(row) is OrderedDict for row in tabulate.call_args[0][0]))
+
+    def test_ndjson(self):
+        lines = self.response.to_string('ndjson').splitlines()
+        self.assertEqual([json.loads(line)['ID'] for line in lines], ['id-0', 'id-1', 'id-2'])
+
+    def test_delimited_uses_every_key(self):
+        item = OrderedDict([('ID', 'id-3'), ('Disk 0 Size', 10)])
+        self.response.add(item)
+        lines = self.response.to_string('tsv').splitlines()
+        self.assertEqual(lines[0], 'Name\tID\tState\tDisk 0 Size')
+        self.assertEqual(lines[-1], '\tid-3\t\t10')
+
+
+class DiDataCLIFilterWhereTestCase(unittest.TestCase):
+    def setUp(self):
+        self.items = [
+            OrderedDict([('ID', 'id-0'), ('Name', 'web-0'), ('State', 'running'), ('CPU Count', 2),
+                         ('Disk 0 Size', '50'), ('Started', True)]),
+            OrderedDict([('ID', 'id-1'), ('Name', 'web-1'), ('State', 'stopped'), ('CPU Count', 4),
+                         ('Disk 0 Size', '100'), ('Started', False)]),
+            OrderedDict([('ID', 'id-2'), ('Name', 'db|0'), ('State', 'running'), ('CPU Count', 8),
+                         ('Disk 0 Size', '500'), ('Started', True)])
+        ]
+
+    def _ids(self, filter_string):
+        return [item['ID'] for item in DiDataCLIFilter(filter_string).apply(iter(self.items))]
+
+    def test_where_comparisons(self):
+        self.assertEqual(self._ids("Where:State == 'running'"), ['id-0', 'id-2'])
+        self.assertEqual(self._ids("Where:State != 'running'"), ['id-1'])
+        self.assertEqual(self._ids("Where:[CPU Count] >= 4"), ['id-1', 'id-2'])
+        self.assertEqual(self._ids("Where:[Disk 0 Size] > 60"), ['id-1', 'id-2'])
+        self.assertEqual(self._ids("Where:Started == false"), ['id-1'])
+        self.assertEqual(self._ids("Where:Missing == null"), ['id-0', 'id-1', 'id-2'])
+        self.assertEqual(self._ids("Where:Missing > 1"), [])
+
+    def test_where_regex_and_in(self):
+        self.assertEqual(self._ids("Where:Name =~ '^web-'"), ['id-0', 'id-1'])
+        self.assertEqual(self._ids("Where:Name !~ '^web-'"), ['id-2'])
+        self.assertEqual(self._ids("Where:[CPU Count] in (2, 8)"), ['id-0', 'id-2'])
+        self.assertEqual(self._ids("Where:State not in ('running')"), ['id-1'])
+
+    def test_where_boolean_logic(self):
+        self.assertEqual(self._ids("Where:State == 'running' and [CPU Count] > 2"), ['id-2'])
+        self.assertEqual(self._ids("Where:not (State == 'running' or Name == 'web-1')"), [])
+        self.assertEqual(self._ids("Where:State == 'stopped' or [CPU Count] == 2 and Started"), ['id-0', 'id-1'])
+
+    def test_where_then_count_then_keys(self):
+        filtered = list(DiDataCLIFilter("ReturnKeys:Name|ReturnCount:1|Where:[CPU Count] > 2").apply(self.items))
+        self.assertEqual(filtered, [OrderedDict([('Name', 'web-1')])])
+
+    def test_pipe_inside_quotes(self):
+        self.assertEqual(self._ids("Where:Name == 'db|0'|ReturnKeys:ID"), ['id-2'])
+
+    def test_do_filter_where(self):
+        response = DiDataCLIFilterableResponse()
+        for item in self.items:
+            response.add(item)
+        response.do_filter("Where:State == 'running'|ReturnKeys:ID")
+        self.assertEqual(response.to_string('idsonly'), "id-0\nid-2")
+
+    def test_push_down(self):
+        cli_filter = DiDataCLIFilter("Where:Name == 'web-1' and [CPU Count] > 2 and 'NA9' == datacenterId")
+        self.assertEqual(cli_filter.push_down(['Name', 'datacenterId']),
+                         OrderedDict([('Name', 'web-1'), ('datacenterId', 'NA9')]))
+        self.assertEqual([item['ID'] for item in cli_filter.apply(self.items)], ['id-1', 'id-2'])
+
+    def test_push_down_leaves_or(self):
+        cli_filter = DiDataCLIFilter("Where:Name == 'web-1' or Name == 'web-0'")
+        self.assertEqual(cli_filter.push_down(['Name']), OrderedDict())
+        self.assertEqual([item['ID'] for item in cli_filter.apply(self.items)], ['id-0', 'id-1'])
+
+    def test_needed_keys(self):
+        self.assertEqual(DiDataCLIFilter("ReturnCount:2").needed_keys(), None)
+        self.assertEqual(DiDataCLIFilter("Where:State == 'running'").needed_keys(), None)
+        cli_filter = DiDataCLIFilter("Where:Name == 'web-1' and [CPU Count] > 2|ReturnKeys:ID")
+        self.assertEqual(cli_filter.needed_keys(), set(['ID', 'Name', 'CPU Count']))
+        # Pushed down tests are done by the API, their keys aren't needed
+        cli_filter.push_down(['Name'])
+        self.assertEqual(cli_filter.needed_keys(), set(['ID', 'CPU Count']))
+
+    def test_invalid_where(self):
+        for filter_string in ("Where:State ==", "Where:(State == 'running'", "Where:Name =~ '('",
+                              "Where:State = running extra", "ReturnCount:five", "Where"):
+            self.assertRaises(DiDataCLIQueryError, DiDataCLIFilter, filter_string)
+
+
+def _make_node_dicts(count, keys_per_node=40):
+    items = []
+    for index in range(count):
+        item = OrderedDict()
+        item['Name'] = 'server{0}'.format(index)
+        item['ID'] = '{0:08d}-43a1-4b56-b751-4107b5671713'.format(index)
+        item['State'] = 'running'
+        item['CPU Count'] = 2
+        for key_index in range(keys_per_node - len(item)):
+            item['Key {0}'.format(key_index)] = 'value {0} {1}'.format(index, key_index)
+        items.append(item)
+    return items
+
+
+def _render_seconds(items, print_type, repeat=3):
+    response = DiDataCLIFilterableResponse()
+    for item in items:
+        response.add(item)
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        response.to_string(print_type)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class RenderIdsOnlyTestCase(unittest.TestCase):
+    def test_idsonly_keeps_whole_ids(self):
+        response = DiDataCLIFilterableResponse()
+        for item in _make_node_dicts(2):
+            response.add(item)
+        self.assertEqual(response.to_string('idsonly').splitlines(),
+                         ['00000000-43a1-4b56-b751-4107b5671713', '00000001-43a1-4b56-b751-4107b5671713'])
+
+
+@unittest.skipUnless(os.environ.get('DIDATA_BENCHMARK'), "set DIDATA_BENCHMARK=1 to run the render benchmark")
+class RenderBenchmarkTestCase(unittest.TestCase):
+    """Renders BENCHMARK_ROWS synthetic node dicts in every print type.
+
+    Each print type has to stay under SECONDS_PER_1000_ROWS, the tabulate
+    based types get a much larger budget than the ones rendered by hand.
+    """
+    BENCHMARK_ROWS = int(os.environ.get('DIDATA_BENCHMARK_ROWS', 10000))
+    SECONDS_PER_1000_ROWS = {
+        'pretty': 0.1,
+        'idsonly': 0.05,
+        'json': 0.5,
+        'ndjson': 0.2,
+        'csv': 0.2,
+        'tsv': 0.2
+    }
+    TABULATE_SECONDS_PER_1000_ROWS = 2.0
+
+    def test_render_every_print_type(self):
+        items = _make_node_dicts(self.BENCHMARK_ROWS)
+        for print_type in VALID_PRINT_TYPES:
+            seconds = _render_seconds(items, print_type, repeat=1)
+            budget = self.SECONDS_PER_1000_ROWS.get(print_type, self.TABULATE_SECONDS_PER_1000_ROWS)
+            budget = budget * self.BENCHMARK_ROWS / 1000.0
+            sys.stderr.write("{0:<16} {1:8.3f}s for {2} rows\n".format(print_type, seconds, self.BENCHMARK_ROWS))
+            self.assertTrue(seconds < budget, "{0} took {1:.2f}s, budget {2:.2f}s".format(print_type, seconds, budget))
+
+    def test_pretty_and_idsonly_scale_linearly(self):
+        small = _make_node_dicts(2500)
+        large = _make_node_dicts(10000)
+        for print_type in ('pretty', 'idsonly'):
+            ratio = _render_seconds(large, print_type) / max(_render_seconds(small, print_type), 1e-6)
+            # 4 times the rows, a quadratic renderer would take ~16 times longer
+            self.assertTrue(ratio < 10, "{0} took {1:.1f}x longer for 4x the rows".format(print_type, ratio))
+
+
+class CompactRowTestCase(unittest.TestCase):
+    def test_rows_share_schemas(self):
+        response = DiDataCLIFilterableResponse()
+        for item in _make_node_dicts(3, keys_per_node=6):
+            response.add(item)
+        response.add(OrderedDict([('ID', 'other'), ('Name', 'x')]))
+        rows = response._list
+        self.assertTrue(all(isinstance(row, CompactRow) for row in rows))
+        self.assertTrue(rows[0]._schema is rows[2]._schema)
+        self.assertFalse(rows[0]._schema is rows[3]._schema)
+        self.assertEqual(rows[3], OrderedDict([('ID', 'other'), ('Name', 'x')]))
+        self.assertEqual(list(rows[0])[:2], ['Name', 'ID'])
+        self.assertEqual(rows[3].get('State', 'none'), 'none')
+        self.assertTrue('ID' in rows[3])
+        self.assertEqual(json.loads(response.to_string('ndjson').splitlines()[3]), {'ID': 'other', 'Name': 'x'})
+
+    def test_do_filter_keeps_rows_compact(self):
+        response = DiDataCLIFilterableResponse()
+        for item in _make_node_dicts(10, keys_per_node=6):
+            response.add(item)
+        response.do_filter("Where:Name =~ 'server[12]'|ReturnKeys:Name,State")
+        self.assertEqual([list(row.items()) for row in response._list],
+                         [[('Name', 'server1'), ('State', 'running')], [('Name', 'server2'), ('State', 'running')]])
+        self.assertTrue(response._list[0]._schema is response._list[1]._schema)
+        self.assertEqual(json.loads(response.to_string('json')), [{'Name': 'server1', 'State': 'running'},
+                                                                  {'Name': 'server2', 'State': 'running'}])
+
+    @unittest.skipIf(tracemalloc is None, "tracemalloc is not available")
+    def test_rows_take_less_memory_than_dicts(self):
+        items = _make_node_dicts(2000)
+
+        def traced_size(build):
+            tracemalloc.start()
+            try:
+                kept = build()
+                return tracemalloc.get_traced_memory()[0], kept
+            finally:
+                tracemalloc.stop()
+
+        def build_response():
+            response = DiDataCLIFilterableResponse()
+            for item in items:
+                response.add(item)
+            return response
+
+        dicts_size, _ = traced_size(lambda: [OrderedDict(item) for item in items])
+        rows_size, _ = traced_size(build_response)
+        self.assertTrue(rows_size < dicts_size / 2, (rows_size, dicts_size))
@@ -5,7 +5,9 @@ try:
     from unittest.mock import patch
 except:
     from mock import patch
+import json
 import os
+from tests.utils import load_dd_obj
 
 
 @patch('didata_cli.cli.DimensionDataNodeDriver')
@@ -18,3 +20,19 @@ class DimensionDataCLITestCase(unittest.TestCase):
     def test_image_help(self, node_client):
         result = self.runner.invoke(cli, ['image'], catch_exceptions=False)
         assert result.exit_code == 0
+
+    def test_list_base_images(self, node_client):
+        node_client.return_value.list_images.return_value = load_dd_obj('image_list.json')[:1]
+        result = self.runner.invoke(cli, ['image', 'list_base_images', '--query', "ReturnKeys:ID,Name"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, 'Name: RedHat 7 64-bit 2 CPU\nID: 294cad61-0857-4124-8ff6-45f4e6643646\n')
+
+    def test_list_base_images_many_regions(self, node_client):
+        node_client.return_value.list_images.return_value = load_dd_obj('image_list.json')[:1]
+        result = self.runner.invoke(cli, ['--region', 'dd-na,dd-eu', '--output-type', 'json',
+                                          'image', 'list_base_images'])
+        self.assertEqual(result.exit_code, 0)
+        images = json.loads(result.output)
+        self.assertEqual([image['Region'] for image in images], ['dd-na', 'dd-eu'])
+        self.assertEqual(list(images[0])[:2], ['Region', 'Name'])
+        self.assertEqual(sorted(call[1]['region'] for call in node_client.call_args_list), ['dd-eu', 'dd-na'])
@@ -0,0 +1,188 @@
+from didata_cli.cli import cli
+from didata_cli.inventory import ADDED, CHANGED, REMOVED, Inventory, InventoryRecord
+from click.testing import CliRunner
+import json
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+try:
+    from unittest.mock import patch
+except:
+    from mock import patch
+from tests.utils import load_dd_obj
+
+
+@patch('didata_cli.cli.DimensionDataNodeDriver')
+class DimensionDataCLIInventoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.runner = CliRunner()
+        os.environ["MCP_USER"] = 'fakeuser'
+        os.environ["MCP_PASSWORD"] = 'fakepass'
+        os.environ["MCP_REGION"] = 'dd-na'
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'inventory.sqlite')
+        self.nodes = load_dd_obj('node_list.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _sync(self, node_client, firewall_rules=None, tag_key_name=None):
+        driver = node_client.return_value
+        driver.list_nodes.return_value = self.nodes
+        driver.ex_list_vlans.return_value = load_dd_obj('vlan_list.json')
+        driver.ex_list_network_domains.return_value = load_dd_obj('network_domain_list.json')[:2]
+        driver.ex_list_firewall_rules.return_value = firewall_rules or load_dd_obj('firewall_rule_list.json')[:1]
+        driver.ex_list_public_ip_blocks.return_value = []
+        tags = load_dd_obj('tags.json')
+        tags[0].asset_id = '058f23e4-17bc-4ee8-89c1-8e63e8f53786'
+        if tag_key_name:
+            tags[0].key.name = tag_key_name
+        driver.ex_list_tags.return_value = tags
+        driver.ex_list_tag_keys.return_value = load_dd_obj('tag_keys.json')
+        result = self.runner.invoke(cli, ['--output-type', 'json', 'inventory', 'sync', '--file', self.path])
+        self.assertEqual(result.exit_code, 0)
+        return json.loads(result.output)
+
+    def _query(self, *args):
+        result = self.runner.invoke(cli, ['inventory', 'query'] + list(args) + ['--file', self.path, '--query',
+                                                                                 'ReturnKeys:ID'])
+        return [line[4:] for line in result.output.splitlines() if line.startswith('ID: ')]
+
+    def test_sync(self, node_client):
+        synced = self._sync(node_client)
+        counts = dict((row['Type'], row['Count']) for row in synced)
+        self.assertEqual(synced[0]['Added'], synced[0]['Count'])
+        self.assertEqual(counts['servers'], 2)
+        self.assertEqual(counts['vlans'], 44)
+        self.assertEqual(counts['network_domains'], 2)
+        self.assertEqual(counts['firewall_rules'], 2)
+        self.assertEqual(counts['public_ip_blocks'], 0)
+        self.assertEqual(counts['tag_keys'], 4)
+        # Every network domain's firewall rules are listed
+        self.assertEqual(node_client.return_value.ex_list_firewall_rules.call_count, 2)
+
+    def test_query_lookups(self, node_client):
+        self._sync(node_client)
+        node_client.reset_mock()
+        self.assertEqual(self._query('servers'), [node.id for node in self.nodes])
+        self.assertEqual(self._query('servers', '--name', 'suseproxy'), [self.nodes[1].id])
+        self.assertEqual(self._query('servers', '--ip', '172.16.2.8'), [self.nodes[0].id])
+        self.assertEqual(self._query('servers', '--ip', '2607:f480:111:1414:67cf:d03d:5ecd:71e2'), [self.nodes[0].id])
+        self.assertEqual(self._query('servers', '--tag', 'ChangeNameTest=No way!'), [self.nodes[1].id])
+        self.assertEqual(self._query('servers', '--tag', 'ChangeNameTest=Yes'), [])
+        self.assertEqual(self._query('vlans', '--id', '56389c71-cc03-4e7a-a72f-cc219f0649c8'),
+                         ['56389c71-cc03-4e7a-a72f-cc219f0649c8'])
+        # No API calls are made to answer a query
+        self.assertFalse(node_client.called)
+
+    def test_query_where_uses_index(self, node_client):
+        self._sync(node_client)
+        with patch.object(Inventory, 'query', wraps=Inventory(self.path).query) as inventory_query:
+            result = self.runner.invoke(cli, ['inventory', 'query', 'servers', '--file', self.path, '--query',
+                                              "Where:Name == 'Don' and State != 'nope'|ReturnKeys:ID"])
+        self.assertEqual(result.output, 'ID: {0}\n'.format(self.nodes[0].id))
+        self.assertEqual(inventory_query.call_args[1]['name'], 'Don')
+
+    def _where(self, resource_type, where):
+        result = self.runner.invoke(cli, ['inventory', 'query', resource_type, '--file', self.path, '--query',
+                                          'Where:{0}|ReturnKeys:ID'.format(where)])
+        return [line[4:] for line in result.output.splitlines() if line.startswith('ID: ')]
+
+    def test_query_where_ip_column(self, node_client):
+        rules = load_dd_obj('firewall_rule_list.json')[:1]
+        rules[0].destination.ip_address = '10.0.0.5'
+        self._sync(node_client, rules)
+        # Only the destination has that address, the ip index matches either
+        self.assertEqual(self._where('firewall_rules', "[Source IP] == '10.0.0.5/32'"), [])
+        self.assertEqual(set(self._where('firewall_rules', "[Destination IP] == '10.0.0.5/32'")), set([rules[0].id]))
+
+    def test_query_where_two_ip_columns(self, node_client):
+        self._sync(node_client)
+        # The first server has the IPv6 address, the second the IPv4 one
+        self.assertEqual(self._where('servers', "[Private IPv4 0] == '172.16.2.9' and "
+                                                "ipv6 == '2607:f480:111:1414:67cf:d03d:5ecd:71e2'"), [])
+        self.assertEqual(self._where('servers', "[Private IPv4 0] == '172.16.2.8' and "
+                                                "ipv6 == '2607:f480:111:1414:67cf:d03d:5ecd:71e2'"), [self.nodes[0].id])
+
+    def test_sync_renamed_tag_key(self, node_client):
+        self._sync(node_client)
+        synced = self._sync(node_client, tag_key_name='RenamedTest')
+        self.assertEqual(dict((row['Type'], row['Changed']) for row in synced)['tags'], 1)
+        self.assertEqual(self._query('servers', '--tag', 'ChangeNameTest'), [])
+        self.assertEqual(self._query('servers', '--tag', 'RenamedTest=No way!'), [self.nodes[1].id])
+
+    def test_sync_replaces(self, node_client):
+        self._sync(node_client)
+        self.nodes = self.nodes[:1]
+        self._sync(node_client)
+        self.assertEqual(self._query('servers'), [self.nodes[0].id])
+
+    def test_sync_changes_only(self, node_client):
+        self._sync(node_client)
+        result = self.runner.invoke(cli, ['inventory', 'sync', '--type', 'servers', '--changes-only',
+                                          '--file', self.path])
+        self.assertEqual(result.output, 'No changes since the last sync\n')
+
+        removed = self.nodes.pop()
+        self.nodes[0].state = 'stopped'
+        node_client.return_value.list_nodes.return_value = self.nodes
+        result = self.runner.invoke(cli, ['--output-type', 'ndjson', 'inventory', 'sync', '--type', 'servers',
+                                          '--changes-only', '--file', self.path])
+        self.assertEqual(result.exit_code, 0)
+        changes = [json.loads(line) for line in result.output.splitlines()]
+        self.assertEqual([(change['Change'], change['ID']) for change in changes],
+                         [('changed', self.nodes[0].id), ('removed', removed.id)])
+        self.assertEqual(changes[0]['Record']['State'], 'stopped')
+        self.assertEqual(changes[1]['Record']['Name'], 'suseproxy')
+        self.assertEqual(self._query('servers', '--ip', '172.16.2.9'), [])
+
+    def test_query_without_inventory(self, node_client):
+        result = self.runner.invoke(cli, ['inventory', 'query', 'servers', '--file', self.path])
+        self.assertEqual(result.exit_code, 1)
+        self.assertTrue('run didata inventory sync first' in result.output)
+
+    def test_status(self, node_client):
+        self._sync(node_client)
+        result = self.runner.invoke(cli, ['--output-type', 'json', 'inventory', 'status', '--file', self.path])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(len(json.loads(result.output)), 7)
+
+
+class InventoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.inventory = Inventory(os.path.join(self.folder, 'inventory.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _record(self, resource_id, name, value):
+        return InventoryRecord(resource_id, 'NA9', OrderedDict([('ID', resource_id), ('Name', name),
+                                                                 ('Value', value)]))
+
+    def test_sync_only_reports_differences(self):
+        records = [self._record('a', 'one', 1), self._record('b', 'two', 2)]
+        self.assertEqual([change.change for change in self.inventory.sync('dd-na', 'tag_keys', records)],
+                         [ADDED, ADDED])
+        self.assertEqual(self.inventory.sync('dd-na', 'tag_keys', records), [])
+        # The key order of a record does not change its fingerprint
+        records[0] = InventoryRecord('a', 'NA9', OrderedDict(reversed(list(records[0].record.items()))))
+        self.assertEqual(self.inventory.sync('dd-na', 'tag_keys', records), [])
+
+        records = [self._record('c', 'three', 3), self._record('b', 'two', 20)]
+        changes = self.inventory.sync('dd-na', 'tag_keys', records)
+        self.assertEqual([(change.change, change.id) for change in changes],
+                         [(ADDED, 'c'), (CHANGED, 'b'), (REMOVED, 'a')])
+        self.assertEqual(changes[2].record['Name'], 'one')
+        # Changed records keep their place, new ones go last
+        self.assertEqual([record['ID'] for _, record in self.inventory.query('tag_keys', ['dd-na'])], ['b', 'c'])
+        self.assertEqual([record['Value'] for _, record in self.inventory.query('tag_keys', ['dd-na'], name='two')],
+                         [20])
+        # Other regions are left alone
+        self.assertEqual(self.inventory.sync('dd-eu', 'tag_keys', []), [])
+        self.assertEqual(len(list(self.inventory.query('tag_keys', ['dd-na']))), 2)
@@ -0,0 +1,190 @@
+from didata_cli.cli import cli
+from didata_cli.filterable_response import RENDER_HOOKS, DiDataCLIFilterableResponse
+from didata_cli.metrics import RunMetrics, read_textfile, write_textfile
+from didata_cli.trace import Tracer
+from click.testing import CliRunner
+from tests.test_trace import FakeClock, FakeDriver, FakeResponse
+from tests.utils import load_dd_obj
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+try:
+    from unittest.mock import patch
+except:
+    from mock import patch
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FakeRetry(object):
+    # Tries again once on IOError, like libcloud's Retry does on connection errors
+    def __init__(self, retry_delay=None, timeout=None, backoff=None):
+        pass
+
+    def __call__(self, function):
+        def retried(*args, **kwargs):
+            try:
+                return function(*args, **kwargs)
+            except IOError:
+                return function(*args, **kwargs)
+        return retried
+
+
+class RetryingConnection(object):
+    # Every other attempt fails, requests go through retryCls like with LIBCLOUD_RETRY_FAILED_HTTP_REQUESTS
+    retryCls = FakeRetry
+
+    def __init__(self):
+        self.attempts = 0
+
+    def request(self, action, params=None, method='GET'):
+        retry = self.retryCls(retry_delay=0, timeout=1, backoff=1)
+        return retry(self._retryable_request)(url=action, data=None, headers={}, method=method, raw=False,
+                                              stream=False)
+
+    def _retryable_request(self, url, data, headers, method, raw, stream):
+        self.attempts += 1
+        if self.attempts % 2:
+            raise IOError('reset')
+        return FakeResponse('x' * 10)
+
+
+class FakeCache(object):
+    hits = 3
+    misses = 1
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'didata.prom')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_samples(self):
+        tracer = Tracer(clock=self.clock.time)
+        driver = FakeDriver(self.clock)
+        tracer.instrument_connection(driver.connection)
+        traced = tracer.wrap_driver(driver, 'node', 'dd-na')
+        metrics = RunMetrics('server list', clock=self.clock.time)
+        traced.list_nodes()
+        self.assertRaises(ValueError, traced.create_node, 'web', 'image')
+        metrics.observe_render(2, 100)
+        samples = metrics.samples(0, tracer, FakeCache())
+        labels = 'command="server list",method="node.list_nodes"'
+        self.assertEqual(samples['didata_runs_total{command="server list",result="success"}'], 1)
+        self.assertEqual(samples['didata_api_calls_total{' + labels + '}'], 1)
+        self.assertEqual(samples['didata_api_call_duration_seconds_bucket{' + labels + ',le="0.5"}'], 1)
+        self.assertEqual(samples['didata_api_call_duration_seconds_bucket{' + labels + ',le="0.25"}'], 0)
+        self.assertEqual(samples['didata_api_call_duration_seconds_sum{' + labels + '}'], 0.5)
+        self.assertEqual(
+            samples['didata_api_errors_total{command="server list",method="node.create_node"}'], 1)
+        self.assertEqual(samples['didata_http_received_bytes_total{command="server list"}'], 2048)
+        self.assertEqual(samples['didata_cache_hits_total{command="server list"}'], 3)
+        self.assertEqual(samples['didata_rows_rendered_total{command="server list"}'], 2)
+        self.assertEqual(samples['didata_output_bytes_total{command="server list"}'], 100)
+
+    def test_retries(self):
+        tracer = Tracer(clock=self.clock.time)
+        connection = RetryingConnection()
+        tracer.instrument_connection(connection)
+        connection.request('server/server')
+        connection.request('server/server')
+        self.assertEqual(tracer.retries, 2)
+        # Every attempt is a round trip, the failed ones have no status
+        self.assertEqual([request[6] for request in tracer.requests], [None, 200, None, 200])
+
+    def test_textfile_adds_counters_and_replaces_gauges(self):
+        first = OrderedDict([('didata_runs_total{command="x",result="success"}', 1),
+                             ('didata_last_run_exit_code{command="x"}', 1),
+                             ('didata_run_duration_seconds_sum{command="x"}', 0.25)])
+        write_textfile(self.path, first)
+        second = OrderedDict([('didata_runs_total{command="x",result="success"}', 1),
+                              ('didata_last_run_exit_code{command="x"}', 0),
+                              ('didata_run_duration_seconds_sum{command="x"}', 0.5)])
+        write_textfile(self.path, second)
+        samples = read_textfile(self.path)
+        self.assertEqual(samples['didata_runs_total{command="x",result="success"}'], 2)
+        self.assertEqual(samples['didata_last_run_exit_code{command="x"}'], 0)
+        self.assertEqual(samples['didata_run_duration_seconds_sum{command="x"}'], 0.75)
+        with open(self.path) as textfile:
+            text = textfile.read()
+        self.assertTrue('# TYPE didata_runs_total counter\n' in text)
+        self.assertTrue('# TYPE didata_run_duration_seconds histogram\n' in text)
+        # node_exporter only reads *.prom files, the lock file is left alone
+        self.assertEqual(sorted(os.listdir(self.folder)), ['didata.prom', 'didata.prom.lock'])
+
+    @unittest.skipIf(fcntl is None, "fcntl is not available")
+    def test_textfile_concurrent_writers(self):
+        name = 'didata_runs_total{command="x",result="success"}'
+
+        def write_runs():
+            for _ in range(25):
+                write_textfile(self.path, OrderedDict([(name, 1)]))
+        writers = [threading.Thread(target=write_runs) for _ in range(8)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        self.assertEqual(read_textfile(self.path)[name], 200)
+
+    def test_render_hooks(self):
+        rendered = []
+        RENDER_HOOKS.append(lambda rows, output_bytes: rendered.append((rows, output_bytes)))
+        try:
+            response = DiDataCLIFilterableResponse()
+            response.add(OrderedDict([('ID', 'a')]))
+            response.add(OrderedDict([('ID', 'b')]))
+            response.to_string('idsonly')
+            list(response.stream(iter(response._list), 'idsonly'))
+        finally:
+            del RENDER_HOOKS[:]
+        self.assertEqual(rendered, [(2, 3), (2, 4)])
+
+
+@patch('didata_cli.cli.DimensionDataNodeDriver')
+class DimensionDataCLIMetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.runner = CliRunner()
+        os.environ["MCP_USER"] = 'fakeuser'
+        os.environ["MCP_PASSWORD"] = 'fakepass'
+        os.environ["MCP_REGION"] = 'dd-na'
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'didata.prom')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_metrics_file(self, node_client):
+        node_client.return_value.list_nodes.return_value = load_dd_obj('node_list.json')
+        for _ in range(2):
+            result = self.runner.invoke(cli, ['--metrics-file', self.path, 'server', 'list', '--idsonly'])
+            self.assertEqual(result.exit_code, 0)
+        samples = read_textfile(self.path)
+        self.assertEqual(samples['didata_runs_total{command="server list",result="success"}'], 2)
+        self.assertEqual(
+            samples['didata_api_calls_total{command="server list",method="node.list_nodes"}'], 2)
+        self.assertEqual(samples['didata_rows_rendered_total{command="server list"}'], 4)
+        # All of the output but the newline click.echo adds
+        self.assertEqual(samples['didata_output_bytes_total{command="server list"}'],
+                         2 * (len(result.output.encode('utf-8')) - 1))
+        self.assertEqual(RENDER_HOOKS, [])
+
+    def test_metrics_file_records_failure(self, node_client):
+        node_client.return_value.ex_get_node_by_id.side_effect = ValueError('nope')
+        self.runner.invoke(cli, ['--metrics-file', self.path, 'server', 'info', '--serverId', 'x'])
+        samples = read_textfile(self.path)
+        self.assertEqual(samples['didata_runs_total{command="server info",result="failure"}'], 1)
+        self.assertEqual(samples['didata_last_run_exit_code{command="server info"}'], 1)
+        self.assertEqual(
+            samples['didata_api_errors_total{command="server info",method="node.ex_get_node_by_id"}'], 1)
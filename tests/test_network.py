@@ -5,6 +5,7 @@ try:
     from unittest.mock import patch
 except:
     from mock import patch
+import json
 import os
 from tests.utils import load_dd_obj
 from libcloud.common.dimensiondata import DimensionDataAPIException
@@ -34,6 +35,17 @@ class DimensionDataCLITestCase(unittest.TestCase):
         self.assertTrue('ID: 56389c71-cc03-4e7a-a72f-cc219f0649c8' in result.output)
         self.assertEqual(result.exit_code, 0)
 
+    def test_vlan_list_many_datacenters(self, node_client):
+        vlans = load_dd_obj('vlan_list.json')
+        node_client.return_value.ex_list_vlans.return_value = vlans
+        result = self.runner.invoke(cli, ['--output-type', 'json', 'network', 'list_vlans',
+                                          '--datacenterId', 'NA9,NA12,NA9'])
+        self.assertEqual(result.exit_code, 0)
+        locations = sorted(call[1]['location'] for call in node_client.return_value.ex_list_vlans.call_args_list)
+        self.assertEqual(locations, ['NA12', 'NA9'])
+        # Both datacenters returned the same vlans, they are only listed once
+        self.assertEqual([vlan['ID'] for vlan in json.loads(result.output)], [vlan.id for vlan in vlans])
+
     def test_vlan_list_APIException(self, node_client):
         node_client.return_value.ex_list_vlans.side_effect = DimensionDataAPIException(
             code='REASON 541', msg='Unable to list vlans', driver=None)
@@ -50,6 +62,21 @@ class DimensionDataCLITestCase(unittest.TestCase):
         self.assertTrue('eee454f4-562a-4b23-ad57-4cb8b034c8c9' in result.output)
         self.assertEqual(result.exit_code, 0)
 
+    @patch('didata_cli.wait.time.sleep')
+    def test_create_vlan_wait(self, sleep, node_client):
+        vlan = load_dd_obj('vlan.json')
+        node_client.return_value.ex_create_vlan.return_value = vlan
+        failed_vlan = load_dd_obj('vlan.json')
+        failed_vlan.status = 'FAILED_ADD'
+        node_client.return_value.ex_get_vlan.return_value = failed_vlan
+        result = self.runner.invoke(cli, ['network', 'create_vlan',
+                                          '--networkDomainId', '423c4386-87b4-43c4-9604-88ae237bfc7f',
+                                          '--name', 'overlap_vlan',
+                                          '--baseIpv4Address', '10.192.238.0', '--wait'])
+        node_client.return_value.ex_get_vlan.assert_called_with(vlan.id)
+        self.assertTrue('VLAN is FAILED_ADD' in result.output)
+        self.assertEqual(result.exit_code, 1)
+
     def test_create_vlan_APIException(self, node_client):
         node_client.return_value.ex_create_vlan.side_effect = DimensionDataAPIException(
             code='REASON 540', msg='Unable to create vlan', driver=None)
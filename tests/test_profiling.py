@@ -0,0 +1,50 @@
+from didata_cli.cli import cli
+from didata_cli.filterable_response import RENDER_HOOKS
+from click.testing import CliRunner
+from tests.utils import load_dd_obj
+import os
+import pstats
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+try:
+    from unittest.mock import patch
+except:
+    from mock import patch
+
+
+@patch('didata_cli.cli.DimensionDataNodeDriver')
+class DimensionDataCLIProfilingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.runner = CliRunner()
+        os.environ["MCP_USER"] = 'fakeuser'
+        os.environ["MCP_PASSWORD"] = 'fakepass'
+        os.environ["MCP_REGION"] = 'dd-na'
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_profile(self, node_client):
+        node_client.return_value.list_nodes.return_value = load_dd_obj('node_list.json')
+        path = os.path.join(self.folder, 'server-list.pstats')
+        result = self.runner.invoke(cli, ['--profile', '--profile-file', path, 'server', 'list'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('Ordered by: cumulative time' in result.output)
+        functions = [function for _, _, function in pstats.Stats(path).stats]
+        self.assertTrue('_node_to_dict' in functions)
+
+    def test_profile_memory(self, node_client):
+        node_client.return_value.list_nodes.return_value = load_dd_obj('node_list.json')
+        result = self.runner.invoke(cli, ['--profile-memory', 'server', 'list'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('allocated at rendering 2 rows' in result.output)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(RENDER_HOOKS, [])
+
+    def test_profile_when_command_fails(self, node_client):
+        node_client.return_value.ex_get_node_by_id.side_effect = ValueError('nope')
+        result = self.runner.invoke(cli, ['--profile', 'server', 'info', '--serverId', 'x'])
+        self.assertTrue(isinstance(result.exception, ValueError))
+        self.assertTrue('cmd_server.py' in result.output)
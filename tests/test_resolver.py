@@ -0,0 +1,81 @@
+from didata_cli.resolver import ServerResolver
+from tests.utils import load_dd_obj
+import unittest
+try:
+    from unittest.mock import MagicMock
+except:
+    from mock import MagicMock
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+
+class ServerResolverTestCase(unittest.TestCase):
+    def setUp(self):
+        self.nodes = load_dd_obj('node_list.json')
+        self.tags = load_dd_obj('tags.json')[:2]
+        self.tags[0].asset_id = self.nodes[1].id
+        self.driver = MagicMock()
+        self.driver.list_nodes.return_value = self.nodes
+        self.driver.ex_list_tags.return_value = self.tags
+        self.clock = FakeClock()
+        self.resolver = ServerResolver(lambda: self.driver, ttl=60, clock=self.clock.time)
+
+    def test_find_filters_in_the_api(self):
+        self.driver.list_nodes.return_value = self.nodes[:1]
+        self.assertEqual(self.resolver.find(ex_ipv4='172.16.2.8'), [self.nodes[0].id])
+        self.driver.list_nodes.assert_called_once_with(ex_ipv4='172.16.2.8')
+        # Asked again within the ttl the answer is remembered
+        self.assertEqual(self.resolver.find(ex_ipv4='172.16.2.8'), [self.nodes[0].id])
+        self.assertEqual(self.driver.list_nodes.call_count, 1)
+        self.clock.now = 61
+        self.resolver.find(ex_ipv4='172.16.2.8')
+        self.assertEqual(self.driver.list_nodes.call_count, 2)
+
+    def test_find_tag(self):
+        tag = self.tags[0]
+        self.driver.ex_list_tags.return_value = self.tags[:1]
+        self.assertEqual(self.resolver.find(tag='{0}={1}'.format(tag.key.name, tag.value)), [self.nodes[1].id])
+        self.driver.ex_list_tags.assert_called_once_with(asset_type='SERVER', tag_key_name=tag.key.name,
+                                                         value=tag.value)
+        self.resolver.find(tag=tag.key.name)
+        self.driver.ex_list_tags.assert_called_with(asset_type='SERVER', tag_key_name=tag.key.name, value=None)
+
+    def test_find_intersects_filters(self):
+        self.driver.list_nodes.side_effect = lambda **filters: self.nodes
+        self.assertEqual(self.resolver.find(ex_name='Don', ex_ipv4='172.16.2.8'),
+                         [node.id for node in self.nodes])
+        self.driver.ex_list_tags.return_value = self.tags[:1]
+        self.assertEqual(self.resolver.find(ex_name='Don', tag=self.tags[0].key.name), [self.nodes[1].id])
+
+    def test_find_many_lists_once(self):
+        tag = self.tags[0]
+        found = self.resolver.find_many([('ex_name', 'Don'), ('ex_name', 'suseproxy'), ('ex_name', 'nope'),
+                                         ('tag', tag.key.name + '=' + tag.value)])
+        self.assertEqual(list(found.values()), [[self.nodes[0].id], [self.nodes[1].id], [], [self.nodes[1].id]])
+        self.driver.list_nodes.assert_called_once_with()
+        self.driver.ex_list_tags.assert_called_once_with(asset_type='SERVER')
+        # Later lookups are answered by the indexes
+        self.assertEqual(self.resolver.find(ex_name='suseproxy'), [self.nodes[1].id])
+        self.assertEqual(self.driver.list_nodes.call_count, 1)
+        self.resolver.invalidate()
+        self.resolver.find(ex_name='suseproxy')
+        self.driver.list_nodes.assert_called_with(ex_name='suseproxy')
+
+    def test_find_many_filters_ips_in_the_api(self):
+        # The API matches an address on any NIC, a listed node only has its primary NIC's
+        secondary_ipv6 = '2607:f480:111:1414:0:0:0:1'
+        self.driver.list_nodes.side_effect = lambda **filters: self.nodes[1:] if filters else self.nodes
+        targets = [('ex_ipv6', secondary_ipv6), ('ex_ipv4', '10.0.0.5'), ('ex_name', 'Don')]
+        found = self.resolver.find_many(targets)
+        self.assertEqual(list(found.values()), [[self.nodes[1].id], [self.nodes[1].id], [self.nodes[0].id]])
+        self.driver.list_nodes.assert_any_call(ex_ipv6=secondary_ipv6)
+        self.driver.list_nodes.assert_any_call(ex_ipv4='10.0.0.5')
+        # A single lookup gives the same answer, from the remembered API answer
+        self.assertEqual(self.resolver.find(ex_ipv6=secondary_ipv6), [self.nodes[1].id])
+        self.assertEqual(self.driver.list_nodes.call_count, 3)
@@ -0,0 +1,57 @@
+from didata_cli.cli import cli
+from click.testing import CliRunner
+from tests.utils import load_dd_obj
+import unittest
+try:
+    from unittest.mock import patch
+except:
+    from mock import patch
+import os
+
+SCRIPT = """# shutdown runbook
+server shutdown --serverId server1
+
+didata server shutdown --serverId server2
+server shutdown --serverId server3
+"""
+
+
+@patch('didata_cli.cli.DimensionDataNodeDriver')
+class DimensionDataCLITestCase(unittest.TestCase):
+    def setUp(self):
+        self.runner = CliRunner()
+        os.environ["MCP_USER"] = 'fakeuser'
+        os.environ["MCP_PASSWORD"] = 'fakepass'
+        os.environ["MCP_REGION"] = 'dd-na'
+
+    def test_run_script_stdin(self, node_client):
+        node_client.return_value.ex_get_node_by_id.return_value = load_dd_obj('node.json')
+        node_client.return_value.ex_shutdown_graceful.return_value = True
+        result = self.runner.invoke(cli, ['run_script', '-'], input=SCRIPT)
+        self.assertEqual(result.exit_code, 0)
+        for server in ('server1', 'server2', 'server3'):
+            self.assertTrue('Server {0} is shutting down gracefully'.format(server) in result.output)
+        self.assertEqual(node_client.return_value.ex_shutdown_graceful.call_count, 3)
+        self.assertEqual(node_client.call_count, 1)
+
+    def test_run_script_file_parallel(self, node_client):
+        node_client.return_value.ex_get_node_by_id.return_value = load_dd_obj('node.json')
+        node_client.return_value.ex_shutdown_graceful.return_value = True
+        with self.runner.isolated_filesystem():
+            with open('runbook.txt', 'w') as script:
+                script.write(SCRIPT)
+            result = self.runner.invoke(cli, ['--output-type', 'json', 'run_script', 'runbook.txt',
+                                              '--workers', '3', '--no-summary'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(node_client.return_value.ex_shutdown_graceful.call_count, 3)
+        self.assertFalse('Exit Code' in result.output)
+
+    def test_run_script_reports_failures(self, node_client):
+        node_client.return_value.ex_get_node_by_id.return_value = load_dd_obj('node.json')
+        node_client.return_value.ex_shutdown_graceful.return_value = False
+        result = self.runner.invoke(cli, ['run_script', '-'],
+                                    input='server shutdown --serverId server1\nshell\nnosuchcommand\n')
+        self.assertEqual(result.exit_code, 1)
+        self.assertTrue('Line 2: not a runnable command' in result.output)
+        self.assertTrue('3 of 3 lines failed' in result.output)
+        self.assertTrue('Exit Code: 2' in result.output)
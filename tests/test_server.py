@@ -1,10 +1,11 @@
 from didata_cli.cli import cli
+from didata_cli.commands.cmd_server import _node_to_dict
 from click.testing import CliRunner
 import unittest
 try:
-    from unittest.mock import patch
+    from unittest.mock import MagicMock, patch
 except:
-    from mock import patch
+    from mock import MagicMock, patch
 import os
 from tests.utils import load_dd_obj
 from libcloud.common.dimensiondata import DimensionDataAPIException
@@ -750,3 +751,288 @@ class DimensionDataCLITestCase(unittest.TestCase):
                                      '--tagKeyName', 'faketagkey'])
         self.assertTrue('REASON 541' in result.output)
         self.assertTrue(result.exit_code == 1)
+
+    def test_server_list_stream(self, node_client):
+        node_list = load_dd_obj('node_list.json')
+        node_client.return_value.ex_list_nodes_paginated.return_value = iter([node_list[:1], node_list[1:]])
+        result = self.runner.invoke(cli, ['server', 'list', '--stream', '--query', "ReturnKeys:ID"])
+        self.assertEqual(result.exit_code, 0)
+        output = [line for line in result.output.splitlines() if line]
+        self.assertEqual(output, ['ID: {0}'.format(node.id) for node in node_list])
+
+    def test_server_list_stream_stops_at_return_count(self, node_client):
+        node_list = load_dd_obj('node_list.json')
+        pages = iter([node_list[:1], node_list[1:]])
+        node_client.return_value.ex_list_nodes_paginated.return_value = pages
+        result = self.runner.invoke(cli, ['server', 'list', '--stream', '--idsonly', '--query', "ReturnCount:1"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, node_list[0].id + '\n')
+        self.assertEqual(next(pages), node_list[1:])
+
+    def test_server_list_stream_ndjson(self, node_client):
+        node_client.return_value.ex_list_nodes_paginated.return_value = iter([load_dd_obj('node_list.json')])
+        result = self.runner.invoke(cli, ['--output-type', 'ndjson', 'server', 'list', '--stream'])
+        self.assertEqual(result.exit_code, 0)
+        for line in result.output.splitlines():
+            self.assertTrue('ID' in json.loads(line))
+
+    def test_server_list_stream_empty(self, node_client):
+        node_client.return_value.ex_list_nodes_paginated.return_value = iter([])
+        result = self.runner.invoke(cli, ['server', 'list', '--stream'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('No nodes found' in result.output)
+
+    def test_server_list_stream_unstreamable_output(self, node_client):
+        result = self.runner.invoke(cli, ['--output-type', 'grid', 'server', 'list', '--stream'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertTrue('can not be streamed' in result.output)
+
+    def test_server_list_where_pushed_down(self, node_client):
+        node_list = load_dd_obj('node_list.json')
+        node_client.return_value.list_nodes.return_value = node_list[:1]
+        result = self.runner.invoke(cli, ['--verbose', 'server', 'list', '--idsonly', '--query',
+                                          "Where:Name == '{0}' and datacenterId == 'NA9'".format(node_list[0].name)])
+        self.assertEqual(result.exit_code, 0)
+        call_kwargs = node_client.return_value.list_nodes.call_args[1]
+        self.assertEqual(call_kwargs['ex_name'], node_list[0].name)
+        self.assertEqual(call_kwargs['ex_location'], 'NA9')
+        self.assertEqual(call_kwargs['ex_state'], None)
+        self.assertTrue("Filtering Name == '{0}' in the API".format(node_list[0].name) in result.output)
+
+    def test_server_list_where_residual_checked_locally(self, node_client):
+        node_list = load_dd_obj('node_list.json')
+        node_client.return_value.list_nodes.return_value = node_list
+        result = self.runner.invoke(cli, ['server', 'list', '--idsonly', '--name', 'other', '--query',
+                                          "Where:Name == '{0}' or ID == 'nope'".format(node_list[1].name)])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(node_client.return_value.list_nodes.call_args[1]['ex_name'], 'other')
+        self.assertEqual(result.output, node_list[1].id + '\n')
+
+    def test_server_list_private_ipv4_checked_locally(self, node_client):
+        # The API's ipv4 filter matches any NIC, Private IPv4 0 is only the primary one
+        node_list = load_dd_obj('node_list.json')
+        node_client.return_value.list_nodes.return_value = node_list
+        result = self.runner.invoke(cli, ['server', 'list', '--idsonly', '--query',
+                                          "Where:[Private IPv4 0] == '172.16.2.9'"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(node_client.return_value.list_nodes.call_args[1]['ex_ipv4'], '172.16.2.9')
+        self.assertEqual(result.output, node_list[1].id + '\n')
+
+    def test_server_start_many(self, node_client):
+        node_client.return_value.ex_get_node_by_id.side_effect = lambda serverid: serverid
+        node_client.return_value.ex_start_node.side_effect = lambda node: node != 'bad'
+        result = self.runner.invoke(cli, ['--output-type', 'json', 'server', 'start', '--workers', '4',
+                                          '--serverId', 'one', '--serverId', 'bad', '--serverIdFile', '-'],
+                                    input='two\n\none\n')
+        self.assertEqual(result.exit_code, 1)
+        summary = json.loads(result.output[:result.output.rindex(']') + 1])
+        self.assertEqual([(row['ID'], row['Result']) for row in summary],
+                         [('one', 'OK'), ('bad', 'Failed'), ('two', 'OK')])
+        self.assertTrue('1 of 3 servers failed' in result.output)
+
+    def test_server_shutdown_query(self, node_client):
+        node_list = load_dd_obj('node_list.json')
+        node_client.return_value.list_nodes.return_value = node_list
+        node_client.return_value.ex_get_node_by_id.side_effect = lambda serverid: serverid
+        node_client.return_value.ex_shutdown_graceful.return_value = True
+        result = self.runner.invoke(cli, ['server', 'shutdown', '--query',
+                                          "Where:ID == '{0}'|ReturnKeys:Name".format(node_list[1].id)])
+        self.assertEqual(result.exit_code, 0)
+        node_client.return_value.ex_shutdown_graceful.assert_called_once_with(node_list[1].id)
+        self.assertTrue('is shutting down gracefully' in result.output)
+
+    def test_server_shutdown_query_reports_pushed_filters(self, node_client):
+        node_list = load_dd_obj('node_list.json')
+        node_client.return_value.list_nodes.return_value = node_list
+        node_client.return_value.ex_get_node_by_id.side_effect = lambda serverid: serverid
+        node_client.return_value.ex_shutdown_graceful.return_value = True
+        result = self.runner.invoke(cli, ['--verbose', 'server', 'shutdown', '--query',
+                                          "Where:[Private IPv4 0] == '172.16.2.9' and Name == 'suseproxy'"])
+        self.assertEqual(result.exit_code, 0)
+        call_kwargs = node_client.return_value.list_nodes.call_args[1]
+        self.assertEqual((call_kwargs['ex_ipv4'], call_kwargs['ex_name']), ('172.16.2.9', 'suseproxy'))
+        self.assertTrue("Filtering Name == 'suseproxy' in the API" in result.output)
+        self.assertTrue("Filtering Private IPv4 0 == '172.16.2.9' in the API" in result.output)
+        node_client.return_value.ex_shutdown_graceful.assert_called_once_with(node_list[1].id)
+
+    def test_server_destroy_many_asks_first(self, node_client):
+        node_client.return_value.destroy_node.return_value = True
+        result = self.runner.invoke(cli, ['server', 'destroy', '--serverId', 'one', '--serverId', 'two'],
+                                    input='n\n')
+        self.assertEqual(result.exit_code, 1)
+        self.assertFalse(node_client.return_value.destroy_node.called)
+        result = self.runner.invoke(cli, ['server', 'destroy', '--yes', '--serverId', 'one', '--serverId', 'two'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(node_client.return_value.destroy_node.call_count, 2)
+
+    @patch('didata_cli.wait.time.sleep')
+    def test_server_update_ram_wait(self, sleep, node_client):
+        pending = load_dd_obj('node.json')
+        pending.extra['status'] = pending.extra['status'].__class__(action='RECONFIGURE_SERVER')
+        node_client.return_value.ex_get_node_by_id.side_effect = [load_dd_obj('node.json'), pending,
+                                                                  load_dd_obj('node.json')]
+        result = self.runner.invoke(cli, ['server', 'update_ram', '--serverId', 'fakeid', '--ramInGB', '4', '--wait'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('Server fakeid is ready' in result.output)
+        self.assertEqual(sleep.call_count, 2)
+
+    @patch('didata_cli.wait.time.sleep')
+    def test_server_start_many_wait_lists_once(self, sleep, node_client):
+        node_list = load_dd_obj('node_list.json')
+        node_client.return_value.ex_get_node_by_id.side_effect = lambda serverid: serverid
+        node_client.return_value.ex_start_node.return_value = True
+        node_client.return_value.list_nodes.return_value = node_list
+        result = self.runner.invoke(cli, ['server', 'start', '--wait',
+                                          '--serverId', node_list[0].id, '--serverId', node_list[1].id])
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('2 servers are ready' in result.output)
+        self.assertEqual(node_client.return_value.list_nodes.call_count, 1)
+
+    def test_server_list_many_regions(self, node_client):
+        node_list = load_dd_obj('node_list.json')
+        node_client.return_value.list_nodes.return_value = node_list[:1]
+        result = self.runner.invoke(cli, ['--region', 'dd-na,dd-ap', '--output-type', 'csv', 'server', 'list',
+                                          '--query', 'ReturnKeys:Region,ID'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(sorted(result.output.splitlines()[1:]),
+                         ['dd-ap,' + node_list[0].id, 'dd-na,' + node_list[0].id])
+
+    def test_server_list_many_regions_one_fails(self, node_client):
+        node_list = load_dd_obj('node_list.json')
+        working, failing = MagicMock(), MagicMock()
+        working.list_nodes.return_value = node_list[:1]
+        failing.list_nodes.side_effect = DimensionDataAPIException(
+            code='UNAUTHORIZED', msg='No account in region', driver=None)
+        node_client.side_effect = lambda user, password, region: failing if region == 'dd-eu' else working
+        result = self.runner.invoke(cli, ['--region', 'dd-na,dd-eu', 'server', 'list', '--idsonly'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('Region dd-eu: UNAUTHORIZED' in result.output)
+        self.assertTrue(node_list[0].id in result.output)
+        working.list_nodes.side_effect = failing.list_nodes.side_effect
+        result = self.runner.invoke(cli, ['--region', 'dd-na,dd-eu', 'server', 'list'])
+        self.assertEqual(result.exit_code, 1)
+
+    def test_server_info_needs_one_region(self, node_client):
+        result = self.runner.invoke(cli, ['--region', 'dd-na,dd-eu', 'server', 'info', '--serverId', 'fakeid'])
+        self.assertEqual(result.exit_code, 2)
+        self.assertTrue('one region at a time' in result.output)
+
+    @patch('didata_cli.commands.cmd_server.time.sleep')
+    def test_server_watch(self, sleep, node_client):
+        first = load_dd_obj('node_list.json')
+        second = load_dd_obj('node_list.json')[:1]
+        second[0].state = 'stopped'
+        second[0].extra['memoryMb'] = 8192
+        node_client.return_value.list_nodes.side_effect = [first, first, second]
+        result = self.runner.invoke(cli, ['server', 'watch', '--datacenterId', 'NA9', '--interval', '5',
+                                          '--count', '3'])
+        self.assertEqual(result.exit_code, 0)
+        events = [json.loads(line) for line in result.output.splitlines()]
+        self.assertEqual([(event['Event'], event['ID']) for event in events],
+                         [('added', first[0].id), ('added', first[1].id),
+                          ('changed', first[0].id), ('removed', first[1].id)])
+        self.assertEqual(events[2]['Changes'], {'State': {'Old': 'running', 'New': 'stopped'},
+                                                'memoryMb': {'Old': 4096, 'New': 8192}})
+        self.assertEqual(sleep.call_count, 2)
+        sleep.assert_called_with(5)
+        node_client.return_value.list_nodes.assert_called_with(
+            ex_location='NA9', ex_name=None, ex_network=None, ex_network_domain=None, ex_vlan=None, ex_image=None,
+            ex_deployed=None, ex_started=None, ex_state=None, ex_ipv6=None, ex_ipv4=None)
+
+    @patch('didata_cli.commands.cmd_server.time.sleep')
+    def test_server_watch_skip_existing_and_query(self, sleep, node_client):
+        first = load_dd_obj('node_list.json')
+        second = load_dd_obj('node_list.json')
+        second[0].state = 'stopped'
+        second[1].state = 'running'
+        node_client.return_value.list_nodes.side_effect = [first, second]
+        result = self.runner.invoke(cli, ['server', 'watch', '--count', '2', '--skip-existing', '--query',
+                                          "Where:State == 'running'"])
+        self.assertEqual(result.exit_code, 0)
+        events = [json.loads(line) for line in result.output.splitlines()]
+        # The stopped server no longer matches the query, the started one now does
+        self.assertEqual([(event['Event'], event['ID']) for event in events],
+                         [('added', first[1].id), ('removed', first[0].id)])
+
+    @patch('didata_cli.commands.cmd_server.time.sleep')
+    def test_server_watch_region_fails(self, sleep, node_client):
+        node_list = load_dd_obj('node_list.json')
+        working, flaky = MagicMock(), MagicMock()
+        working.list_nodes.return_value = node_list[:1]
+        flaky.list_nodes.side_effect = [node_list[1:], DimensionDataAPIException(
+            code='UNEXPECTED_ERROR', msg='Try again', driver=None), node_list[1:]]
+        node_client.side_effect = lambda user, password, region: flaky if region == 'dd-eu' else working
+        result = self.runner.invoke(cli, ['--region', 'dd-na,dd-eu', 'server', 'watch', '--count', '3'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('Could not list servers in dd-eu' in result.output)
+        events = [json.loads(line) for line in result.output.splitlines() if line.startswith('{')]
+        # A failed poll does not remove the region's servers
+        self.assertEqual(sorted((event['Event'], event['Region']) for event in events),
+                         [('added', 'dd-eu'), ('added', 'dd-na')])
+
+    def test_server_update_ram_server_filter_name(self, node_client):
+        node_client.return_value.list_nodes.return_value = load_dd_obj('single_node_list.json')
+        node_client.return_value.ex_reconfigure_node.return_value = True
+        result = self.runner.invoke(cli, ['server', 'update_ram', '--serverFilterName', 'web01', '--ramInGB', '8'])
+        self.assertEqual(result.exit_code, 0)
+        node_client.return_value.list_nodes.assert_called_once_with(ex_name='web01')
+
+    def test_server_filter_too_many(self, node_client):
+        node_client.return_value.list_nodes.return_value = load_dd_obj('node_list.json')
+        node_client.return_value.ex_list_tags.return_value = []
+        result = self.runner.invoke(cli, ['server', 'apply_tag', '--serverFilterIpv4', '172.16.2.8',
+                                          '--tagKeyName', 'Owner'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertTrue('Too many nodes found' in result.output)
+        result = self.runner.invoke(cli, ['server', 'apply_tag', '--serverFilterIpv4', '172.16.2.8',
+                                          '--serverFilterTag', 'Owner=ops', '--tagKeyName', 'Owner'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertTrue('No nodes found' in result.output)
+
+    def test_server_shutdown_many_filters(self, node_client):
+        node_list = load_dd_obj('node_list.json')
+        node_client.return_value.list_nodes.side_effect = lambda **filters: node_list[:1] if filters else node_list
+        node_client.return_value.ex_get_node_by_id.side_effect = lambda serverid: serverid
+        node_client.return_value.ex_shutdown_graceful.return_value = True
+        result = self.runner.invoke(cli, ['--output-type', 'json', 'server', 'shutdown',
+                                          '--serverFilterName', 'suseproxy', '--serverFilterIpv4', '172.16.2.8'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual([row['ID'] for row in json.loads(result.output)], [node_list[0].id, node_list[1].id])
+        # Targets are taken in --serverFilterIpv6, Ipv4, Name, Tag order, the
+        # names are answered by one unfiltered server list and the IPs by the API
+        self.assertEqual([call[1] for call in node_client.return_value.list_nodes.call_args_list],
+                         [{}, {'ex_ipv4': '172.16.2.8'}])
+
+    def test_server_shutdown_many_filters_not_found(self, node_client):
+        node_client.return_value.list_nodes.return_value = load_dd_obj('node_list.json')
+        result = self.runner.invoke(cli, ['server', 'shutdown', '--serverFilterName', 'suseproxy',
+                                          '--serverFilterName', 'nope'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertTrue('0 servers found with name nope' in result.output)
+        self.assertFalse(node_client.return_value.ex_shutdown_graceful.called)
+
+    def test_node_to_dict_keys(self, node_client):
+        for node in load_dd_obj('node_list.json'):
+            full = _node_to_dict(node)
+            for keys in (set(), set(['ID']), set(['Name', 'CPU Count', 'Disk 0 Size', 'nope']),
+                         set(['memoryMb', 'State', 'Disk 0 ID', 'Private IPv4 0']), set(full)):
+                self.assertEqual(list(_node_to_dict(node, keys).items()),
+                                 [(key, full[key]) for key in full if key in keys])
+
+    def test_server_list_idsonly_skips_extra(self, node_client):
+        node_list = load_dd_obj('node_list.json')
+        for node in node_list:
+            node.extra = UnreadDict(node.extra)
+        node_client.return_value.list_nodes.return_value = node_list
+        result = self.runner.invoke(cli, ['server', 'list', '--idsonly'])
+        self.assertEqual(result.output.splitlines(), [node.id for node in node_list])
+        node_client.return_value.ex_list_nodes_paginated.return_value = [node_list]
+        result = self.runner.invoke(cli, ['--output-type', 'csv', 'server', 'list', '--stream',
+                                          '--query', "Where:State == 'running'|ReturnKeys:ID,Name"])
+        self.assertEqual(result.output.splitlines(), ['Name,ID', 'Don,' + node_list[0].id])
+
+
+class UnreadDict(dict):
+    # Fails a test that walks node.extra
+    def __iter__(self):
+        raise AssertionError("node.extra was read")
@@ -0,0 +1,87 @@
+from didata_cli.cli import cli
+from click.testing import CliRunner
+from libcloud.common.dimensiondata import DimensionDataAPIException
+from tests.utils import load_dd_obj
+import unittest
+try:
+    from unittest.mock import patch
+except:
+    from mock import patch
+import os
+
+
+@patch('didata_cli.cli.DimensionDataNodeDriver')
+class DimensionDataCLITestCase(unittest.TestCase):
+    def setUp(self):
+        self.runner = CliRunner()
+        os.environ["MCP_USER"] = 'fakeuser'
+        os.environ["MCP_PASSWORD"] = 'fakepass'
+        os.environ["MCP_REGION"] = 'dd-na'
+
+    def test_shell_exit(self, node_client):
+        result = self.runner.invoke(cli, ['shell'], input='exit\n')
+        self.assertEqual(result.exit_code, 0)
+        self.assertFalse(node_client.called)
+
+    def test_shell_reuses_client(self, node_client):
+        node_client.return_value.ex_get_node_by_id.return_value = load_dd_obj('node.json')
+        result = self.runner.invoke(cli, ['shell'],
+                                    input='server info --serverId fakeid --query "ReturnKeys:ID"\n'
+                                          'server info --serverId fakeid --query "ReturnKeys:Name"\n')
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('ID: 8aeff10c-c918-4021-b2ce-93e4a209418b' in result.output)
+        self.assertTrue('Name: ' in result.output)
+        self.assertEqual(node_client.call_count, 1)
+
+    def test_shell_forgets_servers_after_changes(self, node_client):
+        node = load_dd_obj('node.json')
+        node_client.return_value.list_nodes.return_value = [node]
+        node_client.return_value.ex_get_node_by_id.return_value = node
+        node_client.return_value.ex_apply_tag_to_asset.return_value = True
+        result = self.runner.invoke(cli, ['shell'],
+                                    input='server apply_tag --serverFilterName {0} --tagKeyName role\n'
+                                          'server apply_tag --serverFilterName {0} --tagKeyName env\n'
+                                          'tag apply --id {1} --assetType SERVER --tagKeyName other\n'
+                                          'server apply_tag --serverFilterName {0} --tagKeyName owner\n'
+                                          .format(node.name, node.id))
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output.count('Tag applied to {0}'.format(node.id)), 4)
+        # Every tag change makes the next lookup by name ask the API again
+        self.assertEqual(node_client.return_value.list_nodes.call_count, 3)
+
+    def test_shell_survives_failing_command(self, node_client):
+        node_client.return_value.ex_get_node_by_id.return_value = load_dd_obj('node.json')
+        node_client.return_value.ex_start_node.return_value = False
+        result = self.runner.invoke(cli, ['shell'],
+                                    input='server start --serverId fakeid\n'
+                                          'nosuchcommand\n'
+                                          'server info --serverId "unterminated\n'
+                                          'server info --serverId fakeid --query "ReturnKeys:ID"\n')
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('Something went wrong' in result.output)
+        self.assertTrue('No such command' in result.output)
+        self.assertTrue('Could not parse command' in result.output)
+        self.assertTrue('ID: 8aeff10c-c918-4021-b2ce-93e4a209418b' in result.output)
+
+    def test_shell_survives_unhandled_exception(self, node_client):
+        node = load_dd_obj('node.json')
+        node_client.return_value.ex_get_node_by_id.side_effect = [
+            DimensionDataAPIException(code='RESOURCE_NOT_FOUND', msg='Server missing not found', driver=None), node]
+        result = self.runner.invoke(cli, ['shell'],
+                                    input='server info --serverId missing\n'
+                                          'server info --serverId fakeid --query "ReturnKeys:ID"\n')
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('RESOURCE_NOT_FOUND' in result.output)
+        self.assertTrue('ID: 8aeff10c-c918-4021-b2ce-93e4a209418b' in result.output)
+
+    def test_shell_exits_with_last_exit_code(self, node_client):
+        node_client.return_value.ex_get_node_by_id.side_effect = ValueError('boom')
+        result = self.runner.invoke(cli, ['shell'], input='server info --serverId fakeid\n')
+        self.assertEqual(result.exit_code, 1)
+        self.assertTrue('boom' in result.output)
+        self.assertTrue(result.exception is None or isinstance(result.exception, SystemExit))
+
+    def test_shell_help(self, node_client):
+        result = self.runner.invoke(cli, ['shell'], input='help\nhelp server\n')
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('shutdown_hard' in result.output)
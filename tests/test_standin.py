@@ -0,0 +1,116 @@
+from benchmarks.standin import StandInAPI, StandInServer, SyntheticAccount, make_id, parse_id
+from didata_cli.cli import cli
+from didata_cli.metrics import read_textfile
+from click.testing import CliRunner
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+
+class StandInAPITestCase(unittest.TestCase):
+    def setUp(self):
+        self.api = StandInAPI(SyntheticAccount(servers=25), max_page_size=10)
+
+    def test_ids(self):
+        self.assertEqual(parse_id('server', make_id('server', 7), 25), 7)
+        self.assertEqual(parse_id('server', make_id('server', 25), 25), None)
+        self.assertEqual(parse_id('vlan', make_id('server', 7), 25), None)
+        self.assertEqual(parse_id('server', 'nope', 25), None)
+
+    def test_pages(self):
+        path = '/caas/2.4/org/server/server'
+        status, document, items = self.api.handle('GET', path, {'pageNumber': '3'}, b'')
+        self.assertEqual((status, items), (200, 5))
+        self.assertTrue('pageCount="5"' in document and 'totalCount="25"' in document)
+        status, document, items = self.api.handle('GET', path, {'pageNumber': '4'}, b'')
+        self.assertEqual(items, 0)
+        status, document, items = self.api.handle('GET', path, {'name': 'server-000003'}, b'')
+        self.assertEqual(items, 1)
+
+    def test_errors(self):
+        status, document, items = self.api.handle('GET', '/caas/2.4/org/server/server/nope', {}, b'')
+        self.assertEqual(status, 400)
+        self.assertTrue('RESOURCE_NOT_FOUND' in document)
+        status, document, items = self.api.handle('GET', '/caas/2.4/org/image/osImage', {}, b'')
+        self.assertEqual(status, 404)
+
+
+class DimensionDataCLIStandInTestCase(unittest.TestCase):
+    def setUp(self):
+        self.runner = CliRunner()
+        os.environ["MCP_USER"] = 'fakeuser'
+        os.environ["MCP_PASSWORD"] = 'fakepass'
+        os.environ["MCP_REGION"] = 'dd-na'
+        self.account = SyntheticAccount(servers=25)
+        self.standin = StandInServer(self.account, max_page_size=10).start()
+
+    def tearDown(self):
+        self.standin.stop()
+
+    def invoke(self, *args):
+        return self.runner.invoke(cli, ['--api-url', self.standin.url] + list(args))
+
+    def test_server_list_pages(self):
+        result = self.invoke('server', 'list', '--idsonly')
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output.split(), [make_id('server', index) for index in range(25)])
+        pages = [path for _, path, _ in self.standin.requests if path.endswith('/server/server')]
+        self.assertTrue(len(pages) >= 3)
+
+    def test_server_list_query(self):
+        result = self.invoke('server', 'list', '--idsonly', '--query', "Where:Name=='server-000003'")
+        self.assertEqual(result.output.split(), [make_id('server', 3)])
+        result = self.invoke('server', 'list', '--idsonly', '--query', "Where:State=='stopped'")
+        self.assertEqual(result.output.split(), [make_id('server', 0), make_id('server', 10), make_id('server', 20)])
+
+    def test_trace_counts_round_trips(self):
+        result = self.runner.invoke(cli, ['--api-url', self.standin.url, '--trace', 'server', 'list', '--idsonly'])
+        self.assertEqual(result.exit_code, 0)
+        served = len(self.standin.requests)
+        self.assertTrue(served >= 3)
+        self.assertTrue('1 API calls, {0} HTTP round trips'.format(served) in result.output)
+
+    def test_metrics_count_requests(self):
+        path = os.path.join(tempfile.mkdtemp(), 'didata.prom')
+        try:
+            result = self.invoke('--metrics-file', path, 'server', 'list', '--idsonly')
+            self.assertEqual(result.exit_code, 0)
+            samples = read_textfile(path)
+        finally:
+            shutil.rmtree(os.path.dirname(path))
+        self.assertEqual(samples['didata_http_requests_total{command="server list"}'], len(self.standin.requests))
+        self.assertTrue(samples['didata_http_received_bytes_total{command="server list"}'] > 0)
+        self.assertEqual(samples['didata_http_retries_total{command="server list"}'], 0)
+
+    def test_power_action(self):
+        result = self.invoke('server', 'shutdown', '--serverId', make_id('server', 3))
+        self.assertEqual(result.exit_code, 0)
+        result = self.invoke('server', 'info', '--serverId', make_id('server', 3))
+        self.assertTrue('State: stopped' in result.output)
+
+    def test_network(self):
+        domain_id = make_id('network_domain', 0)
+        result = self.invoke('network', 'list_network_domains')
+        self.assertTrue('ID: ' + domain_id in result.output)
+        result = self.invoke('network', 'list_vlans')
+        self.assertEqual(result.output.count('Network Domain ID: ' + domain_id), 2)
+        # libcloud asks for one page of 50 rules, the stand-in hands out 10 at most
+        result = self.invoke('network', 'list_firewall_rules', '--networkDomainId', domain_id)
+        self.assertEqual(result.output.count('Name: rule_'), 10)
+        result = self.invoke('network', 'list_public_ip_blocks', '--networkDomainId', domain_id)
+        self.assertTrue('Base IP: 168.128.0.0' in result.output)
+
+    def test_tags_and_backup(self):
+        result = self.invoke('tag', 'list')
+        self.assertEqual(result.output.count('Key Name: role'), 25)
+        result = self.invoke('backup', 'info', '--serverId', make_id('server', 3))
+        self.assertTrue('FA.Linux' in result.output)
+
+    def test_latency(self):
+        self.standin.latency = 0.05
+        start = time.time()
+        self.invoke('server', 'info', '--serverId', make_id('server', 3))
+        # myaccount and the server
+        self.assertTrue(time.time() - start >= 0.1)
@@ -0,0 +1,131 @@
+from didata_cli.cli import cli
+from didata_cli.trace import REDACTED, Tracer, describe_args
+from click.testing import CliRunner
+from tests.utils import load_dd_obj
+import json
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    from unittest.mock import patch
+except:
+    from mock import patch
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def time(self):
+        return self.now
+
+
+class FakeResponse(object):
+    def __init__(self, body, page_number=None):
+        self.body = body
+        self.status = 200
+        self.object = {'pageNumber': page_number} if page_number else {}
+
+
+class FakeConnection(object):
+    # Like libcloud's Connection, request makes the HTTP request through _retryable_request
+    def __init__(self, clock):
+        self.clock = clock
+
+    def request(self, action, params=None, method='GET'):
+        url = action + ('?pageNumber={0}'.format(params['pageNumber']) if params else '')
+        return self._retryable_request(url=url, data=None, headers={}, method=method, raw=False, stream=False)
+
+    def _retryable_request(self, url, data, headers, method, raw, stream):
+        self.clock.now += 0.5
+        page_number = url.partition('pageNumber=')[2]
+        return FakeResponse('x' * 2048, int(page_number) if page_number else None)
+
+
+class FakeDriver(object):
+    # DimensionDataConnection calls Connection.request through super(), so
+    # the drivers never use a request attribute set on the connection
+    def __init__(self, clock):
+        self.connection = FakeConnection(clock)
+
+    def list_nodes(self, ex_location=None):
+        return [FakeConnection.request(self.connection, 'server/server')]
+
+    def ex_list_nodes_paginated(self):
+        for page_number in (1, 2, 3):
+            yield [FakeConnection.request(self.connection, 'server/server', params={'pageNumber': page_number})]
+
+    def create_node(self, name, image, auth=None, ex_administrator_password=None):
+        raise ValueError("no")
+
+
+class TracerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tracer = Tracer(clock=self.clock.time)
+        driver = FakeDriver(self.clock)
+        self.tracer.instrument_connection(driver.connection)
+        self.driver = self.tracer.wrap_driver(driver, 'node', 'dd-na')
+
+    def test_calls_and_round_trips(self):
+        self.driver.list_nodes(ex_location='NA9')
+        self.driver.list_nodes()
+        pages = list(self.driver.ex_list_nodes_paginated())
+        self.assertEqual(len(pages), 3)
+        self.assertRaises(ValueError, self.driver.create_node, 'web', 'image', ex_administrator_password='secret')
+        summary = dict((row['Method'], row) for row in self.tracer.summary())
+        self.assertEqual(summary['node.list_nodes']['Calls'], 2)
+        self.assertEqual(summary['node.list_nodes']['Round Trips'], 2)
+        self.assertEqual(summary['node.list_nodes']['KB Received'], 4.0)
+        self.assertEqual(summary['node.list_nodes']['Seconds'], 1.0)
+        self.assertEqual(summary['node.ex_list_nodes_paginated']['Pages'], 3)
+        self.assertEqual(summary['node.ex_list_nodes_paginated']['Seconds'], 1.5)
+        self.assertEqual(summary['node.ex_list_nodes_paginated']['Errors'], 0)
+        self.assertEqual(summary['node.create_node']['Errors'], 1)
+        self.assertEqual(self.tracer.spans[0].args, "ex_location='NA9'")
+        self.assertTrue('secret' not in self.tracer.spans[-1].args)
+
+    def test_chrome_trace(self):
+        self.driver.list_nodes()
+        events = self.tracer.chrome_trace()['traceEvents']
+        self.assertEqual([(event['name'], event['cat'], event['ts'], event['dur']) for event in events],
+                         [('node.list_nodes', 'driver', 0, 500000), ('GET server/server', 'http', 0, 500000)])
+        self.assertEqual(events[1]['args']['bytes'], 2048)
+
+    def test_describe_args(self):
+        node = load_dd_obj('node.json')
+        self.assertEqual(describe_args((node, 'x' * 100), {'ex_admin_password': 'p', 'size': 10}),
+                         "<Node {0}>, '{1}...', ex_admin_password={2}, size=10".format(node.id, 'x' * 60, REDACTED))
+
+
+@patch('didata_cli.cli.DimensionDataNodeDriver')
+class DimensionDataCLITraceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.runner = CliRunner()
+        os.environ["MCP_USER"] = 'fakeuser'
+        os.environ["MCP_PASSWORD"] = 'fakepass'
+        os.environ["MCP_REGION"] = 'dd-na'
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_trace_summary_and_file(self, node_client):
+        node_client.return_value.list_nodes.return_value = load_dd_obj('node_list.json')
+        path = os.path.join(self.folder, 'trace.json')
+        result = self.runner.invoke(cli, ['--trace', '--trace-file', path, 'server', 'list', '--idsonly'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertTrue('node.list_nodes' in result.output)
+        self.assertTrue('1 API calls' in result.output)
+        with open(path) as trace_file:
+            events = json.load(trace_file)['traceEvents']
+        self.assertEqual([event['name'] for event in events], ['node.list_nodes'])
+
+    def test_trace_written_when_command_fails(self, node_client):
+        node_client.return_value.ex_get_node_by_id.side_effect = ValueError('nope')
+        path = os.path.join(self.folder, 'trace.json')
+        self.runner.invoke(cli, ['--trace-file', path, 'server', 'info', '--serverId', 'x'])
+        with open(path) as trace_file:
+            events = json.load(trace_file)['traceEvents']
+        self.assertEqual(events[0]['args']['error'], 'ValueError')
@@ -1,6 +1,97 @@
-from didata_cli.utils import flattenDict
+from didata_cli.utils import flattenDict, iter_flat_items, list_in_datacenters, split_ids
+import threading
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
 
 
 def test_flatten_dict():
     data = {'a': {'b': 1}, 'c': 3}
     flattenDict(data)
+
+
+class FakeClient(object):
+    def __init__(self, regions):
+        self.regions = regions
+        self.pool_size = 10
+        self.node = 'driver-' + regions[0]
+
+    def node_for_region(self, region):
+        return 'driver-' + region
+
+
+def _list_items(driver, datacenterid):
+    return [OrderedDict([('ID', 'shared'), ('Driver', driver)]),
+            OrderedDict([('ID', 'id-' + datacenterid), ('Driver', driver)])]
+
+
+class OverlapCounter(object):
+    # Every call waits (up to timeout) for expected calls to be running at once
+    def __init__(self, expected, timeout=10):
+        self.expected = expected
+        self.timeout = timeout
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.all_running = threading.Event()
+
+    def list_items(self, driver, datacenterid):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            if self.running == self.expected:
+                self.all_running.set()
+        self.all_running.wait(self.timeout)
+        with self.lock:
+            self.running -= 1
+        return _list_items(driver, datacenterid)
+
+
+def test_list_in_datacenters_runs_concurrently():
+    counter = OverlapCounter(3)
+    items = list_in_datacenters(FakeClient(['dd-na']), ['NA9', 'NA12', 'EU6'], counter.list_items)
+    assert counter.peak == 3
+    assert [item['ID'] for item in items] == ['shared', 'id-NA9', 'id-NA12', 'id-EU6']
+
+
+def test_list_in_datacenters_adds_region():
+    items = list_in_datacenters(FakeClient(['dd-na', 'dd-eu']), ['NA9'], _list_items)
+    assert [(item['Region'], item['ID'], item['Driver']) for item in items] == [
+        ('dd-na', 'shared', 'driver-dd-na'), ('dd-na', 'id-NA9', 'driver-dd-na'),
+        ('dd-eu', 'shared', 'driver-dd-eu'), ('dd-eu', 'id-NA9', 'driver-dd-eu')]
+
+
+def test_split_ids():
+    assert split_ids(None) == [None]
+    assert split_ids('NA9, NA12,NA9,') == ['NA9', 'NA12']
+
+
+def test_flatten_dict_lists():
+    data = OrderedDict([('name', 'web01'), ('cpu', {'count': 2, 'speed': 'STANDARD'}),
+                        ('disks', [{'id': 'd0', 'size': 10}, {'id': 'd1', 'size': 20}]),
+                        ('ips', ['10.0.0.1', '10.0.0.2']), ('empty', {}), ('none', [])])
+    assert flattenDict(data) == {
+        'name': 'web01', 'cpu.count': 2, 'cpu.speed': 'STANDARD',
+        'disks.0.id': 'd0', 'disks.0.size': 10, 'disks.1.id': 'd1', 'disks.1.size': 20,
+        'ips.0': '10.0.0.1', 'ips.1': '10.0.0.2'
+    }
+    assert list(iter_flat_items(data, '_'))[:4] == [('name', 'web01'), ('cpu_count', 2), ('cpu_speed', 'STANDARD'),
+                                                    ('disks_0_id', 'd0')]
+
+
+def test_flatten_dict_into_result():
+    result = OrderedDict([('kept', 1)])
+    assert flattenDict({'a': [[1, {'b': None}]]}, result) is result
+    assert list(result.items()) == [('kept', 1), ('a.0.0', 1), ('a.0.1.b', None)]
+
+
+def test_flatten_dict_deep():
+    data = leaf = {}
+    for _ in range(5000):
+        leaf['n'] = [{}]
+        leaf = leaf['n'][0]
+    leaf['value'] = 1
+    (path, value), = iter_flat_items(data)
+    assert value == 1
+    assert path == 'n.0.' * 5000 + 'value'
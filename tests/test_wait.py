@@ -0,0 +1,79 @@
+from didata_cli.wait import Poller, WaitTimeout
+import unittest
+
+
+class FakeResource(object):
+    def __init__(self, id, done):
+        self.id = id
+        self.done = done
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class PollerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.one_calls = []
+        self.many_calls = 0
+        # How many polls each resource stays pending for
+        self.pending_polls = {'a': 1, 'b': 3, 'c': 0}
+
+    def get_one(self, resource_id):
+        self.one_calls.append(resource_id)
+        return self._resource(resource_id)
+
+    def get_many(self):
+        self.many_calls += 1
+        return [self._resource(resource_id) for resource_id in sorted(self.pending_polls)]
+
+    def _resource(self, resource_id):
+        self.pending_polls[resource_id] -= 1
+        return FakeResource(resource_id, self.pending_polls[resource_id] < 0)
+
+    def _poller(self, timeout=600, jitter=0):
+        return Poller(self.get_one, self.get_many, lambda resource: resource.done, timeout=timeout,
+                      initial_delay=2, max_delay=5, factor=2, jitter=jitter,
+                      sleep=self.clock.sleep, clock=self.clock.time)
+
+    def test_single_resource_polls_by_id(self):
+        done = self._poller().wait(['a'])
+        self.assertEqual(list(done), ['a'])
+        self.assertEqual(self.one_calls, ['a', 'a'])
+        self.assertEqual(self.many_calls, 0)
+
+    def test_many_resources_are_polled_together(self):
+        poller = self._poller()
+        done = poller.wait(['b', 'a', 'c'])
+        self.assertEqual(list(done), ['b', 'a', 'c'])
+        # One list call per poll while more than one is pending, then by id
+        self.assertEqual(self.many_calls, 2)
+        self.assertEqual(self.one_calls, ['b', 'b'])
+        self.assertEqual(poller.polls, 4)
+
+    def test_backoff_is_capped(self):
+        self._poller().wait(['b'])
+        self.assertEqual(self.clock.sleeps, [2, 4, 5, 5])
+
+    def test_jitter_stays_in_range(self):
+        delays = self._poller(jitter=0.5).delays()
+        for expected in (2, 4, 5, 5, 5):
+            delay = next(delays)
+            self.assertTrue(expected * 0.5 <= delay <= expected * 1.5)
+
+    def test_timeout(self):
+        self.pending_polls['a'] = 100
+        with self.assertRaises(WaitTimeout) as context:
+            self._poller(timeout=10).wait(['a'])
+        self.assertEqual(context.exception.pending, ['a'])
+        self.assertEqual(self.clock.now, 10)
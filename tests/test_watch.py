@@ -0,0 +1,47 @@
+from didata_cli.watch import ADDED, CHANGED, REMOVED, ChangeIndex
+import unittest
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+
+def server(id, state='running', **extra):
+    item = OrderedDict([('Name', 'server ' + id), ('ID', id), ('State', state), ('description', 'x')])
+    item.update(extra)
+    return item
+
+
+class ChangeIndexTestCase(unittest.TestCase):
+    def test_first_update_adds_everything(self):
+        index = ChangeIndex()
+        events = index.update([server('a'), server('b')])
+        self.assertEqual([(event.event, event.id) for event in events], [(ADDED, 'a'), (ADDED, 'b')])
+        self.assertEqual(len(index), 2)
+
+    def test_only_watched_fields_are_diffed(self):
+        index = ChangeIndex()
+        index.update([server('a', **{'Disk 0 Size': 10})])
+        changed = server('a', 'stopped', **{'Disk 0 Size': 20})
+        changed['description'] = 'y'
+        events = index.update([changed])
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].event, CHANGED)
+        self.assertEqual(list(events[0].changes.items()), [('State', ('running', 'stopped')),
+                                                           ('Disk 0 Size', (10, 20))])
+        self.assertEqual(index.update([changed]), [])
+
+    def test_removed_disk(self):
+        index = ChangeIndex()
+        index.update([server('a', **{'Disk 1 Size': 10})])
+        events = index.update([server('a')])
+        self.assertEqual(events[0].changes, OrderedDict([('Disk 1 Size', (10, None))]))
+
+    def test_removed_per_scope(self):
+        index = ChangeIndex()
+        index.update([server('a')], 'dd-na')
+        index.update([server('b')], 'dd-eu')
+        self.assertEqual(index.update([], 'dd-eu')[0][:3], (REMOVED, 'b', 'dd-eu'))
+        self.assertEqual(len(index), 1)
+        removed = index.update([], 'dd-na')[0]
+        self.assertEqual(removed.item, OrderedDict([('Name', 'server a'), ('ID', 'a'), ('State', 'running')]))